@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from library.acervo.models import Book, BookReview, Category
+from library.acervo.models import Book, BookReview, Category, Stock
 
 # Register your models here.
 
@@ -10,12 +10,22 @@ class LivroAdmin(admin.ModelAdmin):
     list_display = ('name', 'author', 'publisher', 'year', 'pages', 'is_available')
     list_filter = ('author', 'publisher', 'year', 'pages', 'language')
     search_fields = ('name', 'author', 'publisher', 'year')
-    list_editable = ('is_available',)
+    # Disponibilidade vem do estoque (ver EstoqueAdmin)
+    readonly_fields = ('is_available',)
+
+
+@admin.register(Stock)
+class EstoqueAdmin(admin.ModelAdmin):
+    list_display = ('book', 'quantity', 'available')
+    list_select_related = ('book',)
+    search_fields = ('book__name',)
+    readonly_fields = ('available',)
+    raw_id_fields = ('book',)
 
 
 @admin.register(Category)
 class CategoriaAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'book_count')
     list_filter = ('name',)
     search_fields = ('name',)
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AcervoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library.acervo'
+
+    def ready(self):
+        from library.acervo import signals  # noqa: F401, PLC0415
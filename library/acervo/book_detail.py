@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field
+
+from django.shortcuts import get_object_or_404
+
+from library.acervo.models import Book, BookReview
+from library.acervo.pagination import KeysetPage, KeysetPaginator
+from library.emprestimos.fila import posicoes
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.emprestimos.models.reserva import Reserva
+
+REVIEWS_PER_PAGE = 10
+REVIEWS_ORDERING = ('-created_at', '-id')
+RELATED_BOOKS = 4
+RELATED_BOOK_FIELDS = (
+    'id',
+    'uuid',
+    'name',
+    'slug',
+    'author',
+    'photo',
+    'photo_variants',
+    'photo_placeholder',
+    'is_available',
+)
+
+
+@dataclass
+class BookDetail:
+    """Tudo que a página de detalhes do livro exibe"""
+
+    book: Book
+    reviews: KeysetPage
+    related_books: list = field(default_factory=list)
+    user_review: BookReview | None = None
+    emprestimo_usuario: Emprestimo | None = None
+    pode_renovar: bool = False
+    reserva_usuario: Reserva | None = None
+
+    @property
+    def voce_e_o_proximo(self):
+        return self.reserva_usuario is not None and self.reserva_usuario.posicao == 1
+
+
+def get_reviews_page(reviews, cursor=None):
+    """Uma página de avaliações, das mais recentes para as mais antigas"""
+    return KeysetPaginator(
+        reviews.select_related('user__profile'),
+        REVIEWS_ORDERING,
+        per_page=REVIEWS_PER_PAGE,
+    ).get_page(cursor)
+
+
+def get_related_books(book):
+    """Livros que os leitores deste também pegaram (ver library.recomendacoes)"""
+    return list(
+        Book.objects.only(*RELATED_BOOK_FIELDS)
+        .filter(neighbor_of__book=book)
+        .order_by('neighbor_of__rank')[:RELATED_BOOKS]
+    )
+
+
+def get_book_detail(book_slug, user, reviews_cursor=None):
+    """Monta a página de detalhes com um número fixo de consultas.
+
+    Uma consulta para o livro (já com os agregados de avaliação, o estoque e
+    o tamanho da fila de reservas), uma para a página de avaliações, uma
+    para os livros relacionados e, para usuários autenticados, uma para a
+    avaliação e outra para o empréstimo ativo do usuário. Se houver fila, mais
+    uma traz a reserva do usuário com a posição dele.
+    """
+    book = get_object_or_404(Book.objects.select_related('stock'), slug=book_slug)
+
+    reviews = get_reviews_page(book.reviews.all(), reviews_cursor)
+
+    detail = BookDetail(
+        book=book, reviews=reviews, related_books=get_related_books(book)
+    )
+    if not user.is_authenticated:
+        return detail
+
+    detail.user_review = BookReview.objects.filter(book=book, user=user).first()
+    detail.emprestimo_usuario = Emprestimo.objects.filter(
+        book=book, user=user, date_returned__isnull=True
+    ).first()
+    if detail.emprestimo_usuario:
+        detail.pode_renovar = (
+            detail.emprestimo_usuario.renovacao_no_prazo and not book.reservas_ativas
+        )
+    if book.reservas_ativas:
+        detail.reserva_usuario = posicoes(user, book_id=book.pk).first()
+    return detail
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'acervo:catalog_version'
+
+
+def catalog_version():
+    """Versão do acervo; muda sempre que um livro ou categoria é alterado.
+
+    Entra nas chaves de cache derivadas do catálogo, então incrementá-la
+    invalida todas de uma vez sem precisar conhecê-las.
+    """
+    return cache.get_or_set(CATALOG_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 2, timeout=None)
@@ -0,0 +1,71 @@
+"""Cache do HTML dos cards de livro.
+
+Cada card fica em cache pela chave (template, uuid, updated_at) do livro:
+tudo o que aparece no card (capa, disponibilidade, agregados das
+avaliações) atualiza ``Book.updated_at`` quando muda, então uma versão
+nova do livro simplesmente usa outra chave e a antiga expira sozinha.
+"""
+
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+# Aumente ao mudar o HTML dos cards para não servir a marcação antiga
+CARD_VERSION = 1
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+HITS_KEY = 'acervo:card_cache:hits'
+MISSES_KEY = 'acervo:card_cache:misses'
+
+
+def card_cache_key(template_name, book):
+    stamp = book.updated_at.timestamp()
+    return f'acervo:card:{CARD_VERSION}:{template_name}:{book.uuid}:{stamp}'
+
+
+def _count(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Primeira contagem (ou o cache foi limpo); add evita sobrescrever
+        # uma contagem criada por outro processo nesse meio tempo
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+def render_book_cards(books, template_name):
+    """HTML dos cards, na ordem dos livros, com uma leitura do cache.
+
+    O template recebe só ``book``; os cards não dependem do usuário.
+    """
+    books = list(books)
+    keys = [card_cache_key(template_name, book) for book in books]
+    cached = cache.get_many(keys)
+
+    template = None
+    rendered = {}
+    cards = []
+    for key, book in zip(keys, books):
+        card = cached.get(key)
+        if card is None:
+            template = template or get_template(template_name)
+            card = rendered[key] = template.render({'book': book})
+        cards.append(card)
+
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    _count(HITS_KEY, len(books) - len(rendered))
+    _count(MISSES_KEY, len(rendered))
+    return mark_safe(''.join(cards))  # noqa: S308
+
+
+def card_cache_stats():
+    """Acertos e falhas do cache de cards desde a última zerada"""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {'hits': counts.get(HITS_KEY, 0), 'misses': counts.get(MISSES_KEY, 0)}
+
+
+def reset_card_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,51 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from library.acervo.models import Book, Category
+
+BookCategory = Book.categories.through
+
+
+def adjust_book_counts(category_ids, delta):
+    """Soma ``delta`` ao total de livros das categorias com um único UPDATE"""
+    category_ids = list(category_ids)
+    if category_ids and delta:
+        Category.objects.filter(pk__in=category_ids).update(
+            book_count=F('book_count') + delta
+        )
+
+
+def apply_count_changes(changes, sign=1):
+    """Aplica um Counter {categoria: livros} agrupando categorias de mesmo delta"""
+    by_delta = defaultdict(list)
+    for category_id, total in changes.items():
+        by_delta[sign * total].append(category_id)
+    for delta, category_ids in by_delta.items():
+        adjust_book_counts(category_ids, delta)
+
+
+def linked_categories(book_ids=None, category_ids=None):
+    """Quantos vínculos cada categoria tem com os livros informados"""
+    links = BookCategory.objects.all()
+    if book_ids is not None:
+        links = links.filter(book_id__in=book_ids)
+    if category_ids is not None:
+        links = links.filter(category_id__in=category_ids)
+    return Counter(links.values_list('category_id', flat=True))
+
+
+def rebuild_category_counts(category_ids=None):
+    """Recalcula o total de livros das categorias a partir da tabela de vínculos"""
+    categories = Category.objects.all()
+    if category_ids is not None:
+        categories = categories.filter(pk__in=category_ids)
+    totals = (
+        BookCategory.objects.filter(category_id=OuterRef('pk'))
+        .order_by()
+        .values('category_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return categories.update(book_count=Coalesce(Subquery(totals), Value(0)))
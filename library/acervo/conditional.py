@@ -0,0 +1,128 @@
+"""Validadores (ETag) das páginas do catálogo para GET condicional.
+
+Cada ETag custa uma consulta por índice, bem mais barata que montar a
+página: com um If-None-Match que ainda confere, a view responde 304 sem
+renderizar nada. Entram no ETag a URL completa, o usuário (a página mostra
+o menu dele) e a versão do catálogo, que muda quando livros, categorias ou
+os vínculos entre eles são gravados ou apagados. Mudanças gravadas com
+update() (estoque, avaliações, capas) atualizam ``Book.updated_at``, por
+isso o maior ``updated_at`` do acervo também entra.
+"""
+
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from library.acervo.cache import catalog_version
+from library.acervo.models import Book, BookReview, Category
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.emprestimos.models.reserva import Reserva
+from library.recomendacoes.models import BookNeighbor
+
+
+def _uncacheable(request):
+    # Mensagens pendentes só aparecem uma vez: a página precisa ser renderizada
+    return request.method not in ('GET', 'HEAD') or len(get_messages(request)) > 0
+
+
+def _etag(request, *parts):
+    viewer = request.user.pk if request.user.is_authenticated else None
+    data = repr((request.get_full_path(), viewer, catalog_version(), *parts))
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def _latest_book_update():
+    return Book.objects.order_by('-updated_at').values('updated_at')[:1]
+
+
+def books_etag(request, *args, **kwargs):
+    if _uncacheable(request):
+        return None
+    latest = _latest_book_update().first()
+    return _etag(request, latest and latest['updated_at'])
+
+
+def categories_etag(request, *args, **kwargs):
+    if _uncacheable(request):
+        return None
+    latest = Category.objects.aggregate(latest=Max('updated_at'))['latest']
+    return _etag(request, latest)
+
+
+def book_detail_etag(request, book_slug):
+    """ETag da página do livro, calculado em uma consulta.
+
+    Cobre o livro, o estoque (muda a cada empréstimo e devolução), as
+    avaliações, o tamanho da fila de reservas, os livros relacionados e, do
+    próprio usuário, o empréstimo ativo e a reserva (posição na fila e o
+    prazo de retirada, que muda sem tocar no livro nem no estoque).
+    """
+    if _uncacheable(request):
+        return None
+
+    state = {
+        'catalog_updated': Subquery(_latest_book_update()),
+        'stock_updated': F('stock__updated_at'),
+        'reviews_updated': Subquery(
+            BookReview.objects.filter(book=OuterRef('pk'))
+            .order_by('-updated_at')
+            .values('updated_at')[:1]
+        ),
+        'neighbors_built': Subquery(
+            BookNeighbor.objects.filter(book=OuterRef('pk'))
+            .order_by('-pk')
+            .values('pk')[:1]
+        ),
+    }
+    if request.user.is_authenticated:
+        loan = Emprestimo.objects.filter(
+            book=OuterRef('pk'), user=request.user, date_returned__isnull=True
+        ).order_by()
+        state['user_loan'] = Subquery(loan.values('pk')[:1])
+        state['user_loan_end'] = Subquery(loan.values('end_date')[:1])
+
+        reserva = Reserva.objects.filter(
+            book=OuterRef('pk'), user=request.user, ativa=True
+        ).order_by()
+        antes = (
+            Reserva.objects.filter(
+                book=OuterRef(OuterRef('pk')),
+                ativa=True,
+                created_at__lt=OuterRef('created_at'),
+            )
+            .order_by()
+            .values('book')
+            .annotate(total=Count('*'))
+            .values('total')
+        )
+        state['user_hold'] = Subquery(reserva.values('retirar_ate')[:1])
+        state['user_queue_position'] = Subquery(
+            reserva.annotate(antes=Subquery(antes)).values('antes')[:1]
+        )
+
+    row = (
+        Book.objects.filter(slug=book_slug)
+        .annotate(**state)
+        .values_list('updated_at', 'reservas_ativas', *state)
+        .first()
+    )
+    if row is None:
+        return None
+    return _etag(request, *row)
+
+
+def conditional_page(etag_func):
+    """Responde 304 quando o ETag confere.
+
+    O navegador é instruído a revalidar sempre, e a resposta é privada:
+    a página varia por usuário e não deve ir para caches compartilhados.
+    """
+
+    def decorator(view):
+        view = condition(etag_func=etag_func)(view)
+        return cache_control(private=True, no_cache=True)(view)
+
+    return decorator
@@ -0,0 +1,98 @@
+import logging
+import os
+from functools import partial
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Now
+
+from library.acervo.imaging import render_cover
+from library.acervo.models import Book
+
+logger = logging.getLogger('library')
+
+COVERS_DIR = 'books/covers'
+
+
+def cover_variants(book):
+    """Versões da capa atual do livro, ou None se ainda não foram geradas"""
+    variants = book.photo_variants or {}
+    if not book.photo or variants.get('source') != book.photo.name:
+        return None
+    return variants
+
+
+def covers_outdated(book):
+    source = (book.photo_variants or {}).get('source')
+    return (book.photo.name or None) != source
+
+
+def _delete_files(storage, variants):
+    for name, paths in variants.items():
+        if name == 'source':
+            continue
+        for path in paths.values():
+            storage.delete(path)
+
+
+def save_cover_derivatives(book, rendered):
+    """Grava as versões já geradas e registra os caminhos no livro"""
+    storage = book.photo.storage
+    stem = os.path.splitext(os.path.basename(book.photo.name))[0]
+    variants = {'source': book.photo.name}
+    for name, by_width in rendered['variants'].items():
+        variants[name] = {
+            str(width): storage.save(
+                f'{COVERS_DIR}/{book.uuid}/{stem}-{width}.{name}', ContentFile(data)
+            )
+            for width, data in by_width.items()
+        }
+
+    # Só grava se a capa não foi trocada enquanto as versões eram geradas
+    updated = Book.objects.filter(pk=book.pk, photo=book.photo.name).update(
+        photo_variants=variants,
+        photo_placeholder=rendered['placeholder'],
+        updated_at=Now(),
+    )
+    if not updated:
+        _delete_files(storage, variants)
+        return False
+
+    _delete_files(storage, book.photo_variants or {})
+    book.photo_variants = variants
+    book.photo_placeholder = rendered['placeholder']
+    return True
+
+
+def clear_cover_derivatives(book):
+    """Remove as versões de um livro que ficou sem capa"""
+    updated = Book.objects.filter(
+        Q(photo='') | Q(photo__isnull=True), pk=book.pk
+    ).update(photo_variants={}, photo_placeholder='', updated_at=Now())
+    if updated:
+        _delete_files(book.photo.storage, book.photo_variants or {})
+        book.photo_variants = {}
+        book.photo_placeholder = ''
+
+
+def release_cover_derivatives(book):
+    """Remove as versões de um livro excluído, depois do commit"""
+    variants = book.__dict__.get('photo_variants')
+    if variants:
+        transaction.on_commit(partial(_delete_files, book.photo.storage, variants))
+
+
+def generate_cover_derivatives(book):
+    """Gera as versões da capa do livro; False se a capa não pôde ser lida"""
+    if not book.photo:
+        clear_cover_derivatives(book)
+        return True
+
+    try:
+        with book.photo.open('rb') as file:
+            rendered = render_cover(file.read())
+    except (OSError, ValueError):
+        logger.exception('Não foi possível gerar as versões da capa: %s', book.pk)
+        return False
+    return save_cover_derivatives(book, rendered)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import connection
+
+from library.acervo.cache import catalog_version
+from library.acervo.models import Book, Category
+
+FACET_LIMIT = 10
+FACET_CACHE_TIMEOUT = 60 * 10
+
+FACETS_SQL = """
+SELECT
+    GROUPING(category.id, category.name) = 0 AS by_category,
+    GROUPING(result.year / 10) = 0 AS by_decade,
+    GROUPING(result.language) = 0 AS by_language,
+    category.id,
+    category.name,
+    result.year / 10 * 10,
+    result.language,
+    result.publisher,
+    COUNT(DISTINCT result.id)
+FROM ({result}) AS result
+LEFT JOIN {link_table} AS link ON link.{link_book} = result.id
+LEFT JOIN {category_table} AS category ON category.id = link.{link_category}
+GROUP BY GROUPING SETS (
+    (category.id, category.name),
+    (result.year / 10),
+    (result.language),
+    (result.publisher)
+)
+"""
+
+
+def _facets_sql(queryset):
+    result_sql, params = (
+        queryset.order_by()
+        .values('id', 'year', 'language', 'publisher')
+        .query.sql_with_params()
+    )
+    link = Book.categories.through._meta
+    sql = FACETS_SQL.format(
+        result=result_sql,
+        link_table=connection.ops.quote_name(link.db_table),
+        link_book=link.get_field('book').column,
+        link_category=link.get_field('category').column,
+        category_table=connection.ops.quote_name(Category._meta.db_table),
+    )
+    return sql, params
+
+
+def _top(counts):
+    return sorted(counts, key=lambda item: (-item['count'], str(item['value'])))[
+        :FACET_LIMIT
+    ]
+
+
+def compute_facets(queryset):
+    """Contagens por categoria, década, idioma e editora do resultado atual.
+
+    Uma única consulta agregada com GROUPING SETS percorre o resultado uma
+    vez e devolve todas as contagens.
+    """
+    facets = {'categories': [], 'decades': [], 'languages': [], 'publishers': []}
+    sql, params = _facets_sql(queryset)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    for row in rows:
+        (
+            by_category,
+            by_decade,
+            by_language,
+            category_id,
+            category_name,
+            decade,
+            language,
+            publisher,
+            count,
+        ) = row
+        if by_category:
+            if category_id is not None:
+                facets['categories'].append(
+                    {'value': category_id, 'label': category_name, 'count': count}
+                )
+        elif by_decade:
+            if decade is not None:
+                facets['decades'].append(
+                    {'value': decade, 'label': f'{decade}s', 'count': count}
+                )
+        elif by_language:
+            if language:
+                facets['languages'].append(
+                    {'value': language, 'label': language, 'count': count}
+                )
+        elif publisher:
+            facets['publishers'].append(
+                {'value': publisher, 'label': publisher, 'count': count}
+            )
+
+    return {name: _top(counts) for name, counts in facets.items()}
+
+
+def _cache_key(book_filter):
+    params = {}
+    for name, value in book_filter.form.cleaned_data.items():
+        if value in (None, '') or (hasattr(value, '__iter__') and not value):
+            continue
+        if hasattr(value, 'values_list'):
+            params[name] = sorted(value.values_list('pk', flat=True))
+        else:
+            params[name] = value
+    digest = hashlib.sha1(
+        json.dumps(params, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f'acervo:facets:{catalog_version()}:{digest}'
+
+
+def get_facets(book_filter):
+    """Facetas do filtro, em cache pelos parâmetros normalizados do filtro"""
+    if not book_filter.is_valid():
+        return None
+    key = _cache_key(book_filter)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(book_filter.qs)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
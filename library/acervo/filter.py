@@ -3,9 +3,13 @@ from django import forms
 
 from .models import Book
 from .models.category import Category
+from .search import SEARCH_ORDERING, search_books
+
+DEFAULT_ORDERING = ('name', 'id')
 
 
 class BookFilter(django_filters.FilterSet):
+    q = django_filters.CharFilter(method='filter_search', label='Buscar')
     name = django_filters.CharFilter(lookup_expr='icontains')
     author = django_filters.CharFilter(lookup_expr='icontains')
     publisher = django_filters.CharFilter(lookup_expr='icontains')
@@ -13,7 +17,32 @@ class BookFilter(django_filters.FilterSet):
         queryset=Category.objects.all(), widget=forms.CheckboxSelectMultiple
     )
     year = django_filters.NumberFilter()
+    decade = django_filters.NumberFilter(method='filter_decade', label='Década')
+    language = django_filters.CharFilter(label='Idioma')
 
     class Meta:
         model = Book
-        fields = ['name', 'author', 'publisher', 'year', 'categories']
+        fields = [
+            'q',
+            'name',
+            'author',
+            'publisher',
+            'year',
+            'decade',
+            'language',
+            'categories',
+        ]
+
+    def filter_search(self, queryset, name, value):
+        return search_books(queryset, value)
+
+    def filter_decade(self, queryset, name, value):
+        decade = int(value) // 10 * 10
+        return queryset.filter(year__gte=decade, year__lte=decade + 9)
+
+    @property
+    def ordering(self):
+        """Ordenação estável usada na paginação por cursor"""
+        if self.is_valid() and self.form.cleaned_data.get('q'):
+            return SEARCH_ORDERING
+        return DEFAULT_ORDERING
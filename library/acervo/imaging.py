@@ -0,0 +1,62 @@
+# Geração das versões redimensionadas das capas. Só depende do Pillow (nada
+# do Django), para poder rodar em processos separados no comando de backfill.
+import base64
+import io
+
+from PIL import Image, ImageFilter, ImageOps
+
+# Larguras geradas para o srcset; a altura segue a proporção original
+COVER_WIDTHS = (160, 320, 640)
+
+COVER_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+PLACEHOLDER_WIDTH = 16
+
+
+def _open(data):
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _resize(image, width):
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def _encode(image, image_format, options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def render_cover(data):
+    """Gera as versões da capa a partir dos bytes da imagem original.
+
+    Retorna ``{'variants': {formato: {largura: bytes}}, 'placeholder': str}``.
+    Larguras maiores que a original não são geradas; o placeholder é uma
+    miniatura desfocada já em data URI, pequena o bastante para ir no HTML.
+    """
+    image = _open(data)
+    widths = [width for width in COVER_WIDTHS if width < image.width]
+    widths.append(min(image.width, COVER_WIDTHS[-1]))
+
+    variants = {name: {} for name in COVER_FORMATS}
+    for width in sorted(set(widths)):
+        resized = _resize(image, width)
+        for name, (image_format, options) in COVER_FORMATS.items():
+            variants[name][width] = _encode(resized, image_format, options)
+
+    tiny = _resize(image, PLACEHOLDER_WIDTH).filter(ImageFilter.GaussianBlur(1))
+    placeholder = base64.b64encode(_encode(tiny, 'JPEG', {'quality': 40})).decode()
+    return {
+        'variants': variants,
+        'placeholder': f'data:image/jpeg;base64,{placeholder}',
+    }
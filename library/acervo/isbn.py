@@ -0,0 +1,51 @@
+import re
+
+from django.core.exceptions import ValidationError
+
+# Hífens, espaços e pontos usados na grafia impressa do ISBN
+SEPARATORS = re.compile(r'[\s.\-‐-―]')
+ISBN10 = re.compile(r'\d{9}[\dX]')
+ISBN13 = re.compile(r'97[89]\d{10}')
+
+
+def _isbn10_valid(digits):
+    values = [10 if char == 'X' else int(char) for char in digits]
+    total = sum(value * weight for value, weight in zip(values, range(10, 0, -1)))
+    return total % 11 == 0
+
+
+def _isbn13_check_digit(first12):
+    total = sum(int(char) * (3 if i % 2 else 1) for i, char in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+
+def normalize_isbn(value):
+    """ISBN-10 ou ISBN-13, com ou sem separadores, como ISBN-13 só com dígitos.
+
+    Vazio vira None; um ISBN com dígito verificador errado levanta
+    ValidationError.
+    """
+    if value is None:
+        return None
+    digits = SEPARATORS.sub('', str(value)).upper()
+    if not digits:
+        return None
+
+    if ISBN10.fullmatch(digits):
+        if not _isbn10_valid(digits):
+            raise ValidationError('ISBN inválido: dígito verificador não confere.')
+        first12 = f'978{digits[:9]}'
+        return first12 + _isbn13_check_digit(first12)
+
+    if ISBN13.fullmatch(digits):
+        if digits[12] != _isbn13_check_digit(digits[:12]):
+            raise ValidationError('ISBN inválido: dígito verificador não confere.')
+        return digits
+
+    raise ValidationError(
+        'ISBN inválido: informe 10 dígitos ou 13 começando com 978/979.'
+    )
+
+
+def validate_isbn(value):
+    normalize_isbn(value)
@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from django.db.models.fields.json import KT
+
+from library.acervo.covers import clear_cover_derivatives, save_cover_derivatives
+from library.acervo.imaging import render_cover
+from library.acervo.models import Book
+
+
+def _read(book):
+    try:
+        with book.photo.open('rb') as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera as versões redimensionadas (WebP/JPEG) e o placeholder das capas '
+        'novas ou trocadas, e remove as de livros que ficaram sem capa. Pensado '
+        'para rodar periodicamente (cron); até lá, a página usa a capa original.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Quantidade de processos que redimensionam as imagens',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Quantidade de capas lidas e enviadas aos processos por vez',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Gera novamente mesmo as capas que já têm versões atualizadas',
+        )
+
+    def handle(self, *args, **options):
+        without_photo = Q(photo='') | Q(photo__isnull=True)
+        books = Book.objects.exclude(without_photo)
+        if not options['force']:
+            # Só as capas cujas versões não são da foto atual
+            books = books.alias(source=KT('photo_variants__source')).filter(
+                Q(source__isnull=True) | ~Q(source=F('photo'))
+            )
+        books = (
+            books.only('uuid', 'photo', 'photo_variants')
+            .order_by('pk')
+            .iterator(chunk_size=options['batch_size'])
+        )
+
+        cleared = 0
+        removed = (
+            Book.objects.filter(without_photo)
+            .exclude(photo_variants={})
+            .only('photo', 'photo_variants')
+        )
+        for book in removed.iterator(chunk_size=options['batch_size']):
+            clear_cover_derivatives(book)
+            cleared += 1
+
+        generated = failed = 0
+        # Os processos só recebem e devolvem bytes: leitura e gravação (storage
+        # e banco) ficam neste processo. Com spawn eles não herdam as conexões
+        # abertas com o banco
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=get_context('spawn')
+        ) as executor:
+            while batch := list(islice(books, options['batch_size'])):
+                futures = []
+                for book in batch:
+                    data = _read(book)
+                    if data is None:
+                        failed += 1
+                        continue
+                    futures.append((book, executor.submit(render_cover, data)))
+
+                for book, future in futures:
+                    try:
+                        rendered = future.result()
+                    except (OSError, ValueError) as exc:
+                        failed += 1
+                        self.stderr.write(f'Capa inválida ({book.pk}): {exc}')
+                        continue
+                    if save_cover_derivatives(book, rendered):
+                        generated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{generated} capa(s) processada(s), {failed} com erro, '
+                f'{cleared} sem capa limpa(s)'
+            )
+        )
@@ -0,0 +1,30 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from library.acervo.typeahead import build_index, index_path
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera o índice de sugestões (autocomplete) da busca do acervo. Pensado '
+        'para rodar periodicamente (cron): sem --full só relê os livros '
+        'alterados, e não reescreve o arquivo se nada mudou.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Reconstrói o índice do zero em vez de atualizar só o que mudou',
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        indexed = build_index(full=options['full'])
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{indexed} livro(s) indexado(s) em {index_path()} ({elapsed:.2f}s)'
+            )
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from library.acervo.card_cache import card_cache_stats, reset_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Mostra acertos e falhas do cache dos cards de livro'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Zera os contadores depois de mostrar',
+        )
+
+    def handle(self, *args, **options):
+        stats = card_cache_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(
+            f'{stats["hits"]} acerto(s), {stats["misses"]} falha(s) '
+            f'({ratio:.1%} de acertos)'
+        )
+        if options['reset']:
+            reset_card_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Contadores zerados'))
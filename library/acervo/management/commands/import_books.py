@@ -0,0 +1,223 @@
+import csv
+import io
+import json
+import sys
+from itertools import islice
+from pathlib import Path
+from time import perf_counter
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from library.acervo.cache import bump_catalog_version
+from library.acervo.categories import BookCategory, rebuild_category_counts
+from library.acervo.isbn import normalize_isbn
+from library.acervo.models import Book, Category, Stock
+from library.acervo.slugs import assign_slugs
+from library.acervo.typeahead import build_index
+
+REQUIRED_FIELDS = ('name', 'author', 'publisher', 'year')
+TEXT_FIELDS = ('name', 'author', 'publisher', 'description', 'isbn', 'language')
+# Separador das categorias na coluna ``categories`` do CSV
+CATEGORY_SEPARATOR = '|'
+
+
+def _read_csv(file):
+    # A linha 1 é o cabeçalho
+    yield from enumerate(csv.DictReader(file), start=2)
+
+
+def _read_jsonl(file):
+    # O JSON só é decodificado em _clean: uma linha inválida não para a leitura
+    for line, text in enumerate(file, start=1):
+        if text.strip():
+            yield line, text
+
+
+def _clean(row):
+    """Converte uma linha do arquivo em (campos do livro, categorias, exemplares)"""
+    if isinstance(row, str):
+        row = json.loads(row)
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError(f'campo(s) obrigatório(s) ausente(s): {", ".join(missing)}')
+
+    fields = {}
+    for field in TEXT_FIELDS:
+        value = row.get(field)
+        if value not in (None, ''):
+            value = str(value).strip()
+            max_length = Book._meta.get_field(field).max_length
+            if max_length and len(value) > max_length:
+                raise ValueError(f'{field} com mais de {max_length} caracteres')
+            fields[field] = value
+    try:
+        fields['isbn'] = normalize_isbn(fields.get('isbn'))
+    except ValidationError as exc:
+        raise ValueError(exc.messages[0]) from exc
+    fields['year'] = int(row['year'])
+    if row.get('pages') not in (None, ''):
+        fields['pages'] = int(row['pages'])
+
+    categories = row.get('categories') or []
+    if isinstance(categories, str):
+        categories = categories.split(CATEGORY_SEPARATOR)
+    categories = [name.strip() for name in categories if name and name.strip()]
+    max_length = Category._meta.get_field('name').max_length
+    if any(len(name) > max_length for name in categories):
+        raise ValueError(f'categoria com mais de {max_length} caracteres')
+
+    quantity = int(row.get('quantity') or 1)
+    if quantity < 0:
+        raise ValueError('quantity negativa')
+    return fields, categories, quantity
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa livros de um arquivo CSV ou JSONL (um objeto por linha), '
+        'gravando em lotes com bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Arquivo a importar ("-" lê da entrada)')
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help='Formato do arquivo; por padrão, deduzido da extensão',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Quantidade de livros gravados por transação',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or Path(options['path']).suffix.lstrip('.')
+        if file_format not in ('csv', 'jsonl'):
+            raise CommandError('Informe --format csv ou --format jsonl')
+
+        if options['path'] == '-':
+            file = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        else:
+            try:
+                file = open(options['path'], encoding='utf-8', newline='')
+            except OSError as exc:
+                raise CommandError(f'Não foi possível abrir o arquivo: {exc}') from exc
+
+        # Categorias são poucas: o mapa nome -> id fica todo em memória
+        self.category_ids = dict(Category.objects.values_list('name', 'id'))
+        self.touched_categories = set()
+
+        self.skipped = 0
+        start = perf_counter()
+        imported = 0
+        with file:
+            reader = _read_csv(file) if file_format == 'csv' else _read_jsonl(file)
+            rows = self._clean_rows(reader)
+            try:
+                while batch := list(islice(rows, options['batch_size'])):
+                    imported += self._import_batch(batch)
+                    elapsed = perf_counter() - start
+                    self.stdout.write(
+                        f'{imported} livro(s) importado(s) '
+                        f'({imported / elapsed:.0f} linhas/s)'
+                    )
+            except csv.Error as exc:
+                raise CommandError(f'CSV inválido: {exc}') from exc
+
+        if imported:
+            rebuild_category_counts(self.touched_categories)
+            bump_catalog_version()
+            build_index()
+
+        elapsed = perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{imported} livro(s) importado(s), '
+                f'{self.skipped} linha(s) ignorada(s) '
+                f'em {elapsed:.1f}s ({rate:.0f} linhas/s)'
+            )
+        )
+
+    def _clean_rows(self, reader):
+        for line, row in reader:
+            try:
+                yield _clean(row)
+            except (AttributeError, TypeError, ValueError) as exc:
+                # json.JSONDecodeError também é um ValueError
+                self.skipped += 1
+                self.stderr.write(f'Linha {line}: {exc}')
+
+    def _resolve_categories(self, names):
+        """Garante que as categorias existam, criando as novas num único INSERT"""
+        new = set(names) - self.category_ids.keys()
+        if new:
+            categories = [Category(name=name) for name in sorted(new)]
+            assign_slugs(Category, categories, 'name')
+            Category.objects.bulk_create(categories, ignore_conflicts=True)
+            # Com ignore_conflicts o banco não devolve os ids: relemos pelo nome.
+            # Uma categoria ignorada por conflito no slug (criada ao mesmo
+            # tempo por outro processo) fica de fora do mapa
+            self.category_ids.update(
+                Category.objects.filter(name__in=new).values_list('name', 'id')
+            )
+
+    def _without_repeated_isbns(self, batch):
+        """Descarta as linhas cujo ISBN já está no acervo ou antes no lote"""
+        isbns = {fields['isbn'] for fields, _, _ in batch if fields['isbn']}
+        taken = set(Book.objects.filter(isbn__in=isbns).values_list('isbn', flat=True))
+        kept = []
+        for row in batch:
+            isbn = row[0]['isbn']
+            if isbn and isbn in taken:
+                self.skipped += 1
+                self.stderr.write(f'ISBN {isbn} já cadastrado: {row[0]["name"]}')
+                continue
+            taken.add(isbn)
+            kept.append(row)
+        return kept
+
+    def _with_known_categories(self, batch):
+        """Descarta as linhas com alguma categoria que não pôde ser criada"""
+        kept = []
+        for row in batch:
+            missing = [name for name in row[1] if self.category_ids.get(name) is None]
+            if missing:
+                self.skipped += 1
+                self.stderr.write(
+                    f'Categoria {missing[0]} não pôde ser criada: {row[0]["name"]}'
+                )
+                continue
+            kept.append(row)
+        return kept
+
+    def _import_batch(self, batch):
+        with transaction.atomic():
+            batch = self._without_repeated_isbns(batch)
+            self._resolve_categories(name for _, names, _ in batch for name in names)
+            batch = self._with_known_categories(batch)
+            books = [Book(**fields) for fields, _, _ in batch]
+            assign_slugs(Book, books, 'name')
+            Book.objects.bulk_create(books)
+
+            Stock.objects.bulk_create(
+                Stock(book=book, quantity=quantity, available=quantity)
+                for book, (_, _, quantity) in zip(books, batch)
+            )
+            # Sem exemplares, o livro entra indisponível
+            unavailable = [book.pk for book, (_, _, q) in zip(books, batch) if not q]
+            if unavailable:
+                Book.objects.filter(pk__in=unavailable).update(is_available=False)
+
+            links = [
+                BookCategory(book_id=book.pk, category_id=category_id)
+                for book, (_, names, _) in zip(books, batch)
+                for category_id in {self.category_ids[name] for name in names}
+            ]
+            BookCategory.objects.bulk_create(links)
+            self.touched_categories.update(link.category_id for link in links)
+        return len(books)
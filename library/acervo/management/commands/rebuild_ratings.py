@@ -0,0 +1,30 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from library.acervo.models import Book
+from library.acervo.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os agregados de avaliação (contagem, soma e estrelas) dos livros'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Quantidade de livros recalculados por transação',
+        )
+
+    def handle(self, *args, **options):
+        book_ids = Book.objects.order_by('pk').values_list('pk', flat=True).iterator()
+        updated = 0
+        while batch := list(islice(book_ids, options['batch_size'])):
+            with transaction.atomic():
+                updated += rebuild_rating_aggregates(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{updated} livro(s) com agregados atualizados')
+        )
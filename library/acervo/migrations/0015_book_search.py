@@ -0,0 +1,97 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:35
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations, models
+
+CREATE_SEARCH_CONFIG = """
+CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese);
+ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+"""
+
+DROP_SEARCH_CONFIG = 'DROP TEXT SEARCH CONFIGURATION IF EXISTS portuguese_unaccent;'
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0014_alter_book_categories'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunSQL(CREATE_SEARCH_CONFIG, DROP_SEARCH_CONFIG),
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.CombinedSearchVector(
+                        django.contrib.postgres.search.CombinedSearchVector(
+                            django.contrib.postgres.search.SearchVector(
+                                'name', config='portuguese_unaccent', weight='A'
+                            ),
+                            '||',
+                            django.contrib.postgres.search.SearchVector(
+                                'author', config='portuguese_unaccent', weight='B'
+                            ),
+                            django.contrib.postgres.search.SearchConfig(
+                                'portuguese_unaccent'
+                            ),
+                        ),
+                        '||',
+                        django.contrib.postgres.search.SearchVector(
+                            'publisher', config='portuguese_unaccent', weight='C'
+                        ),
+                        django.contrib.postgres.search.SearchConfig(
+                            'portuguese_unaccent'
+                        ),
+                    ),
+                    '||',
+                    django.contrib.postgres.search.SearchVector(
+                        'description', config='portuguese_unaccent', weight='D'
+                    ),
+                    django.contrib.postgres.search.SearchConfig('portuguese_unaccent'),
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['search_vector'], name='book_search_vector_idx'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'
+                ),
+                name='book_name_trgm_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('author'), name='gin_trgm_ops'
+                ),
+                name='book_author_trgm_idx',
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper('publisher'),
+                    name='gin_trgm_ops',
+                ),
+                name='book_publisher_trgm_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:51
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_book_count(apps, schema_editor):
+    Book = apps.get_model('acervo', 'Book')
+    Category = apps.get_model('acervo', 'Category')
+
+    rows = (
+        Book.categories.through.objects.values('category_id')
+        .annotate(total=Count('*'))
+        .order_by()
+    )
+    for row in rows.iterator():
+        Category.objects.filter(pk=row['category_id']).update(book_count=row['total'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0017_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_book_count, migrations.RunPython.noop),
+        # A listagem por categoria percorre os vínculos de uma categoria em
+        # ordem de livro; o índice único do Django começa por book_id
+        migrations.RunSQL(
+            'CREATE INDEX acervo_book_categories_category_book_idx '
+            'ON acervo_book_categories (category_id, book_id)',
+            'DROP INDEX IF EXISTS acervo_book_categories_category_book_idx',
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef, Q, Sum
+
+
+def merge_duplicate_stocks(apps, schema_editor):
+    Stock = apps.get_model('acervo', 'Stock')
+
+    duplicated = (
+        Stock.objects.values('book_id')
+        .annotate(total=Sum('quantity'), rows=Count('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicated.iterator():
+        stocks = Stock.objects.filter(book_id=row['book_id']).order_by('id')
+        first = stocks.first()
+        stocks.exclude(pk=first.pk).delete()
+        Stock.objects.filter(pk=first.pk).update(quantity=row['total'])
+    Stock.objects.update(available=models.F('quantity'))
+
+
+def populate_available(apps, schema_editor):
+    Book = apps.get_model('acervo', 'Book')
+    Stock = apps.get_model('acervo', 'Stock')
+    Emprestimo = apps.get_model('emprestimos', 'Emprestimo')
+
+    Stock.objects.bulk_create(
+        [
+            Stock(book_id=book_id, quantity=1, available=1)
+            for book_id in Book.objects.filter(stock__isnull=True).values_list(
+                'id', flat=True
+            )
+        ],
+        batch_size=1000,
+    )
+
+    loans = (
+        Emprestimo.objects.filter(date_returned__isnull=True)
+        .values('book_id')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    active = {row['book_id']: row['total'] for row in loans.iterator()}
+    for stock in Stock.objects.filter(book_id__in=active).iterator():
+        stock.available = max(stock.quantity - active[stock.book_id], 0)
+        stock.save(update_fields=['available'])
+
+    has_copies = Exists(Stock.objects.filter(book=OuterRef('pk'), available__gt=0))
+    Book.objects.update(is_available=has_copies)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0018_category_book_count'),
+        ('emprestimos', '0004_historico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='available',
+            field=models.PositiveIntegerField(
+                default=1, editable=False, verbose_name='disponíveis'
+            ),
+        ),
+        migrations.RunPython(merge_duplicate_stocks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stock',
+            name='book',
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='stock',
+                to='acervo.book',
+                verbose_name='livro',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='stock',
+            constraint=models.CheckConstraint(
+                condition=Q(available__lte=models.F('quantity')),
+                name='stock_available_lte_quantity',
+            ),
+        ),
+        migrations.RunPython(populate_available, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0019_stock_available'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='photo_placeholder',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:16
+
+import logging
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import migrations, models
+
+import library.acervo.isbn
+
+logger = logging.getLogger('library')
+
+# ISBNs originais dos livros alterados por esta migração; a reversão os
+# devolve a partir daqui
+ORIGINAL_TABLE = 'acervo_book_isbn_original'
+
+CREATE_ORIGINAL_TABLE = f"""
+CREATE TABLE {ORIGINAL_TABLE} (
+    book_id bigint PRIMARY KEY,
+    isbn varchar(13) NOT NULL
+)
+"""
+
+DROP_ORIGINAL_TABLE = f'DROP TABLE IF EXISTS {ORIGINAL_TABLE}'
+
+
+def normalize_isbns(apps, schema_editor):
+    """Grava os ISBNs como ISBN-13 só com dígitos.
+
+    ISBNs inválidos viram NULL (o save() do livro não aceitaria gravá-los de
+    novo) e são registrados no log. Todo valor alterado fica guardado na
+    tabela ORIGINAL_TABLE. Livros que passariam a ter o mesmo ISBN interrompem
+    a migração: o acervo precisa ser corrigido antes.
+    """
+    Book = apps.get_model('acervo', 'Book')
+    changed = {}
+    by_isbn = defaultdict(list)
+    books = Book.objects.exclude(isbn__isnull=True).order_by('pk')
+    for pk, isbn in books.values_list('pk', 'isbn').iterator():
+        try:
+            normalized = library.acervo.isbn.normalize_isbn(isbn)
+        except ValidationError:
+            logger.warning('ISBN inválido removido do livro %s: %r', pk, isbn)
+            normalized = None
+        if normalized:
+            by_isbn[normalized].append((pk, isbn))
+        if normalized != isbn:
+            changed[pk] = (isbn, normalized)
+
+    duplicates = {isbn: rows for isbn, rows in by_isbn.items() if len(rows) > 1}
+    if duplicates:
+        listing = '; '.join(
+            f'{isbn}: ' + ', '.join(f'livro {pk} ({old!r})' for pk, old in rows)
+            for isbn, rows in sorted(duplicates.items())
+        )
+        raise RuntimeError(
+            f'Livros com o mesmo ISBN; corrija antes de migrar: {listing}'
+        )
+
+    if not changed:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {ORIGINAL_TABLE} (book_id, isbn) VALUES (%s, %s)',
+            [(pk, isbn) for pk, (isbn, _) in changed.items()],
+        )
+    for pk, (_, normalized) in changed.items():
+        Book.objects.filter(pk=pk).update(isbn=normalized)
+
+
+def restore_isbns(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE acervo_book SET isbn = original.isbn '
+            f'FROM {ORIGINAL_TABLE} original WHERE original.book_id = acervo_book.id'
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0020_book_photo_variants'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_ORIGINAL_TABLE, DROP_ORIGINAL_TABLE),
+        migrations.AlterField(
+            model_name='book',
+            name='isbn',
+            field=models.CharField(
+                blank=True,
+                max_length=17,
+                null=True,
+                validators=[library.acervo.isbn.validate_isbn],
+            ),
+        ),
+        migrations.RunPython(normalize_isbns, restore_isbns),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('isbn__isnull', False)),
+                fields=('isbn',),
+                name='book_isbn_unique',
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0021_book_isbn_unique'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookreview',
+            index=models.Index(
+                fields=['book', '-created_at', '-id'], name='bookreview_book_feed_idx'
+            ),
+        ),
+    ]
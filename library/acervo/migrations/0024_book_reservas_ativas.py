@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0023_book_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='reservas_ativas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
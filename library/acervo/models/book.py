@@ -1,9 +1,25 @@
+from contextlib import suppress
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.exceptions import ValidationError
 from django.db import models
-from django.utils.text import slugify
+from django.db.models.functions import Upper
 
+from library.acervo.isbn import normalize_isbn, validate_isbn
 from library.acervo.models.category import Category
+from library.acervo.slugs import refresh_slug
 from library.core.models import AbstractBaseModel
 
+# Configuração de busca criada na migração 0015: português + unaccent
+SEARCH_CONFIG = 'portuguese_unaccent'
+
+
+class BookManager(models.Manager):
+    def get_queryset(self):
+        # O tsvector só é usado pelo banco nas buscas; não carregamos nas instâncias
+        return super().get_queryset().defer('search_vector')
+
 
 class Book(AbstractBaseModel):
     name = models.CharField(max_length=100, verbose_name='nome')
@@ -14,8 +30,15 @@ class Book(AbstractBaseModel):
     publisher = models.CharField(max_length=100, verbose_name='editora')
     year = models.IntegerField(verbose_name='ano')
     photo = models.ImageField(upload_to='books/', blank=True, null=True)
+    # Versões redimensionadas da capa, geradas por library.acervo.covers
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
+    photo_placeholder = models.TextField(blank=True, default='', editable=False)
     description = models.TextField(blank=True, null=True)
-    isbn = models.CharField(max_length=13, blank=True, null=True)
+    # Gravado sempre como ISBN-13 só com dígitos; o tamanho maior é para o
+    # formulário aceitar o ISBN com hífens antes da normalização
+    isbn = models.CharField(
+        max_length=17, blank=True, null=True, validators=[validate_isbn]
+    )
     pages = models.IntegerField(verbose_name='páginas', blank=True, null=True)
     language = models.CharField(
         max_length=50, verbose_name='idioma', blank=True, null=True
@@ -24,40 +47,52 @@ class Book(AbstractBaseModel):
         Category, verbose_name='categorias', blank=True, related_name='books'
     )
     is_available = models.BooleanField(default=True)
+    # Agregados das avaliações, mantidos por library.acervo.ratings
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+    # Tamanho da fila de reservas, mantido por library.emprestimos.fila
+    reservas_ativas = models.PositiveIntegerField(default=0, editable=False)
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('author', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('publisher', weight='C', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='D', config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = BookManager()
 
     @property
     def average_rating(self):
-        """Calcula a média das avaliações do livro usando lambda e filter"""
-        valid_ratings = list(
-            filter(lambda review: review.rating is not None, self.reviews.all())
-        )
-
-        if not valid_ratings:
+        """Média das avaliações, a partir dos agregados mantidos no livro"""
+        if not self.rating_count:
             return 0
-
-        total = sum(map(lambda review: review.rating, valid_ratings))
-        return round(total / len(valid_ratings), 2)
+        return round(self.rating_sum / self.rating_count, 2)
 
     @property
     def total_reviews(self):
         """Retorna o total de avaliações do livro"""
-        return self.reviews.count()
+        return self.rating_count
 
     @property
     def rating_distribution(self):
         """Retorna a distribuição de avaliações por estrelas"""
-        reviews = self.reviews.all()
-
-        distribution = {
-            'rating_5': reviews.filter(rating=5).count(),
-            'rating_4': reviews.filter(rating=4).count(),
-            'rating_3': reviews.filter(rating=3).count(),
-            'rating_2': reviews.filter(rating=2).count(),
-            'rating_1': reviews.filter(rating=1).count(),
+        return {
+            'rating_5': self.rating_5,
+            'rating_4': self.rating_4,
+            'rating_3': self.rating_3,
+            'rating_2': self.rating_2,
+            'rating_1': self.rating_1,
         }
 
-        return distribution
-
     @property
     def emprestimos_ativos(self):
         return self.emprestimos.filter(date_returned__isnull=True)
@@ -65,10 +100,59 @@ class Book(AbstractBaseModel):
     class Meta:
         verbose_name = 'Livro'
         verbose_name_plural = 'Livros'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['isbn'],
+                condition=models.Q(isbn__isnull=False),
+                name='book_isbn_unique',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['name', 'id'], name='book_name_id_idx'),
+            # O maior updated_at entra no ETag das páginas do catálogo
+            models.Index(fields=['updated_at'], name='book_updated_at_idx'),
+            GinIndex(fields=['search_vector'], name='book_search_vector_idx'),
+            # Os índices de trigramas usam UPPER() para atender também aos
+            # filtros icontains, que o Django traduz para UPPER(...) LIKE UPPER(...)
+            GinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'), name='book_name_trgm_idx'
+            ),
+            GinIndex(
+                OpClass(Upper('author'), name='gin_trgm_ops'),
+                name='book_author_trgm_idx',
+            ),
+            GinIndex(
+                OpClass(Upper('publisher'), name='gin_trgm_ops'),
+                name='book_publisher_trgm_idx',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nome gravado: o slug só é gerado de novo se o nome mudar
+        instance._loaded_slug_source = instance.__dict__.get('name')
+        return instance
+
+    def _normalize_isbn(self):
+        # Um ISBN inválido fica como está: quem o rejeita é o validador do
+        # campo, em full_clean() e nos formulários; save() não valida
+        with suppress(ValidationError):
+            self.isbn = normalize_isbn(self.isbn)
+
+    def clean(self):
+        super().clean()
+        # Antes de validate_constraints: a unicidade vale para o ISBN-13
+        self._normalize_isbn()
 
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.name)
+        if refresh_slug(self):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'slug'}
+        self._normalize_isbn()
         super().save(*args, **kwargs)
+        self._loaded_slug_source = self.name
 
     def __str__(self):
         return f'{self.name} - {self.author}'
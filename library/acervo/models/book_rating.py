@@ -1,5 +1,5 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
 
 from library.acervo.models import Book
 from library.usuarios.models import User
@@ -31,6 +31,25 @@ class BookReview(models.Model):
         verbose_name = 'Avaliação'
         verbose_name_plural = 'Avaliações'
         unique_together = ['book', 'user']
+        indexes = [
+            # Páginas de avaliações de um livro (KeysetPaginator)
+            models.Index(
+                fields=['book', '-created_at', '-id'], name='bookreview_book_feed_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nota e livro carregados: usados para ajustar os agregados ao editar
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_book_id = instance.__dict__.get('book_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Os agregados do livro são atualizados no post_save, na mesma transação
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return f'{self.user.username} - {self.book.name} ({self.rating}★)'
@@ -1,6 +1,6 @@
 from django.db import models
-from django.utils.text import slugify
 
+from library.acervo.slugs import refresh_slug
 from library.core.models import AbstractBaseModel
 
 
@@ -9,14 +9,27 @@ class Category(AbstractBaseModel):
     slug = models.SlugField(
         max_length=100, verbose_name='slug', default='slug', unique=True, blank=True
     )
+    # Total de livros da categoria, mantido por library.acervo.categories
+    book_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = 'Categoria'
         verbose_name_plural = 'Categorias'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nome gravado: o slug só é gerado de novo se o nome mudar
+        instance._loaded_slug_source = instance.__dict__.get('name')
+        return instance
+
     def save(self, *args, **kwargs):
-        self.slug = slugify(self.name)
+        if refresh_slug(self):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'slug'}
         super().save(*args, **kwargs)
+        self._loaded_slug_source = self.name
 
     def __str__(self):
         return self.name
@@ -1,12 +1,102 @@
-from django.db import models
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Greatest, Least, Now
 
 from library.acervo.models.book import Book
 from library.core.models import AbstractBaseModel
 
 
+class StockManager(models.Manager):
+    """Movimentação de exemplares com UPDATEs condicionais.
+
+    Cada operação é um único ``UPDATE ... WHERE`` que só altera a linha se
+    ainda houver exemplar para emprestar (ou para devolver), então
+    empréstimos simultâneos do mesmo título nunca deixam o estoque negativo
+    nem dependem de ler o valor antes de gravar.
+    """
+
+    def checkout(self, book_id):
+        """Retira um exemplar da estante; False se não houver disponível"""
+        updated = self.filter(book_id=book_id, available__gt=0).update(
+            available=F('available') - 1, updated_at=Now()
+        )
+        if updated:
+            sync_availability(book_id)
+        return bool(updated)
+
+    def checkin(self, book_id):
+        """Devolve um exemplar à estante; False se todos já estavam nela"""
+        updated = self.filter(book_id=book_id, available__lt=F('quantity')).update(
+            available=F('available') + 1, updated_at=Now()
+        )
+        if updated:
+            sync_availability(book_id)
+        return bool(updated)
+
+    def restock(self, copies):
+        """Devolve à estante vários exemplares de vários livros de uma vez.
+
+        ``copies`` é um dict {livro: exemplares}; livros com a mesma
+        quantidade vão no mesmo UPDATE, e a estante nunca passa do total.
+        """
+        by_count = defaultdict(list)
+        for book_id, count in copies.items():
+            if count > 0:
+                by_count[count].append(book_id)
+        for count, book_ids in by_count.items():
+            self.filter(book_id__in=book_ids).update(
+                available=Least(F('available') + count, F('quantity')),
+                updated_at=Now(),
+            )
+        book_ids = [book_id for book_ids in by_count.values() for book_id in book_ids]
+        if book_ids:
+            sync_availability(*book_ids)
+
+
 class Stock(AbstractBaseModel):
-    book = models.ForeignKey(Book, on_delete=models.CASCADE, verbose_name='livro')
+    book = models.OneToOneField(
+        Book, on_delete=models.CASCADE, verbose_name='livro', related_name='stock'
+    )
     quantity = models.PositiveIntegerField(verbose_name='quantidade', default=1)
+    # Exemplares na estante; quantity - available estão emprestados
+    available = models.PositiveIntegerField(
+        verbose_name='disponíveis', default=1, editable=False
+    )
+
+    objects = StockManager()
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(available__lte=F('quantity')),
+                name='stock_available_lte_quantity',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self._state.adding:
+                self.available = self.quantity
+            else:
+                # Mudar a quantidade acrescenta ou retira exemplares da estante
+                # sem sobrescrever empréstimos gravados por outras requisições
+                self.available = Greatest(
+                    F('available') + (self.quantity - F('quantity')), Value(0)
+                )
+            super().save(*args, **kwargs)
+            if not isinstance(self.available, int):
+                self.refresh_from_db(fields=['available'])
+            sync_availability(self.book_id)
 
     def __str__(self):
         return f'{self.book} - {self.quantity}'
+
+
+def sync_availability(*book_ids):
+    """Atualiza Book.is_available a partir do estoque, só se o valor mudou"""
+    has_copies = Exists(Stock.objects.filter(book=OuterRef('pk'), available__gt=0))
+    Book.objects.filter(pk__in=book_ids).exclude(is_available=has_copies).update(
+        is_available=has_copies, updated_at=Now()
+    )
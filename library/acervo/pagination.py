@@ -0,0 +1,101 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _default(value):
+    # isoformat() completo: o DjangoJSONEncoder trunca microssegundos, o que
+    # faria o cursor pular ou repetir linhas com o mesmo milissegundo
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(values):
+    data = json.dumps(values, default=_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginação por cursor (keyset) sobre uma ordenação estável.
+
+    Em vez de OFFSET, cada página filtra a partir dos valores de ordenação
+    da última linha da página anterior, então o custo de buscar a página N
+    não cresce com N. A ordenação deve terminar em uma coluna única (ex.: id).
+    As linhas podem ser instâncias de modelo ou dicionários de ``.values()``.
+    """
+
+    def __init__(self, queryset, ordering, per_page=24):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    def _after(self, values):
+        if len(values) != len(self.fields):
+            raise InvalidCursor(values)
+
+        condition = Q()
+        for position, ordering in enumerate(self.ordering):
+            field = self.fields[position]
+            lookup = 'lt' if ordering.startswith('-') else 'gt'
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for previous, value in zip(self.fields[:position], values):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def _values(self, row):
+        if isinstance(row, dict):
+            return [row[field] for field in self.fields]
+        return [getattr(row, field) for field in self.fields]
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            try:
+                queryset = queryset.filter(self._after(decode_cursor(cursor)))
+            except (TypeError, ValueError, ValidationError) as exc:
+                raise InvalidCursor(cursor) from exc
+
+        rows = list(queryset[: self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[: self.per_page]
+            next_cursor = encode_cursor(self._values(rows[-1]))
+        return KeysetPage(rows, next_cursor)
@@ -0,0 +1,115 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from library.acervo.models import Book, BookReview
+
+STARS = range(1, 6)
+
+RATING_FIELDS = (
+    'rating_count',
+    'rating_sum',
+    *(f'rating_{star}' for star in STARS),
+)
+
+
+def apply_rating_change(book_id, added=None, removed=None):
+    """Atualiza os agregados do livro com um único UPDATE atômico.
+
+    ``added`` é a nota que entrou e ``removed`` a que saiu (ambas opcionais),
+    então criar, editar e excluir uma avaliação são o mesmo caso.
+    """
+    deltas = dict.fromkeys(RATING_FIELDS, 0)
+    for rating, sign in ((added, 1), (removed, -1)):
+        if rating is None:
+            continue
+        deltas['rating_count'] += sign
+        deltas['rating_sum'] += sign * int(rating)
+        deltas[f'rating_{int(rating)}'] += sign
+
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        Book.objects.filter(pk=book_id).update(updated_at=Now(), **changes)
+
+
+UPSERT_REVIEW_SQL = """
+WITH previous AS (
+    SELECT rating FROM {table}
+    WHERE book_id = %(book_id)s AND user_id = %(user_id)s
+), saved AS (
+    INSERT INTO {table} (book_id, user_id, rating, comment, created_at, updated_at)
+    VALUES (%(book_id)s, %(user_id)s, %(rating)s, %(comment)s, %(now)s, %(now)s)
+    ON CONFLICT (book_id, user_id) DO UPDATE
+        SET rating = EXCLUDED.rating,
+            comment = EXCLUDED.comment,
+            updated_at = EXCLUDED.updated_at
+    RETURNING id, xmax = 0 AS inserted
+)
+SELECT saved.id, saved.inserted, (SELECT rating FROM previous) FROM saved
+"""
+
+
+def upsert_review(book_id, user_id, rating, comment):
+    """Cria ou atualiza a avaliação do usuário com um único INSERT ... ON CONFLICT.
+
+    Os agregados do livro são ajustados na mesma transação. A nota anterior
+    vem da mesma instrução, lida do snapshot de antes do upsert (que trava a
+    linha); se outra requisição criou a avaliação ao mesmo tempo, ela não
+    aparece ali e os agregados do livro são recalculados. Não dispara os
+    sinais de BookReview.
+    """
+    sql = UPSERT_REVIEW_SQL.format(table=BookReview._meta.db_table)
+    params = {
+        'book_id': book_id,
+        'user_id': user_id,
+        'rating': int(rating),
+        'comment': comment,
+        'now': timezone.now(),
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        review_id, inserted, previous = cursor.fetchone()
+        if inserted:
+            apply_rating_change(book_id, added=rating)
+        elif previous is None:
+            rebuild_rating_aggregates([book_id])
+        elif int(previous) != int(rating):
+            apply_rating_change(book_id, added=rating, removed=previous)
+    return review_id, inserted
+
+
+def rebuild_rating_aggregates(book_ids):
+    """Recalcula os agregados dos livros informados a partir das avaliações.
+
+    Usa uma consulta agrupada para o lote inteiro e grava apenas os livros
+    cujos valores mudaram. Retorna quantos livros foram atualizados.
+    """
+    book_ids = list(book_ids)
+    totals = {
+        row.pop('book'): row
+        for row in BookReview.objects.filter(book__in=book_ids)
+        .values('book')
+        .annotate(
+            rating_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{star}': Count('id', filter=Q(rating=star)) for star in STARS},
+        )
+        .order_by()
+    }
+
+    changed = []
+    for book in Book.objects.filter(pk__in=book_ids).only('pk', *RATING_FIELDS):
+        expected = totals.get(book.pk, {})
+        values = {field: expected.get(field, 0) for field in RATING_FIELDS}
+        if any(getattr(book, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(book, field, value)
+            changed.append(book)
+
+    if changed:
+        now = timezone.now()
+        for book in changed:
+            book.updated_at = now
+        Book.objects.bulk_update(changed, [*RATING_FIELDS, 'updated_at'])
+    return len(changed)
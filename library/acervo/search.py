@@ -0,0 +1,47 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest, Upper
+
+from library.acervo.models.book import SEARCH_CONFIG
+
+# Campos cobertos pelos índices de trigramas (ver Book.Meta.indexes)
+TRIGRAM_FIELDS = ('name', 'author', 'publisher')
+
+SEARCH_ORDERING = ('-search_rank', 'name', 'id')
+
+
+def search_books(queryset, text):
+    """Busca ranqueada por texto completo, tolerante a erros de digitação.
+
+    Combina o tsvector em português (sem acentos) com similaridade de
+    trigramas em nome, autor e editora. Cada condição usa seu próprio índice
+    GIN, então a busca não percorre a tabela inteira.
+    """
+    text = ' '.join(text.split())
+    if not text:
+        return queryset
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    condition = Q(search_vector=query)
+    for field in TRIGRAM_FIELDS:
+        condition |= Q(**{f'{field}_upper__trigram_word_similar': text.upper()})
+
+    return (
+        queryset.alias(**{f'{field}_upper': Upper(field) for field in TRIGRAM_FIELDS})
+        .filter(condition)
+        .annotate(
+            # double precision: o valor volta exato no cursor da paginação
+            search_rank=Cast(
+                SearchRank(F('search_vector'), query)
+                + Greatest(
+                    *(TrigramWordSimilarity(text, field) for field in TRIGRAM_FIELDS)
+                ),
+                FloatField(),
+            )
+        )
+        .order_by(*SEARCH_ORDERING)
+    )
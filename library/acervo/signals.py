@@ -0,0 +1,121 @@
+from collections import Counter
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from library.acervo.cache import bump_catalog_version
+from library.acervo.categories import apply_count_changes, linked_categories
+from library.acervo.covers import release_cover_derivatives
+from library.acervo.models import Book, BookReview, Category, Stock
+from library.acervo.ratings import apply_rating_change, rebuild_rating_aggregates
+from library.core.storage import track_files
+
+track_files(Book, 'photo')
+
+
+@receiver(post_save, sender=Book)
+def create_stock(sender, instance, created, raw, **kwargs):
+    # Todo livro novo entra no acervo com um exemplar na estante
+    if created and not raw:
+        Stock.objects.get_or_create(book=instance)
+
+
+@receiver(post_save, sender=BookReview)
+def update_rating_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    loaded_rating = getattr(instance, '_loaded_rating', None)
+    loaded_book_id = getattr(instance, '_loaded_book_id', None)
+    if created:
+        apply_rating_change(instance.book_id, added=instance.rating)
+    elif loaded_rating is None or loaded_book_id is None:
+        # Instância não veio do banco (ou veio com a nota/livro adiados pelo
+        # only()/defer()): não sabemos o valor anterior
+        rebuild_rating_aggregates({instance.book_id, loaded_book_id} - {None})
+    elif instance._loaded_book_id != instance.book_id:
+        apply_rating_change(instance._loaded_book_id, removed=instance._loaded_rating)
+        apply_rating_change(instance.book_id, added=instance.rating)
+    elif int(instance._loaded_rating) != int(instance.rating):
+        apply_rating_change(
+            instance.book_id, added=instance.rating, removed=instance._loaded_rating
+        )
+
+    instance._loaded_rating = instance.rating
+    instance._loaded_book_id = instance.book_id
+
+
+@receiver(pre_delete, sender=BookReview)
+def collect_deleted_rating(sender, instance, **kwargs):
+    # Sai do agregado a nota gravada no banco, não a editada em memória. Lida
+    # antes da exclusão: depois dela, um campo adiado não pode ser carregado
+    rating = getattr(instance, '_loaded_rating', None)
+    book_id = getattr(instance, '_loaded_book_id', None)
+    if rating is None or book_id is None:
+        rating, book_id = (
+            BookReview.objects.filter(pk=instance.pk)
+            .values_list('rating', 'book_id')
+            .get()
+        )
+    instance._deleted_rating = (rating, book_id)
+
+
+@receiver(post_delete, sender=BookReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+    rating, book_id = instance.__dict__.pop('_deleted_rating')
+    apply_rating_change(book_id, removed=rating)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def invalidate_catalog_cache_on_categories(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def update_category_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=False: instance é o livro e pk_set, categorias; True: o contrário
+    if action == 'post_add' and pk_set:
+        if reverse:
+            apply_count_changes(Counter({instance.pk: len(pk_set)}))
+        else:
+            apply_count_changes(Counter(pk_set))
+    elif action in ('pre_remove', 'pre_clear'):
+        # Só os vínculos que existem de fato saem da contagem
+        ids = pk_set if action == 'pre_remove' else None
+        if reverse:
+            changes = linked_categories(ids, [instance.pk])
+        else:
+            changes = linked_categories([instance.pk], ids)
+        instance._category_count_changes = changes
+    elif action in ('post_remove', 'post_clear'):
+        apply_count_changes(instance.__dict__.pop('_category_count_changes', {}), -1)
+
+
+@receiver(pre_delete, sender=Book)
+def collect_book_categories(sender, instance, **kwargs):
+    # Os vínculos são apagados em cascata, sem m2m_changed
+    instance._category_count_changes = linked_categories([instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def update_category_counts_on_delete(sender, instance, **kwargs):
+    apply_count_changes(instance.__dict__.pop('_category_count_changes', {}), -1)
+
+
+@receiver(post_delete, sender=Book)
+def delete_cover_derivatives(sender, instance, **kwargs):
+    release_cover_derivatives(instance)
@@ -0,0 +1,70 @@
+"""Slugs únicos para livros e categorias.
+
+O slug base é o nome em slugify. Se ele já existe, ganha um sufixo
+aleatório curto (``dom-casmurro-d86b388e``), tanto na importação em lote
+quanto no save() dos modelos.
+"""
+
+from uuid import uuid4
+
+from django.utils.text import slugify
+
+# Tamanho do sufixo aleatório usado quando o slug já existe
+SLUG_SUFFIX_LENGTH = 8
+
+
+def _max_length(model):
+    return model._meta.get_field('slug').max_length
+
+
+def unique_slug(base, taken, max_length):
+    slug = base
+    while not slug or slug in taken:
+        prefix = base[: max_length - SLUG_SUFFIX_LENGTH - 1]
+        slug = f'{prefix}-{uuid4().hex[:SLUG_SUFFIX_LENGTH]}'.lstrip('-')
+    taken.add(slug)
+    return slug
+
+
+def assign_slugs(model, objects, source):
+    """Preenche o slug de cada objeto com uma consulta só para o lote inteiro.
+
+    Os que já existem no banco ou se repetem no lote ganham o sufixo.
+    """
+    max_length = _max_length(model)
+    bases = [slugify(getattr(obj, source))[:max_length] for obj in objects]
+    taken = set(
+        model._default_manager.filter(slug__in=set(bases)).values_list(
+            'slug', flat=True
+        )
+    )
+    for obj, base in zip(objects, bases):
+        obj.slug = unique_slug(base, taken, max_length)
+
+
+def refresh_slug(instance, source='name'):
+    """Gera o slug no save() só para objetos novos, sem slug ou renomeados.
+
+    Um slug já gravado (inclusive o com sufixo dado pela importação) é
+    mantido enquanto o nome não mudar, então a URL do livro não muda numa
+    edição qualquer. Retorna True se o slug foi gerado.
+    """
+    loaded = getattr(instance, '_loaded_slug_source', None)
+    renamed = (
+        loaded is not None
+        and source in instance.__dict__
+        and slugify(getattr(instance, source)) != slugify(loaded)
+    )
+    if not (instance._state.adding or not instance.slug or renamed):
+        return False
+
+    model = type(instance)
+    max_length = _max_length(model)
+    base = slugify(getattr(instance, source))[:max_length]
+    taken = set(
+        model._default_manager.filter(slug=base)
+        .exclude(pk=instance.pk)
+        .values_list('slug', flat=True)
+    )
+    instance.slug = unique_slug(base, taken, max_length)
+    return True
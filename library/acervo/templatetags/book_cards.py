@@ -0,0 +1,14 @@
+from django import template
+
+from library.acervo.card_cache import render_book_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def book_cards(books, template_name):
+    """Cards dos livros, cada um em cache até o livro mudar.
+
+    Uso: ``{% book_cards page.object_list "cards/book_grid.html" %}``.
+    """
+    return render_book_cards(books, template_name)
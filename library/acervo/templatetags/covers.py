@@ -0,0 +1,44 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from library.acervo.covers import cover_variants
+
+register = template.Library()
+
+
+def _srcset(storage, paths):
+    return ', '.join(
+        f'{storage.url(path)} {width}w'
+        for width, path in sorted(paths.items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.simple_tag
+def cover_img(book, sizes='100vw', **attrs):
+    """Capa do livro com srcset WebP/JPEG e placeholder desfocado.
+
+    Uso: ``{% cover_img book sizes="300px" class="card-img-top" alt=book.name %}``.
+    Enquanto as versões não foram geradas, usa a imagem original.
+    """
+    variants = cover_variants(book)
+    if variants is None:
+        return format_html('<img src="{}"{}>', book.photo.url, flatatt(attrs))
+
+    storage = book.photo.storage
+    jpeg = variants['jpeg']
+    if book.photo_placeholder:
+        background = f'background: url({book.photo_placeholder}) center / cover'
+        style = attrs.get('style', '').strip().rstrip(';')
+        attrs['style'] = f'{style}; {background}' if style else background
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}></picture>',
+        _srcset(storage, variants['webp']),
+        sizes,
+        storage.url(jpeg[max(jpeg, key=int)]),
+        _srcset(storage, jpeg),
+        sizes,
+        flatatt(attrs),
+    )
@@ -1,12 +1,39 @@
-from datetime import datetime
+import io
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
 
-from django.test import TestCase
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from django.utils import timezone
 from model_bakery import baker
+from PIL import Image
 
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.emprestimos.models.reserva import Reserva
+from library.emprestimos.services import devolver, reservar
+
+from . import covers, typeahead, views
+from .card_cache import card_cache_stats
+from .categories import rebuild_category_counts
+from .imaging import render_cover
+from .isbn import normalize_isbn
 from .models.book import Book
+from .models.book_rating import BookReview
 from .models.category import Category
 from .models.stock import Stock
+from .ratings import upsert_review
 
 # Create your tests here.
 
@@ -40,15 +67,45 @@ class BookTest(TestCase):
 class StockTest(TestCase):
     def setUp(self):
         self.book = baker.make(Book, name='Test Book', author='Test Author')
-        self.stock = Stock(
-            book=self.book,
-            quantity=10,
-        )
+        # O estoque é criado junto com o livro
+        self.stock = self.book.stock
+        self.stock.quantity = 10
         self.stock.save()
 
     def test_stock_str(self):
         self.assertEqual(str(self.stock), 'Test Book - Test Author - 10')
 
+    def test_checkout_and_checkin(self):
+        for _ in range(10):
+            self.assertTrue(Stock.objects.checkout(self.book.pk))
+        self.assertFalse(Stock.objects.checkout(self.book.pk))
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.is_available)
+
+        self.assertTrue(Stock.objects.checkin(self.book.pk))
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.is_available)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.available, 1)
+
+    def test_checkin_never_exceeds_quantity(self):
+        self.assertFalse(Stock.objects.checkin(self.book.pk))
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.available, 10)
+
+    def test_quantity_change_keeps_loans(self):
+        Stock.objects.checkout(self.book.pk)
+        Stock.objects.checkout(self.book.pk)
+        self.stock.quantity = 5
+        self.stock.save()
+        self.assertEqual(self.stock.available, 3)
+
+        self.stock.quantity = 1
+        self.stock.save()
+        self.assertEqual(self.stock.available, 0)
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.is_available)
+
 
 class FilterTest(TestCase):
     def setUp(self):
@@ -110,3 +167,919 @@ class FilterTest(TestCase):
     def test_filters_returns_all_books(self):
         response = self.client.get(self.url)
         self.assertEqual(response.context['books'].qs.count(), 3)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.casmurro = baker.make(
+            Book,
+            name='Dom Casmurro',
+            author='Machado de Assis',
+            publisher='Garnier',
+            description='Bentinho e Capitu',
+        )
+        self.coracao = baker.make(
+            Book,
+            name='Coração das Trevas',
+            author='Joseph Conrad',
+            publisher='Penguin',
+            description='',
+        )
+        self.memorias = baker.make(
+            Book,
+            name='Memórias Póstumas de Brás Cubas',
+            author='Machado de Assis',
+            publisher='Garnier',
+            description='',
+        )
+        self.url = reverse_lazy('acervo:books')
+
+    def search(self, text):
+        response = self.client.get(self.url, {'q': text})
+        return list(response.context['books'].qs)
+
+    def test_search_by_title(self):
+        self.assertEqual(self.search('casmurro'), [self.casmurro])
+
+    def test_search_ignores_accents(self):
+        self.assertEqual(self.search('coracao'), [self.coracao])
+        self.assertEqual(self.search('memorias postumas'), [self.memorias])
+
+    def test_search_tolerates_typos(self):
+        self.assertEqual(self.search('Casmuro'), [self.casmurro])
+
+    def test_search_description(self):
+        self.assertEqual(self.search('capitu'), [self.casmurro])
+
+    def test_search_ranks_results(self):
+        results = self.search('machado casmurro')
+        self.assertEqual(results[0], self.casmurro)
+
+    def test_search_combines_with_filters(self):
+        response = self.client.get(self.url, {'q': 'machado', 'name': 'Dom'})
+        self.assertEqual(list(response.context['books'].qs), [self.casmurro])
+
+    def test_search_without_results(self):
+        self.assertEqual(self.search('xyzzy'), [])
+
+
+class BookListPaginationTest(TestCase):
+    def setUp(self):
+        self.books = [
+            baker.make(Book, name=f'Livro {i:02d}', description='x' * 500)
+            for i in range(30)
+        ]
+        self.url = reverse_lazy('acervo:books')
+
+    def test_first_page(self):
+        response = self.client.get(self.url)
+        page = response.context['page']
+        self.assertEqual(len(page.object_list), views.BOOKS_PER_PAGE)
+        self.assertEqual(page.object_list[0], self.books[0])
+        self.assertTrue(page.has_next)
+        self.assertEqual(response.context['total_books'], 30)
+
+    def test_next_page_with_cursor(self):
+        first = self.client.get(self.url).context['page']
+        response = self.client.get(self.url, {'cursor': first.next_cursor})
+        page = response.context['page']
+        self.assertEqual(list(page.object_list), self.books[views.BOOKS_PER_PAGE :])
+        self.assertFalse(page.has_next)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'invalido'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_does_not_load_description(self):
+        page = self.client.get(self.url).context['page']
+        book = page.object_list[0]
+        self.assertIn('description', book.get_deferred_fields())
+        self.assertEqual(len(book.excerpt), 300)
+
+    def test_query_count_is_constant(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        baker.make(Book, _quantity=50)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url)
+        self.assertEqual(len(small), len(large))
+
+    def test_fragment_endpoint(self):
+        first = self.client.get(self.url).context['page']
+        response = self.client.get(
+            reverse_lazy('acervo:books_page'), {'cursor': first.next_cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'books_fragment.html')
+        self.assertContains(response, 'Livro 29')
+        self.assertNotContains(response, 'data-next')
+
+    def test_fragment_does_not_hide_book_named_page(self):
+        book = baker.make(Book, name='Page')
+        response = self.client.get(reverse_lazy('acervo:book_detail', args=[book.slug]))
+        self.assertTemplateUsed(response, 'book_detail.html')
+
+    def test_fragment_keeps_filters(self):
+        response = self.client.get(reverse_lazy('acervo:books_page'), {'q': 'Livro'})
+        self.assertContains(response, 'data-next')
+        self.assertContains(response, 'q=Livro')
+
+    def test_search_results_are_paginated(self):
+        first = self.client.get(self.url, {'q': 'Livro'}).context['page']
+        response = self.client.get(
+            self.url, {'q': 'Livro', 'cursor': first.next_cursor}
+        )
+        seen = list(first.object_list) + list(response.context['page'].object_list)
+        self.assertEqual(sorted(book.pk for book in seen), [b.pk for b in self.books])
+
+
+class FacetsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.romance = baker.make(Category, name='Romance')
+        self.poesia = baker.make(Category, name='Poesia')
+        self.book1 = baker.make(
+            Book, year=1899, language='Português', publisher='Garnier'
+        )
+        self.book2 = baker.make(
+            Book, year=1881, language='Português', publisher='Garnier'
+        )
+        self.book3 = baker.make(Book, year=1922, language='Inglês', publisher='Hogarth')
+        self.book1.categories.add(self.romance)
+        self.book2.categories.add(self.romance, self.poesia)
+        self.url = reverse_lazy('acervo:books')
+
+    def _counts(self, facet):
+        return {item['value']: item['count'] for item in facet}
+
+    def test_counts(self):
+        facets = self.client.get(self.url).context['facets']
+        self.assertEqual(
+            self._counts(facets['categories']),
+            {self.romance.pk: 2, self.poesia.pk: 1},
+        )
+        self.assertEqual(self._counts(facets['decades']), {1880: 1, 1890: 1, 1920: 1})
+        self.assertEqual(
+            self._counts(facets['languages']), {'Português': 2, 'Inglês': 1}
+        )
+        self.assertEqual(
+            self._counts(facets['publishers']), {'Garnier': 2, 'Hogarth': 1}
+        )
+
+    def test_counts_follow_filters(self):
+        response = self.client.get(self.url, {'categories': self.poesia.pk})
+        facets = response.context['facets']
+        self.assertEqual(self._counts(facets['decades']), {1880: 1})
+        self.assertEqual(
+            self._counts(facets['categories']),
+            {self.romance.pk: 1, self.poesia.pk: 1},
+        )
+
+    def test_decade_and_language_filters(self):
+        response = self.client.get(self.url, {'decade': 1890})
+        self.assertEqual(list(response.context['page']), [self.book1])
+        response = self.client.get(self.url, {'language': 'Inglês'})
+        self.assertEqual(list(response.context['page']), [self.book3])
+
+    def test_facets_are_cached(self):
+        self.client.get(self.url, {'language': 'Português'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {'language': 'Português'})
+        self.assertFalse(any('GROUPING SETS' in q['sql'] for q in queries))
+
+    def test_cache_invalidated_on_change(self):
+        self.client.get(self.url)
+        self.book3.categories.add(self.poesia)
+        facets = self.client.get(self.url).context['facets']
+        self.assertEqual(self._counts(facets['categories'])[self.poesia.pk], 2)
+
+        baker.make(Book, year=1925, language='Inglês')
+        facets = self.client.get(self.url).context['facets']
+        self.assertEqual(self._counts(facets['decades'])[1920], 2)
+
+
+class TypeaheadTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = str(Path(directory.name) / 'typeahead.idx')
+        settings_override = override_settings(TYPEAHEAD_INDEX_PATH=self.path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.book = baker.make(
+            Book,
+            name='Memórias Póstumas',
+            author='Machado de Assis',
+            publisher='Garnier',
+        )
+        baker.make(Book, name='Dom Casmurro', author='Machado de Assis')
+        typeahead.build_index()
+
+    def _labels(self, text):
+        return [result['label'] for result in typeahead.suggest(text)]
+
+    def test_prefix_ignores_case_and_accents(self):
+        self.assertEqual(self._labels('memo'), ['Memórias Póstumas'])
+        self.assertEqual(self._labels('POSTU'), ['Memórias Póstumas'])
+
+    def test_same_author_is_suggested_once(self):
+        self.assertEqual(self._labels('assis'), ['Machado de Assis'])
+
+    def test_short_query(self):
+        self.assertEqual(self._labels('m'), [])
+
+    def test_incremental_rebuild(self):
+        self.book.name = 'Quincas Borba'
+        self.book.save()
+        baker.make(Book, name='Iracema', author='José de Alencar')
+        Book.objects.filter(name='Dom Casmurro').delete()
+
+        self.assertEqual(typeahead.build_index(), 2)
+        self.assertEqual(self._labels('quin'), ['Quincas Borba'])
+        self.assertEqual(self._labels('memo'), [])
+        self.assertEqual(self._labels('dom'), [])
+        self.assertEqual(self._labels('jose'), ['José de Alencar'])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse_lazy('acervo:autocomplete'), {'q': 'cas'})
+        self.assertEqual(
+            response.json()['results'],
+            [{'field': 'name', 'label': 'Dom Casmurro', 'slug': 'dom-casmurro'}],
+        )
+
+    def test_endpoint_does_not_hide_book_named_autocomplete(self):
+        book = baker.make(Book, name='Autocomplete')
+        response = self.client.get(reverse_lazy('acervo:book_detail', args=[book.slug]))
+        self.assertTemplateUsed(response, 'book_detail.html')
+
+    def test_unchanged_catalog_is_not_rewritten(self):
+        # Saves não reconstroem o índice dentro da requisição
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.book.save()
+        self.assertEqual(callbacks, [])
+
+        # Depois da margem de segurança, sem mudanças, o arquivo não é reescrito
+        Book.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        typeahead.build_index(full=True)
+        signature = Path(self.path).stat().st_ino
+        self.assertEqual(typeahead.build_index(), 0)
+        self.assertEqual(Path(self.path).stat().st_ino, signature)
+
+        Book.objects.filter(name='Dom Casmurro').delete()
+        self.assertEqual(typeahead.build_index(), 1)
+        self.assertEqual(self._labels('dom'), [])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('build_typeahead_index', '--full', stdout=out)
+        self.assertIn('2 livro(s) indexado(s)', out.getvalue())
+
+
+class CategoryTest(TestCase):
+    def setUp(self):
+        self.romance = baker.make(Category, name='Romance')
+        self.poesia = baker.make(Category, name='Poesia')
+        self.books = baker.make(Book, _quantity=3)
+
+    def _counts(self):
+        return dict(Category.objects.values_list('name', 'book_count'))
+
+    def test_counts_follow_m2m_changes(self):
+        self.books[0].categories.add(self.romance, self.poesia)
+        self.books[0].categories.add(self.romance)
+        self.romance.books.add(self.books[1], self.books[2])
+        self.assertEqual(self._counts(), {'Romance': 3, 'Poesia': 1})
+
+        self.books[0].categories.remove(self.romance, self.romance)
+        self.books[1].categories.remove(self.poesia)
+        self.assertEqual(self._counts(), {'Romance': 2, 'Poesia': 1})
+
+        self.books[0].categories.set([self.romance])
+        self.romance.books.clear()
+        self.assertEqual(self._counts(), {'Romance': 0, 'Poesia': 0})
+
+    def test_counts_follow_book_deletion(self):
+        for book in self.books:
+            book.categories.add(self.romance)
+        Book.objects.filter(pk__in=[b.pk for b in self.books[:2]]).delete()
+        self.assertEqual(self._counts()['Romance'], 1)
+
+    def test_rebuild_counts(self):
+        self.books[0].categories.add(self.romance)
+        Category.objects.update(book_count=10)
+        rebuild_category_counts()
+        self.assertEqual(self._counts(), {'Romance': 1, 'Poesia': 0})
+
+    def test_categories_page_does_not_count_links(self):
+        self.books[0].categories.add(self.romance)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse_lazy('acervo:categories'))
+        self.assertContains(
+            response, reverse_lazy('acervo:category_books', args=['romance'])
+        )
+        self.assertFalse(any('COUNT' in q['sql'] for q in queries))
+
+    def test_category_listing_is_paginated(self):
+        books = baker.make(Book, _quantity=views.BOOKS_PER_PAGE + 5)
+        self.romance.books.add(*books, self.books[0])
+        url = reverse_lazy('acervo:category_books', args=[self.romance.slug])
+        page = self.client.get(url).context['page']
+        self.assertEqual(len(page.object_list), views.BOOKS_PER_PAGE)
+        self.assertEqual(page.object_list[0], books[-1])
+
+        response = self.client.get(
+            reverse_lazy('acervo:category_books_page', args=[self.romance.slug]),
+            {'cursor': page.next_cursor},
+        )
+        self.assertEqual(len(response.context['page'].object_list), 6)
+        self.assertNotContains(response, 'data-next')
+
+    def test_unknown_category(self):
+        url = reverse_lazy('acervo:category_books', args=['inexistente'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+def _png(width=800, height=1200, color='navy'):
+    buffer = io.BytesIO()
+    Image.new('RGBA', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class CoverTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.book = baker.make(
+            Book, name='Dom Casmurro', photo=SimpleUploadedFile('capa.png', _png())
+        )
+
+    def _files(self):
+        self.book.refresh_from_db()
+        return [
+            path
+            for name, paths in self.book.photo_variants.items()
+            if name != 'source'
+            for path in paths.values()
+            if default_storage.exists(path)
+        ]
+
+    def test_render_cover(self):
+        rendered = render_cover(_png(400, 600))
+        self.assertEqual(sorted(rendered['variants']['webp']), [160, 320, 400])
+        self.assertEqual(sorted(rendered['variants']['jpeg']), [160, 320, 400])
+        self.assertTrue(rendered['placeholder'].startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(rendered['placeholder']), 1000)
+
+    def test_saving_does_not_generate_in_process(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            book = baker.make(Book, photo=SimpleUploadedFile('nova.png', _png()))
+        self.assertEqual(callbacks, [])
+        self.assertTrue(covers.covers_outdated(book))
+
+    def test_generate_and_render(self):
+        self.assertIsNone(covers.cover_variants(self.book))
+        self.assertTrue(covers.generate_cover_derivatives(self.book))
+        self.book.refresh_from_db()
+        self.assertFalse(covers.covers_outdated(self.book))
+        self.assertEqual(len(self._files()), 6)
+
+        html = Template(
+            '{% load covers %}{% cover_img book sizes="300px" class="capa" %}'
+        ).render(Context({'book': self.book}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('.jpeg 640w', html)
+        self.assertIn('class="capa"', html)
+        self.assertIn('background: url(data:image/jpeg', html)
+
+    def test_replacing_cover_removes_old_versions(self):
+        covers.generate_cover_derivatives(self.book)
+        old = self._files()
+        self.book.photo = SimpleUploadedFile('outra.png', _png(color='red'))
+        self.book.save()
+        self.assertTrue(covers.covers_outdated(self.book))
+        covers.generate_cover_derivatives(self.book)
+        self.assertEqual(len(self._files()), 6)
+        self.assertFalse(any(default_storage.exists(path) for path in old))
+
+    def test_deleting_book_removes_versions(self):
+        covers.generate_cover_derivatives(self.book)
+        files = self._files()
+        self.assertEqual(len(files), 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.delete()
+        self.assertFalse(any(default_storage.exists(path) for path in files))
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command('build_cover_derivatives', '--workers', '1', stdout=out)
+        self.assertIn('1 capa(s) processada(s)', out.getvalue())
+        self.book.refresh_from_db()
+        self.assertIsNotNone(covers.cover_variants(self.book))
+        files = self._files()
+
+        # Capas atualizadas não são geradas de novo
+        out = StringIO()
+        call_command('build_cover_derivatives', '--workers', '1', stdout=out)
+        self.assertIn('0 capa(s) processada(s)', out.getvalue())
+
+        # Um livro que ficou sem capa perde as versões antigas
+        self.book.photo = None
+        self.book.save()
+        out = StringIO()
+        call_command('build_cover_derivatives', '--workers', '1', stdout=out)
+        self.assertIn('1 sem capa limpa(s)', out.getvalue())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.photo_variants, {})
+        self.assertFalse(any(default_storage.exists(path) for path in files))
+
+
+class CardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = baker.make(Book, is_available=True, _quantity=3)
+        self.template = Template(
+            '{% load book_cards %}{% book_cards books "cards/book_grid.html" %}'
+        )
+
+    def render(self):
+        books = Book.objects.filter(pk__in=[book.pk for book in self.books])
+        return self.template.render(Context({'books': books.order_by('pk')}))
+
+    def test_second_render_hits_cache(self):
+        first = self.render()
+        self.assertEqual(card_cache_stats(), {'hits': 0, 'misses': 3})
+        self.assertEqual(self.render(), first)
+        self.assertEqual(card_cache_stats(), {'hits': 3, 'misses': 3})
+        for book in self.books:
+            self.assertIn(book.name, first)
+
+    def test_changed_book_is_rendered_again(self):
+        self.render()
+        stock = Stock.objects.get(book=self.books[0])
+        stock.quantity = 0
+        stock.save()
+
+        html = self.render()
+        self.assertEqual(card_cache_stats(), {'hits': 2, 'misses': 4})
+        self.assertIn('Emprestado', html)
+
+    def test_stats_command(self):
+        self.render()
+        self.render()
+        out = StringIO()
+        call_command('card_cache_stats', '--reset', stdout=out)
+        self.assertIn('3 acerto(s), 3 falha(s) (50.0% de acertos)', out.getvalue())
+        self.assertEqual(card_cache_stats(), {'hits': 0, 'misses': 0})
+
+
+class RatingAggregatesTest(TestCase):
+    def setUp(self):
+        self.book = baker.make(Book, name='Dom Casmurro')
+        self.users = baker.make(User, _quantity=3)
+
+    def review(self, user, rating):
+        return BookReview.objects.create(book=self.book, user=user, rating=rating)
+
+    def test_create_updates_aggregates(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 4)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.total_reviews, 2)
+        self.assertEqual(self.book.average_rating, 4.5)
+        self.assertEqual(self.book.rating_distribution['rating_5'], 1)
+        self.assertEqual(self.book.rating_distribution['rating_4'], 1)
+
+    def test_edit_moves_rating(self):
+        review = self.review(self.users[0], 2)
+        review = BookReview.objects.get(pk=review.pk)
+        review.rating = 5
+        review.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 1)
+        self.assertEqual(self.book.rating_sum, 5)
+        self.assertEqual(self.book.rating_2, 0)
+        self.assertEqual(self.book.rating_5, 1)
+
+    def test_delete_updates_aggregates(self):
+        review = self.review(self.users[0], 3)
+        self.review(self.users[1], 5)
+        review.delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 1)
+        self.assertEqual(self.book.average_rating, 5)
+        self.assertEqual(self.book.rating_3, 0)
+
+    def test_edit_with_deferred_rating_rebuilds(self):
+        review = self.review(self.users[0], 2)
+        review = BookReview.objects.only('id', 'book').get(pk=review.pk)
+        review.rating = 4
+        review.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_sum, 4)
+        self.assertEqual(self.book.rating_2, 0)
+        self.assertEqual(self.book.rating_4, 1)
+
+    def test_delete_after_edit_removes_stored_rating(self):
+        review = self.review(self.users[0], 2)
+        review = BookReview.objects.get(pk=review.pk)
+        review.rating = 5
+        review.delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 0)
+        self.assertEqual(self.book.rating_sum, 0)
+        self.assertEqual(self.book.rating_2, 0)
+
+    def test_delete_with_deferred_fields(self):
+        review = self.review(self.users[0], 2)
+        self.review(self.users[1], 5)
+        BookReview.objects.only('id').get(pk=review.pk).delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 1)
+        self.assertEqual(self.book.rating_sum, 5)
+        self.assertEqual(self.book.rating_2, 0)
+
+    def test_cascade_delete_updates_aggregates(self):
+        self.review(self.users[0], 1)
+        self.users[0].delete()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 0)
+        self.assertEqual(self.book.average_rating, 0)
+
+    def test_properties_do_not_query(self):
+        self.review(self.users[0], 4)
+        self.book.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.book.average_rating, 4)
+            self.assertEqual(self.book.total_reviews, 1)
+            self.assertEqual(self.book.rating_distribution['rating_4'], 1)
+
+    def test_upsert_creates_then_updates(self):
+        self.review(self.users[1], 4)
+        review_id, inserted = upsert_review(self.book.pk, self.users[0].pk, 2, 'Fraco')
+        self.assertTrue(inserted)
+
+        same_id, inserted = upsert_review(self.book.pk, self.users[0].pk, 5, 'Reli')
+        self.assertFalse(inserted)
+        self.assertEqual(same_id, review_id)
+        self.assertEqual(BookReview.objects.get(pk=review_id).comment, 'Reli')
+
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 2)
+        self.assertEqual(self.book.rating_sum, 9)
+        self.assertEqual(self.book.rating_2, 0)
+        self.assertEqual(self.book.rating_5, 1)
+
+    def test_rebuild_command(self):
+        self.review(self.users[0], 5)
+        self.review(self.users[1], 1)
+        Book.objects.filter(pk=self.book.pk).update(rating_count=9, rating_5=0)
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 2)
+        self.assertEqual(self.book.rating_sum, 6)
+        self.assertEqual(self.book.rating_5, 1)
+        self.assertEqual(self.book.rating_1, 1)
+
+
+class BookDetailTest(TestCase):
+    def setUp(self):
+        self.book = baker.make(Book, name='Dom Casmurro')
+        self.user = User.objects.create_user(username='leitor', password='senha12345')
+        self.url = reverse_lazy('acervo:book_detail', args=[self.book.slug])
+        for reviewer in baker.make(User, _quantity=15):
+            baker.make(
+                BookReview, book=self.book, user=reviewer, rating=4, comment='Bom'
+            )
+
+    def test_reviews_are_paginated(self):
+        response = self.client.get(self.url)
+        reviews = response.context['reviews']
+        self.assertEqual(len(reviews.object_list), 10)
+        self.assertTrue(reviews.has_next)
+
+        response = self.client.get(self.url, {'reviews': reviews.next_cursor})
+        self.assertEqual(len(response.context['reviews'].object_list), 5)
+
+    def test_reviews_fragment(self):
+        url = reverse_lazy('acervo:book_reviews_page', args=[self.book.slug])
+        first = self.client.get(self.url).context['reviews']
+        response = self.client.get(url, {'reviews': first.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['reviews'].object_list), 5)
+        self.assertFalse(response.context['reviews'].has_next)
+        self.assertNotContains(response, 'data-next')
+
+        response = self.client.get(url, {'reviews': 'invalido'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_review_query_budget(self):
+        self.client.login(username='leitor', password='senha12345')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'rating': 3, 'comment': 'Ok'})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        # sessão, usuário, id do livro, savepoint, upsert, agregados, release
+        self.assertLessEqual(len(queries), 7)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'rating': 5, 'comment': 'Melhor'})
+        # A edição usa a nota anterior do upsert, sem recalcular os agregados
+        self.assertLessEqual(len(queries), 7)
+        self.assertFalse(any('COUNT' in q['sql'] for q in queries))
+        review = BookReview.objects.get(book=self.book, user=self.user)
+        self.assertEqual(review.rating, 5)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.rating_count, 16)
+        self.assertEqual(self.book.rating_5, 1)
+        self.assertEqual(self.book.rating_3, 0)
+
+    def test_anonymous_query_budget(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # ETag, livro, página de avaliações e livros relacionados
+        self.assertLessEqual(len(queries), 4)
+
+    def test_authenticated_query_budget(self):
+        Emprestimo.objects.create(book=self.book, user=self.user)
+        BookReview.objects.create(book=self.book, user=self.user, rating=5)
+        self.client.login(username='leitor', password='senha12345')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.context['emprestimo_usuario'])
+        self.assertIsNotNone(response.context['user_review'])
+        # sessão, usuário e perfil (base.html) + ETag, livro, avaliações,
+        # livros relacionados, avaliação do usuário e empréstimo ativo
+        self.assertLessEqual(len(queries), 9)
+
+    def test_renewal_blocked_by_reservation(self):
+        emprestimo = Emprestimo.objects.create(book=self.book, user=self.user)
+        Emprestimo.objects.filter(pk=emprestimo.pk).update(
+            end_date=timezone.now().date() + timedelta(days=1)
+        )
+        self.client.login(username='leitor', password='senha12345')
+        self.assertTrue(self.client.get(self.url).context['pode_renovar'])
+
+        baker.make(Reserva, book=self.book, ativa=True)
+        self.assertFalse(self.client.get(self.url).context['pode_renovar'])
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.book = baker.make(Book, name='Dom Casmurro')
+        self.user = User.objects.create_user(username='leitor', password='senha12345')
+        self.url = reverse_lazy('acervo:book_detail', args=[self.book.slug])
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_catalog_pages_answer_not_modified(self):
+        for url in (reverse_lazy('acervo:books'), reverse_lazy('acervo:categories')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            with self.assertNumQueries(1):
+                response = self.revalidate(url, response['ETag'])
+            self.assertEqual(response.status_code, 304)
+
+    def test_book_list_changes_with_availability(self):
+        url = reverse_lazy('acervo:books')
+        etag = self.client.get(url)['ETag']
+        stock = Stock.objects.get(book=self.book)
+        stock.quantity = 0
+        stock.save()
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_book_detail_changes_with_reviews_and_loans(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(self.url, etag).status_code, 304)
+
+        review = baker.make(BookReview, book=self.book, rating=4, comment='Bom')
+        self.assertEqual(self.revalidate(self.url, etag).status_code, 200)
+
+        etag = self.client.get(self.url)['ETag']
+        BookReview.objects.filter(pk=review.pk).update(
+            comment='Ótimo', updated_at=timezone.now()
+        )
+        self.assertEqual(self.revalidate(self.url, etag).status_code, 200)
+
+        etag = self.client.get(self.url)['ETag']
+        Emprestimo.objects.create(book=self.book, user=baker.make(User))
+        self.assertEqual(self.revalidate(self.url, etag).status_code, 200)
+
+    def test_book_detail_varies_by_user(self):
+        anonymous = self.client.get(self.url)['ETag']
+        self.client.login(username='leitor', password='senha12345')
+        etag = self.client.get(self.url)['ETag']
+        self.assertNotEqual(etag, anonymous)
+        self.assertEqual(self.revalidate(self.url, anonymous).status_code, 200)
+
+        Reserva.objects.create(book=self.book, user=baker.make(User))
+        self.assertEqual(self.revalidate(self.url, etag).status_code, 200)
+
+    def test_book_detail_changes_when_copy_is_held(self):
+        # O único exemplar está emprestado e o leitor entra na fila
+        emprestimo = Emprestimo.objects.create(book=self.book, user=baker.make(User))
+        reservar(self.book.pk, self.user)
+        self.client.login(username='leitor', password='senha12345')
+        etag = self.client.get(self.url)['ETag']
+
+        devolver(emprestimo)
+        response = self.revalidate(self.url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Retirar Livro')
+
+    def test_post_is_not_conditional(self):
+        self.client.login(username='leitor', password='senha12345')
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.post(
+            self.url, {'rating': 5, 'comment': 'Bom'}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 302)
+
+
+class ImportBooksTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(
+            TYPEAHEAD_INDEX_PATH=str(self.directory / 'typeahead.idx')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.romance = baker.make(Category, name='Romance')
+        baker.make(Book, name='Dom Casmurro')
+
+    def _import(self, name, content, *args):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        out, err = StringIO(), StringIO()
+        call_command('import_books', str(path), *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv(self):
+        out, err = self._import(
+            'livros.csv',
+            'name,author,publisher,year,categories,quantity,isbn\n'
+            'Dom Casmurro,Machado de Assis,Garnier,1899,Romance|Clássicos,2\n'
+            'Dom Casmurro,Machado de Assis,Globo,1997,Romance,0\n'
+            'Sem autor,,Garnier,1900,,\n'
+            'Iracema,José de Alencar,B. L.,1865,,,0-306-40615-2\n'
+            'Repetido,José de Alencar,B. L.,1865,,,978-0-306-40615-7\n',
+            '--batch-size',
+            '1',
+        )
+        self.assertIn('3 livro(s) importado(s), 2 linha(s) ignorada(s)', out)
+        self.assertIn('Linha 4: campo(s) obrigatório(s) ausente(s): author', err)
+        self.assertIn('ISBN 9780306406157 já cadastrado: Repetido', err)
+        self.assertEqual(Book.objects.get(name='Iracema').isbn, '9780306406157')
+
+        books = Book.objects.filter(author='Machado de Assis').order_by('year')
+        self.assertEqual(len({book.slug for book in books} | {'dom-casmurro'}), 3)
+        self.assertTrue(all(book.slug.startswith('dom-casmurro-') for book in books))
+        self.assertEqual(
+            [(book.stock.quantity, book.stock.available) for book in books],
+            [(2, 2), (0, 0)],
+        )
+        self.assertEqual([book.is_available for book in books], [True, False])
+        self.assertEqual(
+            dict(Category.objects.values_list('name', 'book_count')),
+            {'Romance': 2, 'Clássicos': 1},
+        )
+        self.assertEqual(
+            [r['label'] for r in typeahead.suggest('machado')], ['Machado de Assis']
+        )
+
+    def test_overlong_category_is_a_row_error(self):
+        out, err = self._import(
+            'livros.csv',
+            'name,author,publisher,year,categories\n'
+            f'Iracema,José de Alencar,B. L.,1865,{"x" * 101}\n'
+            'Senhora,José de Alencar,B. L.,1875,Romance\n',
+        )
+        self.assertIn('1 livro(s) importado(s), 1 linha(s) ignorada(s)', out)
+        self.assertIn('Linha 2: categoria com mais de 100 caracteres', err)
+        self.assertEqual(self.romance.books.get().name, 'Senhora')
+
+    def test_saving_imported_duplicate_keeps_slug(self):
+        self._import(
+            'livros.csv',
+            'name,author,publisher,year\nDom Casmurro,Machado de Assis,Globo,1997\n',
+        )
+        book = Book.objects.get(author='Machado de Assis')
+        slug = book.slug
+        self.assertTrue(slug.startswith('dom-casmurro-'))
+
+        book.year = 1998
+        book.save()
+        book.refresh_from_db()
+        self.assertEqual(book.slug, slug)
+
+        book.name = 'Dom Casmurro (edição anotada)'
+        book.save(update_fields=['name'])
+        book.refresh_from_db()
+        self.assertEqual(book.slug, 'dom-casmurro-edicao-anotada')
+        book.name = 'Dom Casmurro'
+        book.save()
+        self.assertTrue(book.slug.startswith('dom-casmurro-'))
+        self.assertNotEqual(book.slug, 'dom-casmurro')
+
+    def test_import_jsonl(self):
+        out, err = self._import(
+            'livros.jsonl',
+            '{"name": "Iracema", "author": "José de Alencar", "publisher": "B. L.",'
+            ' "year": 1865, "categories": ["Romance"], "pages": 180}\n'
+            '\n'
+            '{"name": "Quebrado"\n',
+        )
+        self.assertIn('1 livro(s) importado(s), 1 linha(s) ignorada(s)', out)
+        self.assertIn('Linha 3:', err)
+        book = Book.objects.get(name='Iracema')
+        self.assertEqual((book.slug, book.pages), ('iracema', 180))
+        self.assertEqual(list(book.categories.all()), [self.romance])
+
+    def test_query_count_per_batch(self):
+        rows = ''.join(f'Livro {n},Autor,Editora,2000,Romance\n' for n in range(50))
+        with CaptureQueriesContext(connection) as queries:
+            self._import('livros.csv', 'name,author,publisher,year,categories\n' + rows)
+        self.assertEqual(Book.objects.filter(author='Autor').count(), 50)
+        self.assertLess(len(queries), 20)
+
+
+class IsbnTest(TestCase):
+    def setUp(self):
+        self.book = baker.make(Book, name='Dom Casmurro', isbn='85-359-0277-5')
+        stock = Stock.objects.get(book=self.book)
+        stock.quantity = 3
+        stock.save()
+        self.url = reverse_lazy('acervo:isbn_lookup')
+
+    def test_normalize(self):
+        self.assertEqual(normalize_isbn('978-85-359-0277-8'), '9788535902778')
+        self.assertEqual(normalize_isbn('0 8044 2957 x'), '9780804429573')
+        self.assertIsNone(normalize_isbn(''))
+        for invalid in ('85-359-0277-4', '9788535902779', '12345'):
+            with pytest.raises(ValidationError):
+                normalize_isbn(invalid)
+
+    def test_saved_as_isbn13_and_unique(self):
+        self.assertEqual(self.book.isbn, '9788535902778')
+        baker.make(Book, isbn='', _quantity=2)
+        with pytest.raises(IntegrityError):
+            baker.make(Book, isbn='978-85-359-0277-8')
+
+    def test_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                self.url, {'isbn': '8535902775,9780306406157,123'}
+            )
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            response.json(),
+            {
+                'results': {
+                    '8535902775': {
+                        'isbn': '9788535902778',
+                        'slug': 'dom-casmurro',
+                        'is_available': True,
+                        'copies': 3,
+                        'available_copies': 3,
+                    },
+                    '9780306406157': None,
+                },
+                'invalid': ['123'],
+            },
+        )
+
+    def test_batch_lookup(self):
+        isbns = ['978-85-359-0277-8'] * views.ISBN_LOOKUP_LIMIT
+        response = self.client.get(self.url, {'isbn': isbns})
+        self.assertEqual(response.json()['results']['978-85-359-0277-8']['copies'], 3)
+
+        response = self.client.get(self.url, {'isbn': [*isbns, 'x']})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, {'isbn': '8535902775'})
+        self.assertEqual(response.status_code, 405)
+
+    def test_invalid_isbn_is_a_validation_error(self):
+        book = baker.prepare(Book, name='Memórias', isbn='85-359-0277-4')
+        with pytest.raises(ValidationError) as error:
+            book.full_clean()
+        self.assertIn('isbn', error.value.message_dict)
+        # save() não valida nem falha: a validação fica nos formulários
+        book.save()
+        self.assertEqual(book.isbn, '85-359-0277-4')
+
+    def test_lookup_does_not_hide_book_named_isbn(self):
+        book = baker.make(Book, name='ISBN')
+        response = self.client.get(reverse_lazy('acervo:book_detail', args=[book.slug]))
+        self.assertTemplateUsed(response, 'book_detail.html')
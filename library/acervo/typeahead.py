@@ -0,0 +1,295 @@
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from library.acervo.models import Book
+
+logger = logging.getLogger('library')
+
+# Campos do livro que entram nas sugestões
+TYPEAHEAD_FIELDS = ('name', 'author', 'publisher')
+
+MAGIC = b'BKTYPE02'
+# magic, quantidade de registros, maior updated_at indexado, início da
+# geração (ambos em microssegundos) e quantidade de livros
+HEADER = struct.Struct('<8sIqqI')
+OFFSET = struct.Struct('<I')
+SEPARATOR = b'\0'
+
+MAX_KEY_LENGTH = 64
+MIN_QUERY_LENGTH = 2
+# Quantos registros no máximo percorrer por busca; o mesmo autor ou editora
+# aparece uma vez por livro e só é sugerido uma vez
+MAX_SCAN = 500
+
+# Margem para alterações gravadas em transações que terminaram depois da
+# última reconstrução, mas com updated_at anterior a ela
+REBUILD_SAFETY_WINDOW = timedelta(minutes=5)
+
+
+def normalize(text):
+    """Minúsculas e sem acentos, para casar 'jose' com 'José'"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def index_path():
+    return settings.TYPEAHEAD_INDEX_PATH
+
+
+def _book_records(book_id, slug, values):
+    """Registros de um livro: uma chave por início de palavra de cada campo"""
+    records = set()
+    for field, label in zip(TYPEAHEAD_FIELDS, values, strict=True):
+        words = normalize(label).split()
+        for position in range(len(words)):
+            key = ' '.join(words[position:])[:MAX_KEY_LENGTH]
+            records.add((key, field, ' '.join(label.split()), book_id, slug))
+    return records
+
+
+def _encode(record):
+    key, field, label, book_id, slug = record
+    return SEPARATOR.join(
+        [
+            key.encode(),
+            field.encode(),
+            label.encode(),
+            str(book_id).encode(),
+            slug.encode(),
+        ]
+    )
+
+
+def _decode(data):
+    key, field, label, book_id, slug = data.decode().split('\0')
+    return key, field, label, int(book_id), slug
+
+
+def _to_micros(value):
+    if value is None:
+        return 0
+    return int(value.timestamp() * 1_000_000)
+
+
+def _from_micros(value):
+    return datetime.fromtimestamp(value / 1_000_000, tz=timezone.utc)
+
+
+class TypeaheadIndex:
+    """Índice de prefixos ordenado, lido direto de um arquivo mapeado em memória.
+
+    O arquivo tem um cabeçalho, uma tabela de offsets e os registros ordenados
+    pela chave normalizada. A busca é binária sobre a tabela de offsets, então
+    nada é carregado para a memória do processo: todos os workers compartilham
+    as mesmas páginas do arquivo via cache do sistema operacional.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self.signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self.mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.stamp, self.built_at, self.books = HEADER.unpack_from(
+            self.mm, 0
+        )
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError(f'Índice de sugestões inválido: {path}')
+        self.records_start = HEADER.size + OFFSET.size * self.count
+
+    def close(self):
+        self.mm.close()
+
+    def _offset(self, position):
+        if position >= self.count:
+            return len(self.mm)
+        offset = OFFSET.unpack_from(self.mm, HEADER.size + OFFSET.size * position)[0]
+        return self.records_start + offset
+
+    def _bounds(self, position):
+        return self._offset(position), self._offset(position + 1)
+
+    def _key(self, position):
+        start, end = self._bounds(position)
+        return self.mm[start : self.mm.find(SEPARATOR, start, end)]
+
+    def record(self, position):
+        start, end = self._bounds(position)
+        return _decode(self.mm[start:end])
+
+    def records(self):
+        for position in range(self.count):
+            yield self.record(position)
+
+    def _first(self, prefix):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def search(self, text, limit=10):
+        prefix = normalize(' '.join(text.split()))[:MAX_KEY_LENGTH]
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+
+        encoded = prefix.encode()
+        results = []
+        seen = set()
+        position = self._first(encoded)
+        end = min(self.count, position + MAX_SCAN)
+        while position < end and len(results) < limit:
+            key, field, label, _, slug = self.record(position)
+            position += 1
+            if not key.encode().startswith(encoded):
+                break
+            if (field, label) in seen:
+                continue
+            seen.add((field, label))
+            results.append({'field': field, 'label': label, 'slug': slug})
+        return results
+
+
+def _open(path):
+    try:
+        return TypeaheadIndex(path)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _up_to_date(index):
+    """Nenhum livro foi incluído, alterado ou excluído desde a geração.
+
+    Só vale depois da margem de segurança: antes dela, uma transação que
+    ainda não tinha terminado pode gravar um updated_at já coberto.
+    """
+    window = REBUILD_SAFETY_WINDOW // timedelta(microseconds=1)
+    if index.built_at < index.stamp + window:
+        return False
+    catalog = Book.objects.aggregate(total=Count('id'), latest=Max('updated_at'))
+    return (
+        catalog['total'] == index.books and _to_micros(catalog['latest']) <= index.stamp
+    )
+
+
+def _write(path, records, stamp, built_at, books):
+    # A chave vem primeiro e não contém o separador, então ordenar os bytes
+    # dos registros é o mesmo que ordenar pelas chaves
+    encoded = sorted(_encode(record) for record in records)
+    offsets = []
+    position = 0
+    for data in encoded:
+        offsets.append(position)
+        position += len(data)
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, len(encoded), stamp, built_at, books))
+            for offset in offsets:
+                file.write(OFFSET.pack(offset))
+            for data in encoded:
+                file.write(data)
+        # Troca atômica: quem já mapeou o arquivo antigo continua lendo ele
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def build_index(path=None, full=False):
+    """Gera o arquivo de sugestões e devolve quantos livros foram (re)indexados.
+
+    Por padrão a reconstrução é incremental: reaproveita os registros do
+    arquivo atual e só relê do banco os livros alterados desde a última
+    geração, descartando os que foram excluídos. Se nada mudou, o arquivo
+    nem é reescrito. Roda fora das requisições, pelo comando
+    build_typeahead_index (cron).
+    """
+    path = path or index_path()
+    built_at = _to_micros(datetime.now(timezone.utc))
+    index = None if full else _open(path)
+
+    books = Book.objects.order_by()
+    by_book = {}
+    book_ids = set()
+    stamp = 0
+    if index is not None:
+        try:
+            if _up_to_date(index):
+                return 0
+            book_ids = set(books.values_list('id', flat=True))
+            for record in index.records():
+                if record[3] in book_ids:
+                    by_book.setdefault(record[3], set()).add(record)
+            stamp = index.stamp
+        finally:
+            index.close()
+        books = books.filter(
+            updated_at__gte=_from_micros(stamp) - REBUILD_SAFETY_WINDOW
+        )
+
+    indexed = 0
+    for book_id, slug, updated_at, *values in books.values_list(
+        'id', 'slug', 'updated_at', *TYPEAHEAD_FIELDS
+    ).iterator(chunk_size=2000):
+        by_book[book_id] = _book_records(book_id, slug, values)
+        book_ids.add(book_id)
+        stamp = max(stamp, _to_micros(updated_at))
+        indexed += 1
+
+    records = (record for records in by_book.values() for record in records)
+    _write(path, records, stamp, built_at, len(book_ids))
+    return indexed
+
+
+_current = None
+_current_lock = threading.Lock()
+
+
+def get_index():
+    """Índice mapeado deste processo, remapeado quando o arquivo é trocado"""
+    global _current  # noqa: PLW0603
+    path = index_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    index = _current
+    if index is not None and index.path == path and index.signature == signature:
+        return index
+
+    with _current_lock:
+        if _current is None or _current.signature != signature or _current.path != path:
+            try:
+                _current = TypeaheadIndex(path)
+            except (FileNotFoundError, ValueError):
+                logger.exception('Não foi possível abrir o índice de sugestões')
+                return None
+        # O mapeamento anterior não é fechado: pode estar em uso por outra
+        # thread e é liberado pelo coletor quando ninguém mais o referenciar
+        return _current
+
+
+def suggest(text, limit=10):
+    index = get_index()
+    if index is None:
+        return []
+    return index.search(text, limit)
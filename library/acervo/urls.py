@@ -6,7 +6,32 @@ app_name = 'acervo'
 
 urlpatterns = [
     path('categories/', views.categories, name='categories'),
+    path(
+        'categories/<slug:category_slug>/',
+        views.category_books,
+        name='category_books',
+    ),
+    path(
+        'categories/<slug:category_slug>/page/',
+        views.category_books_page,
+        name='category_books_page',
+    ),
+    # Endpoints auxiliares ficam sob '_/', que não colide com o slug de um
+    # livro chamado, por exemplo, "Page"
+    path('_/page/', views.books_page, name='books_page'),
+    path('_/autocomplete/', views.autocomplete, name='autocomplete'),
+    path('_/isbn/', views.isbn_lookup, name='isbn_lookup'),
     path('<slug:book_slug>/', views.book_detail, name='book_detail'),
+    path(
+        '<slug:book_slug>/reviews/',
+        views.book_reviews_page,
+        name='book_reviews_page',
+    ),
     path('', views.books, name='books'),
     path('return/<int:emprestimo_id>/', views.return_book, name='return_book'),
+    path(
+        'reservas/<int:reserva_id>/cancelar/',
+        views.cancel_reserva,
+        name='cancel_reserva',
+    ),
 ]
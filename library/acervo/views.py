@@ -2,133 +2,289 @@ import logging
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.db.models.functions import Left
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.utils import timezone
+from django.views.decorators.http import require_GET
 
+from library.acervo.book_detail import get_book_detail, get_reviews_page
+from library.acervo.conditional import (
+    book_detail_etag,
+    books_etag,
+    categories_etag,
+    conditional_page,
+)
+from library.acervo.facets import get_facets
 from library.acervo.filter import BookFilter
 from library.acervo.forms import BookReviewForm
-from library.acervo.models import Book, Category
+from library.acervo.isbn import normalize_isbn
+from library.acervo.models import Book, BookReview, Category
+from library.acervo.pagination import InvalidCursor, KeysetPaginator
+from library.acervo.ratings import upsert_review
+from library.acervo.typeahead import suggest
 from library.emprestimos.models.emprestimo import Emprestimo
 from library.emprestimos.models.reserva import Reserva
-from library.emprestimos.models.historico import Historico
+from library.emprestimos.services import cancelar_reserva, devolver
 
 logger = logging.getLogger('library')
 
+BOOKS_PER_PAGE = 24
+AUTOCOMPLETE_LIMIT = 8
+# Os ISBNs vão na query string: o limite mantém a URL abaixo de ~4 KB
+ISBN_LOOKUP_LIMIT = 250
 
-def book_detail(request, book_slug):
-    book = get_object_or_404(Book, slug=book_slug)
-    logger.info('Visualizando detalhes do livro: %s', book.name)
-    reviews = book.reviews.select_related('user').order_by('-created_at')
-
-    user_review = None
-    emprestimo_usuario = None
+# Colunas exibidas nos cards da listagem; a sinopse entra só como trecho
+BOOK_LIST_FIELDS = (
+    'id',
+    'uuid',
+    'name',
+    'slug',
+    'author',
+    'year',
+    'photo',
+    'photo_variants',
+    'photo_placeholder',
+    'is_available',
+    'updated_at',
+)
 
-    if request.user.is_authenticated:
-        user_review = reviews.filter(user=request.user).first()
-
-        emprestimo_usuario = book.emprestimos.filter(
-            user=request.user, date_returned__isnull=True
-        ).first()
 
+@conditional_page(book_detail_etag)
+def book_detail(request, book_slug):
+    form = None
     if request.method == 'POST':
         if not request.user.is_authenticated:
             return redirect('usuarios:login')
 
-        form = BookReviewForm(request.POST, instance=user_review)
-
+        form = BookReviewForm(request.POST)
         if form.is_valid():
-            new_review = form.save(commit=False)
-            new_review.book = book
-            new_review.user = request.user
-            new_review.save()
+            book_id = get_object_or_404(
+                Book.objects.values_list('pk', flat=True), slug=book_slug
+            )
+            upsert_review(
+                book_id,
+                request.user.pk,
+                form.cleaned_data['rating'],
+                form.cleaned_data['comment'],
+            )
+            logger.info('Avaliação salva: %s', book_slug)
+            return redirect('acervo:book_detail', book_slug=book_slug)
 
-            return redirect('acervo:book_detail', book_slug=book.slug)
-    else:
-        form = BookReviewForm(instance=user_review)
+    try:
+        detail = get_book_detail(book_slug, request.user, request.GET.get('reviews'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor inválido')
+    book = detail.book
+    logger.info('Visualizando detalhes do livro: %s', book.name)
+
+    if form is None:
+        form = BookReviewForm(instance=detail.user_review)
 
     context = {
         'book': book,
-        'reviews': reviews,
+        'reviews': detail.reviews,
         'form': form,
-        'user_review': user_review,
-        'emprestimo_usuario': emprestimo_usuario,
+        'user_review': detail.user_review,
+        'emprestimo_usuario': detail.emprestimo_usuario,
+        'pode_renovar': detail.pode_renovar,
+        'reserva_usuario': detail.reserva_usuario,
+        'voce_e_o_proximo': detail.voce_e_o_proximo,
+        'related_books': detail.related_books,
     }
     return render(request, 'book_detail.html', context)
 
 
+def book_reviews_page(request, book_slug):
+    """Próxima página de avaliações como fragmento HTML (rolagem infinita)"""
+    reviews = BookReview.objects.filter(book__slug=book_slug)
+    try:
+        page = get_reviews_page(reviews, request.GET.get('reviews'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor inválido')
+    context = {'reviews': page, 'book_slug': book_slug}
+    return render(request, 'reviews_fragment.html', context)
+
+
+def _book_list_filter(request):
+    queryset = Book.objects.only(*BOOK_LIST_FIELDS).annotate(
+        excerpt=Left('description', 300)
+    )
+    return BookFilter(request.GET, queryset=queryset)
+
+
+def _book_list_page(request, books):
+    paginator = KeysetPaginator(books.qs, books.ordering, per_page=BOOKS_PER_PAGE)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@conditional_page(books_etag)
 def books(request):
     logger.info('Visualizando lista de livros')
-    books = BookFilter(request.GET, queryset=Book.objects.all())
-    return render(request, 'books.html', {'books': books})
+    books = _book_list_filter(request)
+    try:
+        page = _book_list_page(request, books)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor inválido')
+
+    context = {
+        'books': books,
+        'page': page,
+        'total_books': books.qs.count(),
+        'facets': get_facets(books),
+    }
+    return render(request, 'books.html', context)
+
+
+def books_page(request):
+    """Fragmento HTML com a próxima página do acervo (rolagem infinita)"""
+    books = _book_list_filter(request)
+    try:
+        page = _book_list_page(request, books)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor inválido')
+    return render(request, 'books_fragment.html', {'page': page})
+
+
+def autocomplete(request):
+    """Sugestões de título, autor e editora enquanto o usuário digita"""
+    results = suggest(request.GET.get('q', ''), limit=AUTOCOMPLETE_LIMIT)
+    response = JsonResponse({'results': results})
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+@require_GET
+def isbn_lookup(request):
+    """Consulta em lote por ISBN, para sistemas parceiros e leitores de código.
+
+    Recebe ``?isbn=`` repetido ou separado por vírgulas. Cada ISBN informado,
+    em qualquer grafia, aponta para o livro encontrado ou para null.
+    """
+    isbns = [isbn for value in request.GET.getlist('isbn') for isbn in value.split(',')]
+    if len(isbns) > ISBN_LOOKUP_LIMIT:
+        return JsonResponse(
+            {'error': f'Máximo de {ISBN_LOOKUP_LIMIT} ISBNs por consulta'}, status=400
+        )
+
+    normalized = {}
+    invalid = []
+    for isbn in isbns:
+        try:
+            normalized[isbn] = normalize_isbn(isbn)
+        except ValidationError:
+            invalid.append(isbn)
+
+    books = Book.objects.filter(isbn__in=set(normalized.values()) - {None}).values(
+        'isbn',
+        'slug',
+        'is_available',
+        copies=F('stock__quantity'),
+        available_copies=F('stock__available'),
+    )
+    found = {book['isbn']: book for book in books}
+    results = {isbn: found.get(value) for isbn, value in normalized.items()}
+    return JsonResponse({'results': results, 'invalid': invalid})
 
 
 @login_required
 def return_book(request, emprestimo_id):
     """Devolver livro"""
-    if request.method == 'POST':
-        emprestimo = get_object_or_404(Emprestimo, id=emprestimo_id, user=request.user)
-        historico = Historico.objects.filter(book=emprestimo.book, user=emprestimo.user).last()
-
-        if not emprestimo.esta_ativo:
-            logger.error('Empréstimo não está ativo: %s', emprestimo.book.name)
-            messages.error(request, 'Este empréstimo não está ativo.')
-            return redirect('acervo:book_detail', book_slug=emprestimo.book.slug)
-
-        if emprestimo.esta_atrasado:
-            logger.warning('Livro devolvido com atraso: %s', emprestimo.book.name)
-            messages.warning(
-                request,
-                f'Livro devolvido com {emprestimo.dias_atraso} dia(s) de atraso. '
-                f'Multa: R$ {emprestimo.multa_atual}',
-            )
-        else:
-            logger.info('Livro devolvido com sucesso: %s', emprestimo.book.name)
-            messages.success(request, 'Livro devolvido com sucesso!')
+    emprestimo = get_object_or_404(
+        Emprestimo.objects.select_related('book'),
+        id=emprestimo_id,
+        user=request.user,
+    )
+    book = emprestimo.book
+    if request.method != 'POST':
+        return redirect('acervo:book_detail', book_slug=book.slug)
 
-        emprestimo.date_returned = timezone.now().date()
-        emprestimo.save()
+    # Atraso e multa dependem do empréstimo ainda aberto
+    atrasado = emprestimo.esta_atrasado
+    dias_atraso, multa = emprestimo.dias_atraso, emprestimo.multa_atual
+    try:
+        reserva = devolver(emprestimo)
+    except ValidationError as exc:
+        logger.error('Empréstimo não está ativo: %s', book.name)
+        messages.error(request, exc.messages[0])
+        return redirect('acervo:book_detail', book_slug=book.slug)
 
-        if historico:
-            historico.date_end = timezone.now().date()
-            historico.save()
-
-        book = emprestimo.book
-
-        prox_reserva = (
-            Reserva.objects.filter(book=emprestimo.book, ativa=True)
-            .order_by('created_at')
-            .first()
+    if atrasado:
+        logger.warning('Livro devolvido com atraso: %s', book.name)
+        messages.warning(
+            request,
+            f'Livro devolvido com {dias_atraso} dia(s) de atraso. Multa: R$ {multa}',
         )
+    else:
+        logger.info('Livro devolvido com sucesso: %s', book.name)
+        messages.success(request, 'Livro devolvido com sucesso!')
+    if reserva:
+        logger.info('Livro separado para o próximo da reserva: %s', book.name)
+        messages.info(request, 'O livro foi separado para quem o reservou.')
+    return redirect('acervo:book_detail', book_slug=book.slug)
 
-        if prox_reserva:
-            Emprestimo.objects.create(
-                book=emprestimo.book,
-                user=prox_reserva.user,
-                start_date=timezone.now().date(),
-                date_returned=None,
-            )
-            Historico.objects.create(
-                book=emprestimo.book,
-                user=prox_reserva.user,
-                date_start=timezone.now().date(),
-                date_end=None,
-            )
-            prox_reserva.ativa = False
-            prox_reserva.save()
-            book.is_available = False
-            book.save()
-            logger.info('Livro reservado com sucesso: %s', emprestimo.book.name)
-            messages.success(request, 'Livro reservado com sucesso!')
-        else:
-            book.is_available = True
-            book.save()
-        return redirect('acervo:book_detail', book_slug=emprestimo.book.slug)
 
-    return redirect('acervo:book_detail', book_slug=emprestimo.book.slug)
+@login_required
+def cancel_reserva(request, reserva_id):
+    """Cancelar reserva"""
+    reserva = get_object_or_404(
+        Reserva.objects.select_related('book').only(
+            'id', 'ativa', 'book__name', 'book__slug'
+        ),
+        id=reserva_id,
+        user=request.user,
+    )
+    book = reserva.book
+    if request.method != 'POST':
+        return redirect('acervo:book_detail', book_slug=book.slug)
+
+    try:
+        cancelar_reserva(reserva)
+    except ValidationError as exc:
+        logger.error('Reserva não está ativa: %s', book.name)
+        messages.error(request, exc.messages[0])
+    else:
+        logger.info('Reserva cancelada: %s', book.name)
+        messages.success(request, 'Reserva cancelada.')
+    return redirect('acervo:book_detail', book_slug=book.slug)
 
 
+@conditional_page(categories_etag)
 def categories(request):
     logger.info('Visualizando lista de categorias')
-    categories = Category.objects.annotate(total_livros=Count('books'))
+    categories = Category.objects.only('name', 'slug', 'book_count').order_by('name')
     return render(request, 'categorias.html', {'categories': categories})
+
+
+def _category_page(request, category_slug):
+    category = get_object_or_404(
+        Category.objects.only('name', 'slug', 'book_count'), slug=category_slug
+    )
+    # Ordenar pelo id do livro deixa a consulta andar pelo índice
+    # (category_id, book_id) da tabela de vínculos
+    books = (
+        Book.objects.only(*BOOK_LIST_FIELDS)
+        .annotate(excerpt=Left('description', 300))
+        .filter(categories=category)
+    )
+    paginator = KeysetPaginator(books, ('-id',), per_page=BOOKS_PER_PAGE)
+    return category, paginator.get_page(request.GET.get('cursor'))
+
+
+def category_books(request, category_slug):
+    logger.info('Visualizando livros da categoria: %s', category_slug)
+    try:
+        category, page = _category_page(request, category_slug)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor inválido')
+    return render(request, 'categoria.html', {'category': category, 'page': page})
+
+
+def category_books_page(request, category_slug):
+    """Fragmento HTML com a próxima página de livros da categoria"""
+    try:
+        _, page = _category_page(request, category_slug)
+    except InvalidCursor:
+        return HttpResponseBadRequest('Cursor inválido')
+    return render(request, 'books_fragment.html', {'page': page})
@@ -0,0 +1,106 @@
+"""Campos expostos pela API e seleção de campos pelo cliente (``?fields=``).
+
+Cada recurso declara seus campos como o que vai para ``.values()``: o nome
+de uma coluna ou uma expressão. Só os campos pedidos entram no SELECT, e as
+linhas saem do banco como dicionários, sem instanciar modelos.
+"""
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import F, FloatField, OuterRef
+from django.db.models.functions import Cast, NullIf
+
+from library.acervo.models import Book
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+class FieldSet:
+    def __init__(self, fields, default=None, converters=None):
+        self.fields = fields
+        self.default = tuple(default or fields)
+        self.converters = converters or {}
+        # Expressões vão para o SELECT com outro nome: o do campo pode
+        # coincidir com um campo do modelo (ex.: Book.categories)
+        self.keys = {
+            name: name if source == name else f'api_{name}'
+            for name, source in fields.items()
+        }
+
+    def parse(self, value, default=None):
+        """Campos pedidos em ``value`` (separados por vírgula), na ordem pedida"""
+        names = [name.strip() for name in (value or '').split(',') if name.strip()]
+        if not names:
+            return tuple(default or self.default)
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise InvalidFields(
+                f'Campo(s) desconhecido(s): {", ".join(unknown)}. '
+                f'Disponíveis: {", ".join(self.fields)}'
+            )
+        return tuple(dict.fromkeys(names))
+
+    def values(self, queryset, names, extra=()):
+        """``.values()`` com os campos pedidos e as colunas ``extra`` (ordenação)"""
+        columns = list(extra)
+        expressions = {}
+        for name in names:
+            key = self.keys[name]
+            if key == name:
+                columns.append(name)
+            else:
+                expressions[key] = self.fields[name]
+        return queryset.values(*dict.fromkeys(columns), **expressions)
+
+    def serialize(self, row, names):
+        data = {name: row[self.keys[name]] for name in names}
+        for name, convert in self.converters.items():
+            if name in data:
+                data[name] = convert(data[name])
+        return data
+
+
+def _cover_url(name):
+    return Book._meta.get_field('photo').storage.url(name) if name else None
+
+
+def _average(value):
+    return round(value or 0, 2)
+
+
+BOOK_FIELDS = FieldSet(
+    {
+        'id': 'id',
+        'uuid': 'uuid',
+        'slug': 'slug',
+        'name': 'name',
+        'author': 'author',
+        'publisher': 'publisher',
+        'year': 'year',
+        'isbn': 'isbn',
+        'pages': 'pages',
+        'language': 'language',
+        'description': 'description',
+        'cover': F('photo'),
+        'categories': ArraySubquery(
+            Book.categories.through.objects.filter(book_id=OuterRef('pk'))
+            .order_by('category__name')
+            .values('category__slug')
+        ),
+        'is_available': 'is_available',
+        'copies': F('stock__quantity'),
+        'available_copies': F('stock__available'),
+        'rating_count': 'rating_count',
+        'average_rating': Cast('rating_sum', FloatField()) / NullIf('rating_count', 0),
+        'updated_at': 'updated_at',
+    },
+    converters={'cover': _cover_url, 'average_rating': _average},
+)
+BOOK_LIST_FIELDS = ('id', 'slug', 'name', 'author', 'year', 'is_available')
+
+CATEGORY_FIELDS = FieldSet(
+    {'id': 'id', 'slug': 'slug', 'name': 'name', 'book_count': 'book_count'}
+)
+
+AVAILABILITY_FIELDS = ('slug', 'is_available', 'copies', 'available_copies')
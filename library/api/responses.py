@@ -0,0 +1,19 @@
+import orjson
+from django.http import HttpResponse
+
+
+def _default(value):
+    # orjson já trata datas, UUIDs e dataclasses; o resto (ex.: Decimal) vira texto
+    return str(value)
+
+
+class OrjsonResponse(HttpResponse):
+    """JsonResponse serializado com orjson, bem mais rápido que o json padrão"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(orjson.dumps(data, default=_default), **kwargs)
+
+
+def error(message, status=400):
+    return OrjsonResponse({'error': message}, status=status)
@@ -0,0 +1,115 @@
+from django.test import TestCase
+from django.urls import reverse_lazy
+from model_bakery import baker
+
+from library.acervo.models import Book, Category, Stock
+
+
+class BooksApiTest(TestCase):
+    def setUp(self):
+        self.category = baker.make(Category, name='Romance', slug='romance')
+        self.books = []
+        for index in range(5):
+            book = baker.make(Book, name=f'Livro {index}', author='Machado de Assis')
+            book.categories.add(self.category)
+            self.books.append(book)
+        self.url = reverse_lazy('api:books')
+
+    def test_keyset_pages(self):
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = response.json()
+        self.assertEqual(
+            [book['name'] for book in data['results']], ['Livro 0', 'Livro 1']
+        )
+        self.assertEqual(
+            set(data['results'][0]),
+            {'id', 'slug', 'name', 'author', 'year', 'is_available'},
+        )
+
+        names = [book['name'] for book in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            names += [book['name'] for book in data['results']]
+        self.assertEqual(names, [f'Livro {index}' for index in range(5)])
+
+    def test_sparse_fieldsets(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, {'fields': 'slug,categories,average_rating', 'limit': 1}
+            )
+        self.assertEqual(
+            response.json()['results'],
+            [
+                {
+                    'slug': self.books[0].slug,
+                    'categories': ['romance'],
+                    'average_rating': 0,
+                }
+            ],
+        )
+
+    def test_filters_and_errors(self):
+        baker.make(Book, name='Outro', author='Clarice Lispector')
+        response = self.client.get(self.url, {'author': 'clarice', 'fields': 'name'})
+        self.assertEqual(response.json()['results'], [{'name': 'Outro'}])
+
+        for params in ({'fields': 'name,senha'}, {'limit': 1000}, {'cursor': 'x'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.json())
+
+    def test_book_detail(self):
+        book = self.books[0]
+        Stock.objects.filter(book=book).update(quantity=3, available=2)
+        url = reverse_lazy('api:book_detail', args=[book.slug])
+
+        data = self.client.get(url).json()
+        self.assertEqual(data['uuid'], str(book.uuid))
+        self.assertEqual(data['copies'], 3)
+        self.assertEqual(data['available_copies'], 2)
+
+        data = self.client.get(url, {'fields': 'name,author'}).json()
+        self.assertEqual(data, {'name': 'Livro 0', 'author': 'Machado de Assis'})
+
+        response = self.client.get(reverse_lazy('api:book_detail', args=['nada']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_categories(self):
+        data = self.client.get(reverse_lazy('api:categories')).json()
+        self.assertEqual(
+            data['results'],
+            [
+                {
+                    'id': self.category.pk,
+                    'slug': 'romance',
+                    'name': 'Romance',
+                    'book_count': 5,
+                }
+            ],
+        )
+        self.assertIsNone(data['next'])
+
+    def test_availability(self):
+        book = self.books[0]
+        response = self.client.get(
+            reverse_lazy('api:availability'), {'books': f'{book.slug},nada'}
+        )
+        self.assertEqual(
+            response.json()['results'],
+            {
+                book.slug: {
+                    'slug': book.slug,
+                    'is_available': True,
+                    'copies': 1,
+                    'available_copies': 1,
+                },
+                'nada': None,
+            },
+        )
+        self.assertEqual(
+            self.client.get(reverse_lazy('api:availability')).status_code, 400
+        )
+
+    def test_read_only(self):
+        self.assertEqual(self.client.post(self.url).status_code, 405)
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('v1/books/', views.books, name='books'),
+    path('v1/books/<slug:book_slug>/', views.book_detail, name='book_detail'),
+    path('v1/categories/', views.categories, name='categories'),
+    path('v1/availability/', views.availability, name='availability'),
+]
@@ -0,0 +1,121 @@
+"""API JSON somente leitura do catálogo (v1), para o app e os quiosques.
+
+As views não tocam em ``request.user`` nem na sessão: as linhas vêm de
+``.values()`` com só os campos pedidos e são serializadas com orjson.
+"""
+
+from django.views.decorators.http import require_GET
+
+from library.acervo.filter import BookFilter
+from library.acervo.models import Book, Category
+from library.acervo.pagination import InvalidCursor, KeysetPaginator
+
+from .fields import (
+    AVAILABILITY_FIELDS,
+    BOOK_FIELDS,
+    BOOK_LIST_FIELDS,
+    CATEGORY_FIELDS,
+    InvalidFields,
+)
+from .responses import OrjsonResponse, error
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+AVAILABILITY_LIMIT = 100
+CATEGORY_ORDERING = ('name', 'id')
+
+
+def _page_size(request):
+    value = request.GET.get('limit')
+    if not value:
+        return PAGE_SIZE
+    size = int(value)
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(value)
+    return size
+
+
+def _next_url(request, cursor):
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def _paginated(request, queryset, fieldset, ordering, default_fields=None):
+    """Página de resultados com os campos pedidos e o link da próxima"""
+    try:
+        names = fieldset.parse(request.GET.get('fields'), default_fields)
+        per_page = _page_size(request)
+    except InvalidFields as exc:
+        return error(str(exc))
+    except ValueError:
+        return error(f'limit deve estar entre 1 e {MAX_PAGE_SIZE}')
+
+    rows = fieldset.values(
+        queryset, names, extra=[field.lstrip('-') for field in ordering]
+    )
+    try:
+        page = KeysetPaginator(rows, ordering, per_page=per_page).get_page(
+            request.GET.get('cursor')
+        )
+    except InvalidCursor:
+        return error('Cursor inválido')
+
+    return OrjsonResponse(
+        {
+            'results': [fieldset.serialize(row, names) for row in page],
+            'next': _next_url(request, page.next_cursor) if page.has_next else None,
+        }
+    )
+
+
+@require_GET
+def books(request):
+    """Livros do acervo, com os mesmos filtros da listagem (``q``, ``author``...)"""
+    books = BookFilter(request.GET, queryset=Book.objects.all())
+    if not books.is_valid():
+        return error(books.errors.get_json_data())
+    return _paginated(
+        request, books.qs, BOOK_FIELDS, books.ordering, default_fields=BOOK_LIST_FIELDS
+    )
+
+
+@require_GET
+def book_detail(request, book_slug):
+    try:
+        names = BOOK_FIELDS.parse(request.GET.get('fields'))
+    except InvalidFields as exc:
+        return error(str(exc))
+    row = BOOK_FIELDS.values(Book.objects.filter(slug=book_slug), names).first()
+    if row is None:
+        return error('Livro não encontrado', status=404)
+    return OrjsonResponse(BOOK_FIELDS.serialize(row, names))
+
+
+@require_GET
+def categories(request):
+    return _paginated(
+        request, Category.objects.all(), CATEGORY_FIELDS, CATEGORY_ORDERING
+    )
+
+
+@require_GET
+def availability(request):
+    """Disponibilidade de vários livros de uma vez: ``?books=slug1,slug2``.
+
+    Cada slug informado aponta para a disponibilidade do livro ou para null.
+    """
+    slugs = [
+        slug for value in request.GET.getlist('books') for slug in value.split(',')
+    ]
+    slugs = list(dict.fromkeys(slug.strip() for slug in slugs if slug.strip()))
+    if not slugs:
+        return error('Informe ?books=slug1,slug2')
+    if len(slugs) > AVAILABILITY_LIMIT:
+        return error(f'Máximo de {AVAILABILITY_LIMIT} livros por consulta')
+
+    rows = BOOK_FIELDS.values(Book.objects.filter(slug__in=slugs), AVAILABILITY_FIELDS)
+    found = {
+        row['slug']: BOOK_FIELDS.serialize(row, AVAILABILITY_FIELDS) for row in rows
+    }
+    return OrjsonResponse({'results': {slug: found.get(slug) for slug in slugs}})
@@ -0,0 +1,87 @@
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import FileField
+
+from library.core.storage import BLOBS_DIR, ContentAddressedStorage
+
+
+def _legacy_files(model, field):
+    """(pk, nome) dos arquivos do campo gravados antes do storage por conteúdo"""
+    return (
+        model._default_manager.exclude(**{f'{field.attname}__isnull': True})
+        .exclude(**{field.attname: ''})
+        .exclude(**{f'{field.attname}__startswith': f'{BLOBS_DIR}/'})
+        .values_list('pk', field.attname)
+        .order_by('pk')
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Move os arquivos enviados antes do storage endereçado por conteúdo '
+        'para blobs, guardando uma única cópia de cada conteúdo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Só mostra quantos arquivos e bytes seriam economizados',
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('O storage padrão não é o ContentAddressedStorage')
+
+        fields = [
+            (model, field)
+            for model in apps.get_models()
+            for field in model._meta.concrete_fields
+            if isinstance(field, FileField)
+            and isinstance(field.storage, ContentAddressedStorage)
+        ]
+
+        blobs = {}  # nome antigo -> nome do blob
+        sizes = {}  # nome do blob -> tamanho
+        legacy_bytes = references = missing = 0
+        for model, field in fields:
+            for pk, name in _legacy_files(model, field).iterator():
+                if name not in blobs:
+                    if not default_storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f'Arquivo não encontrado: {name}')
+                        continue
+                    with default_storage.open(name, 'rb') as file:
+                        if options['dry_run']:
+                            blobs[name] = default_storage.content_name(name, file)
+                        else:
+                            blobs[name] = default_storage.save(name, file)
+                    legacy_bytes += default_storage.size(name)
+                    sizes[blobs[name]] = default_storage.size(name)
+                elif not options['dry_run']:
+                    default_storage.retain(blobs[name])
+
+                if not options['dry_run']:
+                    model._default_manager.filter(pk=pk).update(
+                        **{field.attname: blobs[name]}
+                    )
+                references += 1
+
+        if not options['dry_run']:
+            for name in blobs:
+                default_storage.delete(name)
+
+        saved = legacy_bytes - sum(sizes.values())
+        verb = 'seriam movidos' if options['dry_run'] else 'movidos'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{len(blobs)} arquivo(s) {verb} para {len(sizes)} blob(s) '
+                f'({references} referência(s), {saved} bytes a menos, '
+                f'{missing} não encontrado(s))'
+            )
+        )
+        if blobs and not options['dry_run']:
+            self.stdout.write(
+                'Rode build_cover_derivatives para gerar as versões das capas movidas.'
+            )
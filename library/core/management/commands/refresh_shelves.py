@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.core.shelves import SHELVES, refresh_shelves
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula as prateleiras da página inicial. Pensado para rodar '
+        'periodicamente (cron); sem --force só recalcula as vencidas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'shelves',
+            nargs='*',
+            help=f'Prateleiras a recalcular (padrão: {", ".join(SHELVES)})',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recalcula mesmo as prateleiras que ainda estão válidas',
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options['shelves']) - set(SHELVES)
+        if unknown:
+            raise CommandError(f'Prateleira desconhecida: {", ".join(sorted(unknown))}')
+
+        refreshed = refresh_shelves(options['shelves'], force=options['force'])
+        if refreshed:
+            message = f'Prateleiras recalculadas: {", ".join(refreshed)}'
+        else:
+            message = 'Nenhuma prateleira vencida'
+        self.stdout.write(self.style.SUCCESS(message))
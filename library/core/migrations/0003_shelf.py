@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:42
+
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ('core', '0002_delete_livro_delete_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shelf',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'uuid',
+                    models.UUIDField(
+                        db_index=True,
+                        default=uuid.uuid4,
+                        editable=False,
+                        unique=True,
+                        verbose_name='uuid',
+                    ),
+                ),
+                (
+                    'created_at',
+                    models.DateTimeField(auto_now_add=True, verbose_name='created at'),
+                ),
+                (
+                    'updated_at',
+                    models.DateTimeField(auto_now=True, verbose_name='updated at'),
+                ),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('book_ids', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Prateleira',
+                'verbose_name_plural': 'Prateleiras',
+            },
+        ),
+    ]
@@ -19,3 +19,32 @@ class AbstractBaseModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Shelf(AbstractBaseModel):
+    """Prateleira da página inicial, pré-calculada como uma lista ordenada de ids"""
+
+    key = models.CharField(max_length=50, unique=True)
+    book_ids = models.JSONField(default=list)
+
+    class Meta:
+        verbose_name = 'Prateleira'
+        verbose_name_plural = 'Prateleiras'
+
+    def __str__(self):
+        return self.key
+
+
+class MediaBlob(AbstractBaseModel):
+    """Arquivo único do storage endereçado por conteúdo e quantos campos o usam"""
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'Arquivo de mídia'
+        verbose_name_plural = 'Arquivos de mídia'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
@@ -0,0 +1,99 @@
+import logging
+from datetime import timedelta
+
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast, Left
+from django.utils import timezone
+
+from library.acervo.models import Book
+from library.core.models import Shelf
+
+logger = logging.getLogger('library')
+
+BOOK_RATING_THRESHOLD = 4
+SHELF_SIZE = 5
+SHELF_MAX_AGE = timedelta(minutes=15)
+
+SHELF_BOOK_FIELDS = (
+    'id',
+    'uuid',
+    'name',
+    'slug',
+    'author',
+    'photo',
+    'photo_variants',
+    'photo_placeholder',
+    'is_available',
+    'rating_count',
+    'rating_sum',
+    'updated_at',
+)
+
+
+def latest_book_ids():
+    return list(
+        Book.objects.filter(created_at__gte=timezone.now() - timedelta(days=7))
+        .order_by('-created_at', '-id')
+        .values_list('id', flat=True)[:SHELF_SIZE]
+    )
+
+
+def top_rated_book_ids():
+    average = Cast(F('rating_sum'), FloatField()) / F('rating_count')
+    return list(
+        Book.objects.filter(rating_count__gt=0)
+        .alias(average=average)
+        .filter(average__gt=BOOK_RATING_THRESHOLD)
+        .order_by('-average', '-rating_count', 'id')
+        .values_list('id', flat=True)[:SHELF_SIZE]
+    )
+
+
+SHELVES = {
+    'latest_books': latest_book_ids,
+    'top_rated_books': top_rated_book_ids,
+}
+
+
+def refresh_shelves(keys=None, force=False):
+    """Recalcula as prateleiras vencidas (ou todas, com ``force``).
+
+    Feito para rodar em segundo plano (cron), fora do ciclo da requisição.
+    Retorna as chaves recalculadas.
+    """
+    keys = list(keys or SHELVES)
+    if not force:
+        fresh = Shelf.objects.filter(
+            key__in=keys, updated_at__gte=timezone.now() - SHELF_MAX_AGE
+        ).values_list('key', flat=True)
+        keys = [key for key in keys if key not in set(fresh)]
+
+    for key in keys:
+        Shelf.objects.update_or_create(key=key, defaults={'book_ids': SHELVES[key]()})
+        logger.info('Prateleira recalculada: %s', key)
+    return keys
+
+
+def get_shelves(keys):
+    """Livros de cada prateleira, na ordem salva, com duas consultas.
+
+    Prateleiras que ainda não existem (primeira execução) são calculadas
+    na hora; as vencidas continuam sendo servidas até o próximo refresh.
+    """
+    shelves = dict(Shelf.objects.filter(key__in=keys).values_list('key', 'book_ids'))
+    missing = [key for key in keys if key not in shelves]
+    if missing:
+        refresh_shelves(missing, force=True)
+        shelves.update(
+            Shelf.objects.filter(key__in=missing).values_list('key', 'book_ids')
+        )
+
+    books = (
+        Book.objects.only(*SHELF_BOOK_FIELDS)
+        .annotate(excerpt=Left('description', 300))
+        .in_bulk({book_id for ids in shelves.values() for book_id in ids})
+    )
+    return {
+        key: [books[book_id] for book_id in shelves[key] if book_id in books]
+        for key in keys
+    }
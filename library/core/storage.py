@@ -0,0 +1,142 @@
+import hashlib
+import os
+from functools import partial
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+from library.core.models import MediaBlob
+
+BLOBS_DIR = 'blobs'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Storage que guarda cada arquivo pelo hash SHA-256 do conteúdo.
+
+    O nome enviado só contribui com a extensão: o mesmo arquivo enviado duas
+    vezes vira um único blob em ``blobs/ab/<hash>.ext``, com um contador de
+    referências em MediaBlob. ``delete`` libera uma referência e só apaga o
+    arquivo quando ninguém mais o usa. Como o conteúdo de uma URL nunca muda,
+    o servidor pode servir ``MEDIA_URL/blobs/`` com cache imutável.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Nomes iguais significam conteúdo igual: nunca há o que renomear
+        return name
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        extension = os.path.splitext(name)[1].lower()
+        hexdigest = digest.hexdigest()
+        return f'{BLOBS_DIR}/{hexdigest[:2]}/{hexdigest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(self.content_name(name, content), content, max_length)
+
+    def _save(self, name, content):
+        # A referência é contada antes de gravar: um delete concorrente do
+        # mesmo blob espera por ela e não apaga o arquivo que está chegando
+        with transaction.atomic():
+            self.retain(name, size=content.size)
+            if not self.exists(name):
+                super()._save(name, content)
+        return name
+
+    def retain(self, name, size=0):
+        """Registra mais uma referência ao blob"""
+        updated = MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, size=size)
+        except IntegrityError:
+            MediaBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def delete(self, name):
+        """Libera uma referência; o arquivo só sai do disco com a última"""
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is not None and blob.refcount > 1:
+                MediaBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+                return
+            if blob is not None:
+                blob.delete()
+            # Arquivos anteriores ao storage (sem MediaBlob) têm um único dono
+            super().delete(name)
+
+
+def _file_name(value):
+    name = getattr(value, 'name', value)
+    return name or None
+
+
+def _stored_name(value):
+    # Um arquivo ainda não gravado (upload recém-atribuído) não ocupa nada no
+    # storage: o nome dele é só o do arquivo enviado
+    if isinstance(value, File) and not getattr(value, '_committed', False):
+        return None
+    return _file_name(value)
+
+
+def track_files(model, *field_names):
+    """Libera no storage os arquivos substituídos ou de objetos excluídos.
+
+    A liberação acontece depois do commit, então um rollback não deixa
+    campos apontando para arquivos já removidos.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+
+    def remember(instance, **kwargs):
+        instance._tracked_files = {
+            field.name: _stored_name(instance.__dict__.get(field.attname))
+            for field in fields
+        }
+
+    def keep_unchanged(instance, raw=False, **kwargs):
+        # Reenviar o mesmo conteúdo geraria o mesmo nome e mais uma
+        # referência que nunca seria liberada: o campo fica com o blob atual
+        loaded = getattr(instance, '_tracked_files', {})
+        for field in fields:
+            previous = loaded.get(field.name)
+            file = getattr(instance, field.attname)
+            content_name = getattr(field.storage, 'content_name', None)
+            if raw or not previous or not file or file._committed or not content_name:
+                continue
+            if content_name(file.name, file) == previous:
+                file.name = previous
+                file._committed = True
+
+    def release_replaced(instance, raw=False, **kwargs):
+        loaded = getattr(instance, '_tracked_files', {})
+        for field in fields:
+            previous = loaded.get(field.name)
+            if (
+                not raw
+                and previous
+                and previous != _file_name(getattr(instance, field.attname))
+            ):
+                transaction.on_commit(partial(field.storage.delete, previous))
+        remember(instance)
+
+    def release_deleted(instance, **kwargs):
+        for field in fields:
+            name = _file_name(getattr(instance, field.attname))
+            if name:
+                transaction.on_commit(partial(field.storage.delete, name))
+
+    uid = f'track_files:{model._meta.label}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    pre_save.connect(keep_unchanged, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(release_replaced, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(release_deleted, sender=model, weak=False, dispatch_uid=uid)
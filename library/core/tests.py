@@ -1,5 +1,25 @@
-from django.test import Client, TestCase
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse_lazy
+from django.utils import timezone
+from model_bakery import baker
+
+from library.acervo.models import Book, BookReview
+from library.usuarios.models import Profile
+
+from .models import MediaBlob, Shelf
+from .shelves import get_shelves, refresh_shelves
 
 
 # Create your tests here.
@@ -14,3 +34,157 @@ class TemplatesTest(TestCase):
         response = self.client.get(reverse_lazy('home'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'home.html')
+
+
+class ShelvesTest(TestCase):
+    """Testes para as prateleiras pré-calculadas da página inicial"""
+
+    def setUp(self):
+        self.users = baker.make(User, _quantity=2)
+        self.good = baker.make(Book, name='Bom')
+        self.great = baker.make(Book, name='Ótimo')
+        self.bad = baker.make(Book, name='Ruim')
+        for user in self.users:
+            BookReview.objects.create(book=self.good, user=user, rating=5)
+            BookReview.objects.create(book=self.bad, user=user, rating=2)
+        BookReview.objects.create(book=self.great, user=self.users[0], rating=5)
+
+    def test_top_rated_shelf(self):
+        refresh_shelves(force=True)
+        top_rated = get_shelves(['top_rated_books'])['top_rated_books']
+        self.assertEqual(top_rated, [self.good, self.great])
+
+    def test_latest_shelf_skips_old_books(self):
+        Book.objects.filter(pk=self.bad.pk).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        refresh_shelves(force=True)
+        latest = get_shelves(['latest_books'])['latest_books']
+        self.assertEqual(latest, [self.great, self.good])
+
+    def test_missing_shelves_are_built_on_demand(self):
+        self.assertFalse(Shelf.objects.exists())
+        shelves = get_shelves(['top_rated_books'])
+        self.assertEqual(len(shelves['top_rated_books']), 2)
+        self.assertTrue(Shelf.objects.filter(key='top_rated_books').exists())
+
+    def test_fresh_shelves_are_not_recalculated(self):
+        refresh_shelves(force=True)
+        self.assertEqual(refresh_shelves(), [])
+
+    def test_home_uses_constant_queries(self):
+        refresh_shelves(force=True)
+        with CaptureQueriesContext(connection) as before:
+            self.client.get(reverse_lazy('home'))
+        baker.make(Book, _quantity=20)
+        refresh_shelves(force=True)
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(reverse_lazy('home'))
+        self.assertEqual(len(before), 2)
+        self.assertEqual(len(after), 2)
+        self.assertEqual(len(response.context['latest_books']), 5)
+
+    def test_refresh_shelves_command(self):
+        out = StringIO()
+        call_command('refresh_shelves', '--force', stdout=out)
+        self.assertIn('latest_books', out.getvalue())
+        self.assertEqual(Shelf.objects.count(), 2)
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media = Path(directory.name)
+        settings_override = override_settings(MEDIA_ROOT=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_same_content_is_stored_once(self):
+        first = default_storage.save('books/capa.PNG', ContentFile(b'capa'))
+        second = default_storage.save('avatars/outra.png', ContentFile(b'capa'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith('blobs/') and first.endswith('.png'))
+        self.assertEqual(self._refcount(first), 2)
+        self.assertEqual(len([p for p in self.media.rglob('*') if p.is_file()]), 1)
+
+    def test_delete_releases_references(self):
+        name = default_storage.save('books/capa.png', ContentFile(b'capa'))
+        default_storage.save('books/capa.png', ContentFile(b'capa'))
+        default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(self._refcount(name), 1)
+
+        default_storage.delete(name)
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_delete_legacy_file(self):
+        legacy = FileSystemStorage().save('books/antiga.png', ContentFile(b'x'))
+        default_storage.delete(legacy)
+        self.assertFalse(default_storage.exists(legacy))
+
+    def test_replaced_and_removed_avatar_is_released(self):
+        user = User.objects.create_user(username='leitor', password='senha12345')
+        profile = Profile.objects.create(user=user)
+        profile.avatar = SimpleUploadedFile('a.png', b'primeira')
+        profile.save()
+        first = profile.avatar.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.get(pk=profile.pk)
+            profile.avatar = SimpleUploadedFile('b.png', b'segunda')
+            profile.save()
+        self.assertFalse(default_storage.exists(first))
+
+        second = profile.avatar.name
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse_lazy('usuarios:remove_avatar'))
+        self.assertFalse(default_storage.exists(second))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_same_avatar_again_keeps_one_reference(self):
+        user = User.objects.create_user(username='leitor', password='senha12345')
+        profile = Profile.objects.create(user=user)
+        profile.avatar = SimpleUploadedFile('a.png', b'primeira')
+        profile.save()
+        name = profile.avatar.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.get(pk=profile.pk)
+            profile.avatar = SimpleUploadedFile('outra.png', b'primeira')
+            profile.save()
+        self.assertEqual(profile.avatar.name, name)
+        self.assertEqual(self._refcount(name), 1)
+
+    def test_new_upload_releases_nothing(self):
+        user = User.objects.create_user(username='leitor', password='senha12345')
+        legacy = FileSystemStorage().save('a.png', ContentFile(b'outro livro'))
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Profile.objects.create(
+                user=user, avatar=SimpleUploadedFile('a.png', b'primeira')
+            )
+        self.assertEqual(callbacks, [])
+        self.assertTrue(default_storage.exists(legacy))
+
+    def test_dedupe_media(self):
+        legacy = FileSystemStorage()
+        first = legacy.save('books/dom.png', ContentFile(b'dom casmurro'))
+        copy = legacy.save('books/dom.png', ContentFile(b'dom casmurro'))
+        for name in (first, copy, first):
+            baker.make(Book, photo=name)
+
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('2 arquivo(s) movidos para 1 blob(s)', out.getvalue())
+
+        names = set(Book.objects.values_list('photo', flat=True))
+        self.assertEqual(len(names), 1)
+        blob = names.pop()
+        self.assertEqual(self._refcount(blob), 3)
+        self.assertFalse(legacy.exists(first))
+        self.assertFalse(legacy.exists(copy))
@@ -1,8 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
 
 from library.emprestimos.models.emprestimo import Emprestimo
 from library.emprestimos.models.reserva import Reserva
 from library.emprestimos.models.historico import Historico
+from library.emprestimos.services import devolver
 
 
 @admin.register(Emprestimo)
@@ -10,11 +12,29 @@ class EmprestimoAdmin(admin.ModelAdmin):
     list_display = ('book', 'user', 'start_date', 'end_date', 'date_returned', 'multa')
     list_filter = ('book', 'user', 'date_returned')
     search_fields = ('book__name', 'user__username')
+    actions = ('registrar_devolucao',)
+
+    @admin.action(description='Registrar devolução dos empréstimos selecionados')
+    def registrar_devolucao(self, request, queryset):
+        devolvidos = separados = 0
+        for emprestimo in queryset.filter(date_returned__isnull=True):
+            try:
+                reserva = devolver(emprestimo)
+            except ValidationError:
+                continue
+            devolvidos += 1
+            separados += reserva is not None
+        self.message_user(
+            request,
+            f'{devolvidos} empréstimo(s) devolvido(s), '
+            f'{separados} separado(s) para quem reservou.',
+            messages.SUCCESS,
+        )
 
 
 @admin.register(Reserva)
 class ReservaAdmin(admin.ModelAdmin):
-    list_display = ('book', 'user', 'created_at', 'ativa')
+    list_display = ('book', 'user', 'created_at', 'ativa', 'retirar_ate')
     list_filter = ('book', 'user', 'ativa')
     search_fields = ('book__name', 'user__username')
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EmprestimosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library.emprestimos'
+
+    def ready(self):
+        from library.emprestimos import signals  # noqa: F401, PLC0415
@@ -0,0 +1,207 @@
+"""Fila de reservas de cada livro, atendida por ordem de chegada.
+
+A fila é a lista de reservas ativas do livro em ordem de ``created_at``
+(e ``id`` no empate), lida pelo índice (book, ativa, created_at): achar
+quem é o próximo lê só a primeira entrada do índice. O tamanho da fila fica
+em ``Book.reservas_ativas``, mantido pelos sinais de library.emprestimos.
+
+Quando um exemplar volta e há fila, ele é separado para o próximo leitor,
+que tem ``DIAS_RETIRADA`` dias para retirá-lo (``Reserva.retirar_ate``).
+Retiradas vencidas são encerradas em lote por ``expirar_retiradas`` (comando
+expire_holds), que passa o exemplar ao seguinte da fila ou o devolve à
+estante.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from library.acervo.models import Book, Stock
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.emprestimos.models.reserva import Reserva
+
+FILA_ORDERING = ('created_at', 'id')
+DIAS_RETIRADA = 3
+LOTE_RETIRADAS = 1000
+
+
+def fila(book_id):
+    """Reservas ativas do livro, da primeira para a última"""
+    return Reserva.objects.filter(book_id=book_id, ativa=True).order_by(*FILA_ORDERING)
+
+
+def aguardando(book_id):
+    """Reservas da fila ainda sem exemplar separado.
+
+    Quem já está com um exemplar do título perde a vez até devolvê-lo.
+    """
+    com_o_livro = Emprestimo.objects.filter(
+        book_id=book_id, user_id=OuterRef('user_id'), date_returned__isnull=True
+    )
+    return fila(book_id).filter(retirar_ate__isnull=True).exclude(Exists(com_o_livro))
+
+
+def proxima_reserva(book_id):
+    return aguardando(book_id).first()
+
+
+def prazo_retirada(hoje=None):
+    return (hoje or timezone.now().date()) + timedelta(days=DIAS_RETIRADA)
+
+
+def ajustar_fila(book_id, delta):
+    """Soma ``delta`` ao tamanho da fila do livro com um único UPDATE"""
+    if delta:
+        Book.objects.filter(pk=book_id).update(
+            reservas_ativas=F('reservas_ativas') + delta
+        )
+
+
+def rebuild_fila_counts(book_ids=None):
+    """Recalcula o tamanho das filas a partir das reservas ativas"""
+    books = Book.objects.all()
+    if book_ids is not None:
+        books = books.filter(pk__in=book_ids)
+    totals = (
+        Reserva.objects.filter(book_id=OuterRef('pk'), ativa=True)
+        .order_by()
+        .values('book_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    return books.update(reservas_ativas=Coalesce(Subquery(totals), Value(0)))
+
+
+def posicoes(user, book_id=None):
+    """Reservas ativas do usuário com a posição em cada fila, numa consulta.
+
+    Cada reserva vem com ``posicao`` (1 é o próximo a receber o livro) e
+    ``tamanho_fila``. A posição conta, pelo índice da fila, quantas reservas
+    do mesmo livro chegaram antes.
+    """
+    antes = (
+        Reserva.objects.filter(book_id=OuterRef('book_id'), ativa=True)
+        .filter(
+            Q(created_at__lt=OuterRef('created_at'))
+            | Q(created_at=OuterRef('created_at'), id__lt=OuterRef('id'))
+        )
+        .order_by()
+        .values('book_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    reservas = Reserva.objects.filter(user=user, ativa=True)
+    if book_id is not None:
+        reservas = reservas.filter(book_id=book_id)
+    return (
+        reservas.select_related('book')
+        .only('id', 'created_at', 'retirar_ate', 'book__name', 'book__slug')
+        .annotate(
+            posicao=Coalesce(Subquery(antes), Value(0)) + 1,
+            tamanho_fila=F('book__reservas_ativas'),
+        )
+        .order_by(*FILA_ORDERING)
+    )
+
+
+SEPARAR_SQL = """
+WITH liberados (book_id, copias) AS (
+    SELECT * FROM unnest(%(books)s::bigint[], %(copias)s::int[])
+),
+aguardando AS (
+    SELECT r.id, r.book_id, row_number() OVER (
+        PARTITION BY r.book_id ORDER BY r.created_at, r.id
+    ) AS posicao
+    FROM {reserva} r
+    JOIN liberados l ON l.book_id = r.book_id
+    WHERE r.ativa AND r.retirar_ate IS NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM {emprestimo} e
+          WHERE e.book_id = r.book_id AND e.user_id = r.user_id
+            AND e.date_returned IS NULL
+      )
+)
+UPDATE {reserva} r SET retirar_ate = %(prazo)s
+FROM aguardando a JOIN liberados l ON l.book_id = a.book_id
+WHERE r.id = a.id AND a.posicao <= l.copias
+RETURNING r.book_id
+"""
+
+EXPIRAR_SQL = """
+UPDATE {reserva} SET ativa = false
+WHERE ativa AND retirar_ate < %(hoje)s AND book_id = ANY(%(books)s::bigint[])
+RETURNING book_id
+"""
+
+
+def separar_exemplares(copias, hoje=None):
+    """Separa exemplares para os próximos da fila de vários livros num UPDATE.
+
+    ``copias`` é um dict {livro: exemplares liberados}; cada livro separa
+    até essa quantidade para as reservas que aguardam, em ordem de chegada.
+    Retorna um Counter {livro: exemplares separados}.
+    """
+    if not copias:
+        return Counter()
+    sql = SEPARAR_SQL.format(
+        reserva=Reserva._meta.db_table, emprestimo=Emprestimo._meta.db_table
+    )
+    params = {
+        'books': list(copias),
+        'copias': list(copias.values()),
+        'prazo': prazo_retirada(hoje),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return Counter(book_id for (book_id,) in cursor.fetchall())
+
+
+def _ajustar_filas(changes):
+    """Aplica um Counter {livro: reservas que saíram}, um UPDATE por quantidade"""
+    by_delta = defaultdict(list)
+    for book_id, total in changes.items():
+        by_delta[total].append(book_id)
+    for total, book_ids in by_delta.items():
+        Book.objects.filter(pk__in=book_ids).update(
+            reservas_ativas=F('reservas_ativas') - total
+        )
+
+
+def expirar_retiradas(hoje=None, lote=LOTE_RETIRADAS):
+    """Encerra as retiradas vencidas de até ``lote`` livros numa transação.
+
+    Tudo em comandos sobre o lote inteiro, sem trabalho por reserva: trava o
+    estoque dos livros (em ordem, como ``devolver`` trava um por vez),
+    encerra as reservas vencidas, acerta o tamanho das filas, separa os
+    exemplares liberados para os próximos de cada fila e devolve à estante
+    os que sobrarem. Retorna (reservas expiradas, exemplares separados,
+    exemplares devolvidos à estante); zero expiradas quer dizer que acabou.
+    """
+    hoje = hoje or timezone.now().date()
+    vencidas = Reserva.objects.filter(ativa=True, retirar_ate__lt=hoje)
+    with transaction.atomic():
+        book_ids = list(
+            Stock.objects.select_for_update()
+            .filter(book_id__in=vencidas.values('book_id'))
+            .order_by('book_id')
+            .values_list('book_id', flat=True)[:lote]
+        )
+        if not book_ids:
+            return 0, 0, 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                EXPIRAR_SQL.format(reserva=Reserva._meta.db_table),
+                {'hoje': hoje, 'books': book_ids},
+            )
+            liberados = Counter(book_id for (book_id,) in cursor.fetchall())
+        _ajustar_filas(liberados)
+
+        separados = separar_exemplares(liberados, hoje)
+        sobras = liberados - separados
+        Stock.objects.restock(sobras)
+    return liberados.total(), separados.total(), sobras.total()
@@ -0,0 +1,141 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+
+from library.acervo.models import Book, Stock
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.emprestimos.services import devolver, emprestar
+from library.usuarios.models import User
+
+
+def run_parallel(func, items, workers):
+    """Aplica ``func`` a cada item em ``workers`` threads.
+
+    Retorna (resultados, segundos).
+    """
+    barrier = threading.Barrier(workers)
+
+    def close_connection():
+        # Uma tarefa por thread: cada uma fecha a conexão que abriu
+        barrier.wait()
+        connections.close_all()
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(func, items))
+        elapsed = perf_counter() - start
+        for _ in range(workers):
+            executor.submit(close_connection)
+    return results, elapsed
+
+
+def run_checkouts(book_id, users, attempts, workers):
+    """Dispara ``attempts`` empréstimos simultâneos por leitor.
+
+    Retorna (empréstimos feitos, pedidos negados, segundos).
+    """
+
+    def checkout(user):
+        try:
+            emprestar(book_id, user)
+        except ValidationError:
+            return False
+        return True
+
+    requests = [user for user in users for _ in range(attempts)]
+    results, elapsed = run_parallel(checkout, requests, workers)
+    done = sum(results)
+    return done, len(results) - done, elapsed
+
+
+def run_returns(book_id, workers):
+    """Devolve em paralelo os empréstimos ativos do livro; (devoluções, segundos)"""
+    loans = list(Emprestimo.objects.filter(book_id=book_id, date_returned__isnull=True))
+    _, elapsed = run_parallel(devolver, loans, workers)
+    return len(loans), elapsed
+
+
+def loan_violations(book_id):
+    """(leitores com mais de um empréstimo ativo, exemplares emprestados a mais)"""
+    active = Emprestimo.objects.filter(book_id=book_id, date_returned__isnull=True)
+    doubled = (
+        active.values('user_id').annotate(total=Count('id')).filter(total__gt=1)
+    ).count()
+    stock = Stock.objects.get(book_id=book_id)
+    oversold = max(active.count() - stock.quantity, 0)
+    if stock.available != stock.quantity - active.count():
+        oversold = max(oversold, 1)
+    return doubled, oversold
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede empréstimos simultâneos do mesmo título: muitos leitores pedindo '
+        'ao mesmo tempo (e mais de uma vez cada) e quantos empréstimos por '
+        'segundo são feitos, conferindo que nenhum saiu em dobro; depois '
+        'devolve todos em paralelo. Cria um livro e leitores temporários e '
+        'os apaga no fim.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=200)
+        parser.add_argument(
+            '--attempts', type=int, default=2, help='Pedidos simultâneos por leitor'
+        )
+        parser.add_argument('--copies', type=int, default=100)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=16,
+            help='Threads (cada uma abre uma conexão com o banco)',
+        )
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        book = Book.objects.create(
+            name=f'Benchmark {tag}', author='bench', publisher='bench', year=2000
+        )
+        Stock.objects.filter(book=book).update(
+            quantity=options['copies'], available=options['copies']
+        )
+        users = User.objects.bulk_create(
+            User(username=f'bench-{tag}-{index}') for index in range(options['readers'])
+        )
+
+        try:
+            done, denied, elapsed = run_checkouts(
+                book.pk, users, options['attempts'], options['workers']
+            )
+            doubled, oversold = loan_violations(book.pk)
+            returned, return_elapsed = run_returns(book.pk, options['workers'])
+            available = Stock.objects.get(book=book).available
+        finally:
+            User.objects.filter(username__startswith=f'bench-{tag}-').delete()
+            book.delete()
+
+        self.stdout.write(
+            f'{done + denied} pedido(s), {done} empréstimo(s), {denied} negado(s) '
+            f'em {elapsed:.2f}s: {done / elapsed:.0f} empréstimos/s, '
+            f'{(done + denied) / elapsed:.0f} pedidos/s'
+        )
+        self.stdout.write(
+            f'{returned} devolução(ões) em {return_elapsed:.2f}s: '
+            f'{returned / return_elapsed:.0f} devoluções/s'
+        )
+        if available != options['copies']:
+            raise CommandError(
+                f'{available} de {options["copies"]} exemplar(es) na estante '
+                'depois das devoluções'
+            )
+        if doubled or oversold:
+            raise CommandError(
+                f'{doubled} leitor(es) com empréstimo em dobro, '
+                f'{oversold} exemplar(es) emprestado(s) a mais'
+            )
+        self.stdout.write(self.style.SUCCESS('Nenhum empréstimo em dobro'))
@@ -0,0 +1,46 @@
+from datetime import date
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from library.emprestimos.fila import LOTE_RETIRADAS, expirar_retiradas
+
+
+class Command(BaseCommand):
+    help = (
+        'Encerra as reservas cujo prazo de retirada venceu e passa cada '
+        'exemplar ao próximo da fila (ou o devolve à estante). Pensado para '
+        'rodar periodicamente (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=date.fromisoformat,
+            help='Data de referência (AAAA-MM-DD); vencem prazos anteriores a ela',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=LOTE_RETIRADAS,
+            help='Quantidade de livros processados por transação',
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        expiradas = separados = devolvidos = 0
+        while True:
+            lote = expirar_retiradas(options['date'], lote=options['batch_size'])
+            if not lote[0]:
+                break
+            expiradas += lote[0]
+            separados += lote[1]
+            devolvidos += lote[2]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{expiradas} reserva(s) expirada(s), {separados} exemplar(es) '
+                f'separado(s) para o próximo da fila, {devolvidos} devolvido(s) '
+                f'à estante em {perf_counter() - start:.2f}s'
+            )
+        )
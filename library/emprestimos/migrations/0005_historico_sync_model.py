@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('emprestimos', '0004_historico'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='historico',
+            options={
+                'ordering': ['-date_start'],
+                'verbose_name': 'Historico',
+                'verbose_name_plural': 'Historicos',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='historico',
+            name='ativa',
+        ),
+        migrations.AlterField(
+            model_name='historico',
+            name='date_end',
+            field=models.DateField(
+                blank=True, null=True, verbose_name='data de devolução'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='historico',
+            name='date_start',
+            field=models.DateField(
+                auto_now_add=True, verbose_name='data de emprestimo'
+            ),
+        ),
+    ]
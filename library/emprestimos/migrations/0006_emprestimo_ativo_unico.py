@@ -0,0 +1,56 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def close_duplicate_loans(apps, schema_editor):
+    # Empréstimos duplicados (da corrida no clique duplo): fica o mais antigo
+    # de cada leitor e título; os outros são encerrados no mesmo dia e o
+    # exemplar volta à estante
+    Emprestimo = apps.get_model('emprestimos', 'Emprestimo')
+    Stock = apps.get_model('acervo', 'Stock')
+    Book = apps.get_model('acervo', 'Book')
+    duplicates = (
+        Emprestimo.objects.filter(date_returned__isnull=True)
+        .values('book_id', 'user_id')
+        .annotate(total=Count('id'), first=Min('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        closed = (
+            Emprestimo.objects.filter(
+                book_id=row['book_id'],
+                user_id=row['user_id'],
+                date_returned__isnull=True,
+            )
+            .exclude(pk=row['first'])
+            .update(date_returned=F('start_date'))
+        )
+        stock = Stock.objects.filter(book_id=row['book_id']).first()
+        if stock:
+            stock.available = min(stock.available + closed, stock.quantity)
+            stock.save(update_fields=['available'])
+            if stock.available:
+                Book.objects.filter(pk=row['book_id']).update(is_available=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0023_book_updated_at_index'),
+        ('emprestimos', '0005_historico_sync_model'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='emprestimo',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('date_returned__isnull', True)),
+                fields=('book', 'user'),
+                name='emprestimo_ativo_unico',
+            ),
+        ),
+    ]
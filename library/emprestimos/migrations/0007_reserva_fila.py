@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_reservas_ativas(apps, schema_editor):
+    Book = apps.get_model('acervo', 'Book')
+    Reserva = apps.get_model('emprestimos', 'Reserva')
+
+    rows = (
+        Reserva.objects.filter(ativa=True)
+        .values('book_id')
+        .annotate(total=Count('*'))
+        .order_by()
+    )
+    for row in rows.iterator():
+        Book.objects.filter(pk=row['book_id']).update(reservas_ativas=row['total'])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0024_book_reservas_ativas'),
+        ('emprestimos', '0006_emprestimo_ativo_unico'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(
+                fields=['book', 'ativa', 'created_at'], name='reserva_fila_idx'
+            ),
+        ),
+        migrations.RunPython(populate_reservas_ativas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0024_book_reservas_ativas'),
+        ('emprestimos', '0007_reserva_fila'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='retirar_ate',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(
+                condition=models.Q(('ativa', True), ('retirar_ate__isnull', False)),
+                fields=['retirar_ate'],
+                name='reserva_retirada_idx',
+            ),
+        ),
+    ]
@@ -1,13 +1,17 @@
-from datetime import timedelta
+from datetime import date, timedelta
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
-from library.acervo.models import Book
+from library.acervo.models import Book, Stock
 from library.emprestimos.models.reserva import Reserva
 from library.usuarios.models import User
 
+ACTIVE_LOAN_CONSTRAINT = 'emprestimo_ativo_unico'
+DIAS_EMPRESTIMO = 14
+DIAS_RENOVACAO = 7
+
 
 class Emprestimo(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='emprestimos')
@@ -17,6 +21,16 @@ class Emprestimo(models.Model):
     date_returned = models.DateField(null=True, blank=True)
     multa = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    class Meta:
+        constraints = [
+            # Um leitor fica com no máximo um exemplar de cada título por vez
+            models.UniqueConstraint(
+                fields=['book', 'user'],
+                condition=models.Q(date_returned__isnull=True),
+                name=ACTIVE_LOAN_CONSTRAINT,
+            ),
+        ]
+
     def __str__(self):
         return f'{self.book.name} emprestado para {self.user.username}'
 
@@ -60,17 +74,23 @@ class Emprestimo(models.Model):
         return 0
 
     @property
-    def pode_renovar(self):
+    def renovacao_no_prazo(self):
+        """Renovação só é permitida na véspera do vencimento"""
         if not self.esta_ativo or not self.end_date:
             return False
 
         hoje = timezone.now().date()
         dias_restantes = (self.end_date - hoje).days
+        return dias_restantes == 1
 
-        if dias_restantes != 1:
+    @property
+    def pode_renovar(self):
+        if not self.renovacao_no_prazo:
             return False
 
-        existe_reserva = Reserva.objects.filter(book=self.book, ativa=True).exists()
+        existe_reserva = Reserva.objects.filter(
+            book_id=self.book_id, ativa=True
+        ).exists()
 
         return not existe_reserva
 
@@ -78,16 +98,69 @@ class Emprestimo(models.Model):
         if self.id is None and not self.book.is_available:
             raise ValidationError('Este livro não está disponível para empréstimo.')
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda a devolução já gravada: o exemplar só volta à estante uma vez
+        instance._loaded_date_returned = instance.__dict__.get('date_returned')
+        return instance
+
+    def registrar_devolucao(self, data=None):
+        """Marca a devolução com um UPDATE condicional (data e multa).
+
+        Retorna False se o empréstimo já tinha sido devolvido, por exemplo
+        num envio duplicado do formulário. Não mexe no estoque: o exemplar
+        pode voltar à estante ou seguir para quem reservou (ver
+        library.emprestimos.services.devolver).
+        """
+        self.date_returned = data or timezone.now().date()
+        self.multa = self.calculate_multa()
+        updated = Emprestimo.objects.filter(
+            pk=self.pk, date_returned__isnull=True
+        ).update(date_returned=self.date_returned, multa=self.multa)
+        self._loaded_date_returned = self.date_returned
+        return bool(updated)
+
+    def renovar(self, dias=DIAS_RENOVACAO):
+        self.end_date += timedelta(days=dias)
+        self.save(update_fields=['end_date'])
+
+    def save(self, *args, retirar_exemplar=True, **kwargs):
+        """Grava o empréstimo com uma escrita por tabela.
+
+        Prazo e multa são calculados antes, para irem no mesmo INSERT ou
+        UPDATE; o estoque muda com um UPDATE condicional (ver StockManager).
+        Com ``retirar_exemplar=False`` o novo empréstimo não tira exemplar da
+        estante: é o que acabou de ser devolvido, repassado a quem reservou.
+        """
         created = self.id is None
-        super().save(*args, **kwargs)
-
-        if created:
-            self.end_date = self.start_date + timedelta(days=14)
-            super().save(update_fields=['end_date'])
-
+        devolvido_agora = (
+            not created
+            and self.date_returned is not None
+            and getattr(self, '_loaded_date_returned', None) is None
+        )
+
+        if created and self.end_date is None:
+            # start_date (auto_now_add) recebe date.today() no INSERT
+            self.end_date = date.today() + timedelta(days=DIAS_EMPRESTIMO)
         if self.date_returned:
             self.multa = self.calculate_multa()
-            self.book.is_available = True
-            self.book.save()
-            super().save(update_fields=['multa'])
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'date_returned' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'multa'}
+
+        with transaction.atomic():
+            if (
+                created
+                and retirar_exemplar
+                and self.date_returned is None
+                and not Stock.objects.checkout(self.book_id)
+            ):
+                raise ValidationError('Este livro não está disponível para empréstimo.')
+
+            super().save(*args, **kwargs)
+
+            if devolvido_agora:
+                Stock.objects.checkin(self.book_id)
+
+        self._loaded_date_returned = self.date_returned
@@ -9,9 +9,38 @@ class Reserva(models.Model):
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     ativa = models.BooleanField(default=True)
+    # Prazo para retirar o exemplar separado para o leitor; vazio enquanto
+    # ele ainda espera na fila (ver library.emprestimos.fila)
+    retirar_ate = models.DateField(null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Fila de cada livro (ver library.emprestimos.fila)
+            models.Index(
+                fields=['book', 'ativa', 'created_at'], name='reserva_fila_idx'
+            ),
+            # Varredura das retiradas vencidas (comando expire_holds)
+            models.Index(
+                fields=['retirar_ate'],
+                condition=models.Q(ativa=True, retirar_ate__isnull=False),
+                name='reserva_retirada_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.book.name} reservado para {self.user.username}'
+
+    @property
+    def separada(self):
+        """O exemplar está separado, esperando o leitor retirar"""
+        return self.ativa and self.retirar_ate is not None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado gravado, para o tamanho da fila mudar só quando ativa mudar
+        # e para o exemplar separado não se perder quando a reserva sai da fila
+        instance._loaded_ativa = instance.__dict__.get('ativa')
+        instance._loaded_retirar_ate = instance.__dict__.get('retirar_ate')
+        return instance
@@ -0,0 +1,182 @@
+"""Operações de circulação que precisam acontecer numa única transação."""
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from library.acervo.models import Stock
+from library.emprestimos.fila import aguardando, ajustar_fila, fila, prazo_retirada
+from library.emprestimos.models.emprestimo import ACTIVE_LOAN_CONSTRAINT, Emprestimo
+from library.emprestimos.models.historico import Historico
+from library.emprestimos.models.reserva import Reserva
+
+JA_EMPRESTADO = 'Você já está com um exemplar deste livro.'
+INDISPONIVEL = 'Este livro não está disponível para empréstimo.'
+INATIVO = 'Este empréstimo não está ativo.'
+JA_RESERVADO = 'Você já reservou este livro.'
+RESERVA_INATIVA = 'Esta reserva não está ativa.'
+
+
+def _travar_estoque(book_id):
+    """Trava a linha do estoque: a circulação do título segue uma de cada vez"""
+    Stock.objects.select_for_update().filter(book_id=book_id).values('pk').first()
+
+
+def emprestar(book_id, user):
+    """Empresta um exemplar do livro ao usuário e registra no histórico.
+
+    A linha do estoque do livro é travada (SELECT ... FOR UPDATE) antes das
+    verificações, então pedidos simultâneos do mesmo título são atendidos um
+    de cada vez: um clique duplo não gera dois empréstimos e o último
+    exemplar não sai duas vezes. A trava é no estoque, e não no livro, para
+    seguir a mesma ordem da devolução (estoque, depois livro) e não criar
+    deadlock. A restrição única parcial em Emprestimo garante o mesmo no
+    banco para quem grava fora deste caminho.
+
+    Se há um exemplar separado para o usuário (reserva dentro do prazo de
+    retirada), é ele que sai, e a reserva é encerrada; a estante só é
+    consultada quando o livro tem fila.
+
+    Levanta ValidationError com code ``ja_emprestado`` ou ``indisponivel``.
+    """
+    try:
+        with transaction.atomic():
+            stock = (
+                Stock.objects.select_for_update(of=('self',))
+                .only('available')
+                .annotate(fila=F('book__reservas_ativas'))
+                .filter(book_id=book_id)
+                .first()
+            )
+            if Emprestimo.objects.filter(
+                book_id=book_id, user=user, date_returned__isnull=True
+            ).exists():
+                raise ValidationError(JA_EMPRESTADO, code='ja_emprestado')
+            reserva = None
+            if stock is not None and stock.fila:
+                reserva = (
+                    Reserva.objects.filter(
+                        book_id=book_id,
+                        user=user,
+                        ativa=True,
+                        retirar_ate__gte=timezone.now().date(),
+                    )
+                    .values_list('pk', flat=True)
+                    .first()
+                )
+            if reserva is None and (stock is None or stock.available <= 0):
+                raise ValidationError(INDISPONIVEL, code='indisponivel')
+
+            emprestimo = Emprestimo(book_id=book_id, user=user)
+            emprestimo.save(retirar_exemplar=reserva is None)
+            Historico.objects.create(book_id=book_id, user=user)
+            if reserva is not None:
+                # O exemplar separado virou empréstimo: nada a liberar
+                Reserva.objects.filter(pk=reserva).update(ativa=False)
+                ajustar_fila(book_id, -1)
+    except IntegrityError as exc:
+        if ACTIVE_LOAN_CONSTRAINT not in str(exc):
+            raise
+        raise ValidationError(JA_EMPRESTADO, code='ja_emprestado') from exc
+    return emprestimo
+
+
+def _separar_exemplar(book_id):
+    """Separa o exemplar para o próximo da fila ou o devolve à estante.
+
+    Chamada com o estoque do livro travado. Retorna a reserva ou None.
+    """
+    reserva = (
+        aguardando(book_id)
+        .select_for_update(of=('self',))
+        .only('book_id', 'ativa', 'retirar_ate')
+        .first()
+    )
+    if reserva is None:
+        Stock.objects.checkin(book_id)
+        return None
+    reserva.retirar_ate = prazo_retirada()
+    reserva.save(update_fields=['retirar_ate'])
+    return reserva
+
+
+def liberar_exemplar(book_id):
+    """Passa adiante o exemplar de uma reserva separada que saiu da fila.
+
+    Para quando a reserva é excluída ou desativada fora de
+    ``cancelar_reserva`` (admin, exclusão do leitor): o exemplar vai ao
+    próximo da fila ou volta à estante, com o estoque travado.
+    """
+    with transaction.atomic():
+        _travar_estoque(book_id)
+        return _separar_exemplar(book_id)
+
+
+def devolver(emprestimo, data=None):
+    """Registra a devolução e separa o exemplar para quem reservou primeiro.
+
+    Tudo numa transação, com a linha do estoque travada como em
+    ``emprestar``: devoluções e empréstimos simultâneos do título são
+    atendidos em fila e a reserva da vez é travada junto, então o exemplar
+    não é separado para dois leitores. O número de comandos é fixo:
+
+    - sem reserva: UPDATE do empréstimo, do histórico e do estoque (mais o
+      do livro, se ele voltar a ficar disponível);
+    - com reserva: UPDATE do empréstimo, do histórico e da reserva, que
+      ganha o prazo de retirada. O exemplar fica separado, fora da estante,
+      até o leitor retirá-lo (``emprestar``) ou o prazo vencer (comando
+      expire_holds).
+
+    A reserva da vez é a primeira da fila ainda sem exemplar separado (ver
+    library.emprestimos.fila); reservas de quem já está com um exemplar do
+    título são puladas. Retorna a reserva atendida ou None. Levanta
+    ValidationError com code ``inativo`` se o empréstimo já tinha sido
+    devolvido.
+    """
+    with transaction.atomic():
+        _travar_estoque(emprestimo.book_id)
+        if not emprestimo.registrar_devolucao(data):
+            raise ValidationError(INATIVO, code='inativo')
+        Historico.objects.filter(
+            book_id=emprestimo.book_id,
+            user_id=emprestimo.user_id,
+            date_end__isnull=True,
+        ).update(date_end=emprestimo.date_returned)
+        return _separar_exemplar(emprestimo.book_id)
+
+
+def reservar(book_id, user):
+    """Coloca o usuário no fim da fila do livro.
+
+    Trava o estoque como ``emprestar`` e ``devolver``, então um clique duplo
+    não gera duas reservas. Levanta ValidationError com code ``ja_reservado``.
+    """
+    with transaction.atomic():
+        _travar_estoque(book_id)
+        if fila(book_id).filter(user=user).exists():
+            raise ValidationError(JA_RESERVADO, code='ja_reservado')
+        return Reserva.objects.create(book_id=book_id, user=user)
+
+
+def cancelar_reserva(reserva):
+    """Tira a reserva da fila; ValidationError (``inativa``) se já tinha saído.
+
+    Se havia um exemplar separado para ela, ele passa ao próximo da fila ou
+    volta à estante.
+    """
+    with transaction.atomic():
+        _travar_estoque(reserva.book_id)
+        atual = (
+            Reserva.objects.filter(pk=reserva.pk, ativa=True)
+            .values('retirar_ate')
+            .first()
+        )
+        if atual is None:
+            raise ValidationError(RESERVA_INATIVA, code='inativa')
+        Reserva.objects.filter(pk=reserva.pk).update(ativa=False)
+        ajustar_fila(reserva.book_id, -1)
+        if atual['retirar_ate'] is not None:
+            _separar_exemplar(reserva.book_id)
+    reserva.ativa = reserva._loaded_ativa = False
+    return reserva
@@ -0,0 +1,47 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from library.emprestimos.fila import ajustar_fila, rebuild_fila_counts
+from library.emprestimos.models.reserva import Reserva
+from library.emprestimos.services import liberar_exemplar
+
+
+def _liberar_exemplar(book_id):
+    transaction.on_commit(partial(liberar_exemplar, book_id))
+
+
+@receiver(post_save, sender=Reserva)
+def update_fila_on_save(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    if created:
+        ajustar_fila(instance.book_id, 1 if instance.ativa else 0)
+    elif getattr(instance, '_loaded_ativa', None) is None:
+        # Instância não veio do banco: não sabemos se estava ativa
+        rebuild_fila_counts([instance.book_id])
+    elif instance._loaded_ativa != instance.ativa:
+        ajustar_fila(instance.book_id, 1 if instance.ativa else -1)
+
+    # Reserva separada que saiu da fila (ou perdeu o prazo) por fora de
+    # cancelar_reserva, como numa edição no admin: o exemplar segue adiante
+    separada = getattr(instance, '_loaded_ativa', False) and getattr(
+        instance, '_loaded_retirar_ate', None
+    )
+    if separada and not instance.separada:
+        _liberar_exemplar(instance.book_id)
+
+    instance._loaded_ativa = instance.ativa
+    instance._loaded_retirar_ate = instance.retirar_ate
+
+
+@receiver(post_delete, sender=Reserva)
+def update_fila_on_delete(sender, instance, **kwargs):
+    if not getattr(instance, '_loaded_ativa', instance.ativa):
+        return
+    ajustar_fila(instance.book_id, -1)
+    if getattr(instance, '_loaded_retirar_ate', instance.retirar_ate):
+        _liberar_exemplar(instance.book_id)
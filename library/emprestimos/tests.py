@@ -1 +1,458 @@
-# Create your tests here.
+import re
+import tempfile
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+
+from library.acervo.models import Book, Stock
+
+from .fila import (
+    DIAS_RETIRADA,
+    expirar_retiradas,
+    posicoes,
+    proxima_reserva,
+    rebuild_fila_counts,
+)
+from .management.commands.bench_checkout import loan_violations, run_checkouts
+from .models.emprestimo import Emprestimo
+from .models.historico import Historico
+from .models.reserva import Reserva
+from .services import cancelar_reserva, devolver, emprestar, reservar
+
+
+class CirculacaoTest(TestCase):
+    def setUp(self):
+        self.book = baker.make(Book, name='Dom Casmurro')
+        Stock.objects.filter(book=self.book).update(quantity=2, available=2)
+        self.users = [
+            User.objects.create_user(username=f'leitor{i}', password='senha12345')
+            for i in range(3)
+        ]
+
+    def _available(self):
+        return Stock.objects.get(book=self.book).available
+
+    def test_lends_every_copy(self):
+        Emprestimo.objects.create(book=self.book, user=self.users[0])
+        Emprestimo.objects.create(book=self.book, user=self.users[1])
+        self.assertEqual(self._available(), 0)
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.is_available)
+
+        with pytest.raises(ValidationError):
+            Emprestimo.objects.create(book=self.book, user=self.users[2])
+        self.assertEqual(Emprestimo.objects.filter(book=self.book).count(), 2)
+
+    def test_return_puts_copy_back_once(self):
+        emprestimo = Emprestimo.objects.create(book=self.book, user=self.users[0])
+        emprestimo.date_returned = timezone.now().date()
+        emprestimo.save()
+        self.assertEqual(self._available(), 2)
+
+        emprestimo = Emprestimo.objects.get(pk=emprestimo.pk)
+        emprestimo.save()
+        Stock.objects.checkout(self.book.pk)
+        Emprestimo.objects.get(pk=emprestimo.pk).save()
+        self.assertEqual(self._available(), 1)
+
+    def test_emprestar_view(self):
+        url = reverse('emprestimos:emprestar_book', args=[self.book.slug])
+        for user in self.users:
+            self.client.force_login(user)
+            self.client.post(url)
+        self.assertEqual(
+            Emprestimo.objects.filter(book=self.book).count(),
+            2,
+        )
+        self.assertEqual(self._available(), 0)
+
+    def test_emprestar_view_one_copy_per_user(self):
+        url = reverse('emprestimos:emprestar_book', args=[self.book.slug])
+        self.client.force_login(self.users[0])
+        self.client.post(url)
+        self.client.post(url)
+        self.assertEqual(Emprestimo.objects.filter(book=self.book).count(), 1)
+        self.assertEqual(self._available(), 1)
+
+    def test_emprestar_service(self):
+        emprestar(self.book.pk, self.users[0])
+        with pytest.raises(ValidationError) as raised:
+            emprestar(self.book.pk, self.users[0])
+        self.assertEqual(raised.value.code, 'ja_emprestado')
+
+        emprestar(self.book.pk, self.users[1])
+        with pytest.raises(ValidationError) as raised:
+            emprestar(self.book.pk, self.users[2])
+        self.assertEqual(raised.value.code, 'indisponivel')
+
+        self.assertEqual(self._available(), 0)
+        self.assertEqual(Historico.objects.filter(book=self.book).count(), 2)
+
+    def test_one_active_loan_per_reader_in_database(self):
+        Emprestimo.objects.create(book=self.book, user=self.users[0])
+        with pytest.raises(IntegrityError):
+            Emprestimo.objects.create(book=self.book, user=self.users[0])
+        # A falha desfaz também a retirada do exemplar
+        self.assertEqual(self._available(), 1)
+
+    def test_devolver_service(self):
+        emprestimo = emprestar(self.book.pk, self.users[0])
+        self.assertIsNone(devolver(emprestimo))
+        with pytest.raises(ValidationError) as raised:
+            devolver(Emprestimo.objects.get(pk=emprestimo.pk))
+        self.assertEqual(raised.value.code, 'inativo')
+        self.assertEqual(self._available(), 2)
+
+    def test_return_view_holds_copy_for_reservation(self):
+        emprestimo = emprestar(self.book.pk, self.users[0])
+        emprestar(self.book.pk, self.users[1])
+        # Quem já está com o livro perde a vez na fila
+        baker.make(Reserva, book=self.book, user=self.users[1])
+        reserva = baker.make(Reserva, book=self.book, user=self.users[2])
+        url = reverse('acervo:return_book', args=[emprestimo.pk])
+
+        self.client.force_login(self.users[0])
+        self.assertRedirects(
+            self.client.get(url),
+            reverse('acervo:book_detail', args=[self.book.slug]),
+            fetch_redirect_response=False,
+        )
+        self.client.post(url)
+        self.client.post(url)
+
+        reserva.refresh_from_db()
+        self.assertTrue(reserva.separada)
+        self.assertEqual(
+            (reserva.retirar_ate - timezone.now().date()).days, DIAS_RETIRADA
+        )
+        self.assertEqual(self._available(), 0)
+
+        # O exemplar separado só sai para quem reservou
+        with pytest.raises(ValidationError):
+            emprestar(self.book.pk, self.users[0])
+        self.client.force_login(self.users[2])
+        self.client.post(reverse('emprestimos:emprestar_book', args=[self.book.slug]))
+        reserva.refresh_from_db()
+        self.assertFalse(reserva.ativa)
+        self.assertTrue(
+            Emprestimo.objects.filter(
+                book=self.book, user=self.users[2], date_returned__isnull=True
+            ).exists()
+        )
+        self.assertEqual(self._available(), 0)
+
+
+WRITE = re.compile(r'^(INSERT INTO|UPDATE) "(\w+)"')
+
+
+class EscritasTest(TestCase):
+    """Cada transição grava no máximo uma vez em cada tabela"""
+
+    def setUp(self):
+        self.book = baker.make(Book, name='Dom Casmurro')
+        Stock.objects.filter(book=self.book).update(quantity=2, available=2)
+        self.user = baker.make(User)
+
+    def writes(self, action):
+        with CaptureQueriesContext(connection) as queries:
+            action()
+        matches = (WRITE.match(query['sql']) for query in queries)
+        return Counter(match.groups() for match in matches if match)
+
+    def test_checkout(self):
+        writes = self.writes(lambda: emprestar(self.book.pk, self.user))
+        self.assertEqual(
+            writes,
+            {
+                ('INSERT INTO', 'emprestimos_emprestimo'): 1,
+                ('INSERT INTO', 'emprestimos_historico'): 1,
+                ('UPDATE', 'acervo_stock'): 1,
+                ('UPDATE', 'acervo_book'): 1,
+            },
+        )
+        emprestimo = Emprestimo.objects.get(book=self.book)
+        self.assertEqual((emprestimo.end_date - emprestimo.start_date).days, 14)
+
+    def test_renew(self):
+        emprestimo = emprestar(self.book.pk, self.user)
+        end_date = emprestimo.end_date
+        self.assertEqual(
+            self.writes(emprestimo.renovar),
+            {('UPDATE', 'emprestimos_emprestimo'): 1},
+        )
+        emprestimo.refresh_from_db()
+        self.assertEqual((emprestimo.end_date - end_date).days, 7)
+
+    def test_return(self):
+        emprestimo = emprestar(self.book.pk, self.user)
+        Emprestimo.objects.filter(pk=emprestimo.pk).update(
+            end_date=timezone.now().date() - timedelta(days=3)
+        )
+        emprestimo = Emprestimo.objects.get(pk=emprestimo.pk)
+        self.assertEqual(
+            self.writes(lambda: devolver(emprestimo)),
+            {
+                ('UPDATE', 'emprestimos_emprestimo'): 1,
+                ('UPDATE', 'emprestimos_historico'): 1,
+                ('UPDATE', 'acervo_stock'): 1,
+                ('UPDATE', 'acervo_book'): 1,
+            },
+        )
+        emprestimo.refresh_from_db()
+        self.assertEqual(emprestimo.multa, 3)
+        self.assertEqual(Stock.objects.get(book=self.book).available, 2)
+        self.assertIsNotNone(Historico.objects.get(book=self.book).date_end)
+
+    def test_return_with_reservation(self):
+        emprestimo = emprestar(self.book.pk, self.user)
+        reserva = baker.make(Reserva, book=self.book)
+        self.assertEqual(
+            self.writes(lambda: devolver(emprestimo)),
+            {
+                ('UPDATE', 'emprestimos_emprestimo'): 1,
+                ('UPDATE', 'emprestimos_historico'): 1,
+                ('UPDATE', 'emprestimos_reserva'): 1,
+            },
+        )
+        # O exemplar fica separado, fora da estante
+        self.assertEqual(Stock.objects.get(book=self.book).available, 1)
+
+        self.assertEqual(
+            self.writes(lambda: emprestar(self.book.pk, reserva.user)),
+            {
+                ('INSERT INTO', 'emprestimos_emprestimo'): 1,
+                ('INSERT INTO', 'emprestimos_historico'): 1,
+                ('UPDATE', 'emprestimos_reserva'): 1,
+                ('UPDATE', 'acervo_book'): 1,
+            },
+        )
+        self.assertEqual(Stock.objects.get(book=self.book).available, 1)
+
+
+class FilaTest(TestCase):
+    def setUp(self):
+        self.book = baker.make(Book, name='Dom Casmurro')
+        self.outro = baker.make(Book, name='Memórias Póstumas')
+        self.users = [
+            User.objects.create_user(username=f'leitor{i}', password='senha12345')
+            for i in range(3)
+        ]
+
+    def _tamanho(self, book):
+        return Book.objects.values_list('reservas_ativas', flat=True).get(pk=book.pk)
+
+    def test_counter_follows_queue(self):
+        emprestimo = emprestar(self.book.pk, self.users[0])
+        primeira = reservar(self.book.pk, self.users[1])
+        reservar(self.book.pk, self.users[2])
+        with pytest.raises(ValidationError) as raised:
+            reservar(self.book.pk, self.users[2])
+        self.assertEqual(raised.value.code, 'ja_reservado')
+        self.assertEqual(self._tamanho(self.book), 2)
+        self.assertEqual(proxima_reserva(self.book.pk), primeira)
+
+        self.assertEqual(devolver(emprestimo), primeira)
+        self.assertEqual(self._tamanho(self.book), 2)
+        segunda = proxima_reserva(self.book.pk)
+
+        # Cancelar a reserva separada passa o exemplar ao próximo
+        cancelar_reserva(primeira)
+        self.assertEqual(self._tamanho(self.book), 1)
+        segunda.refresh_from_db()
+        self.assertTrue(segunda.separada)
+        with pytest.raises(ValidationError) as raised:
+            cancelar_reserva(primeira)
+        self.assertEqual(raised.value.code, 'inativa')
+
+        cancelar_reserva(segunda)
+        self.assertEqual(self._tamanho(self.book), 0)
+        self.assertEqual(Stock.objects.get(book=self.book).available, 1)
+
+        reserva = baker.make(Reserva, book=self.book)
+        reserva.delete()
+        Book.objects.filter(pk=self.book.pk).update(reservas_ativas=5)
+        rebuild_fila_counts([self.book.pk])
+        self.assertEqual(self._tamanho(self.book), 0)
+
+    def test_positions_in_one_query(self):
+        for user in self.users:
+            reservar(self.book.pk, user)
+        reservar(self.outro.pk, self.users[2])
+
+        with self.assertNumQueries(1):
+            reservas = [
+                (reserva.book.slug, reserva.posicao, reserva.tamanho_fila)
+                for reserva in posicoes(self.users[2])
+            ]
+        self.assertEqual(reservas, [(self.book.slug, 3, 3), (self.outro.slug, 1, 1)])
+
+    def test_positions_endpoint(self):
+        reservar(self.book.pk, self.users[0])
+        reservar(self.book.pk, self.users[1])
+        self.client.force_login(self.users[1])
+        data = self.client.get(reverse('emprestimos:reservas_posicoes')).json()
+        self.assertEqual(len(data['results']), 1)
+        self.assertEqual(data['results'][0]['book'], self.book.slug)
+        self.assertEqual(data['results'][0]['posicao'], 2)
+        self.assertEqual(data['results'][0]['tamanho_fila'], 2)
+
+    def test_book_detail_shows_position_and_cancels(self):
+        Stock.objects.filter(book=self.book).update(available=0)
+        Book.objects.filter(pk=self.book.pk).update(is_available=False)
+        reservar(self.book.pk, self.users[0])
+        reserva = reservar(self.book.pk, self.users[1])
+        url = reverse('acervo:book_detail', args=[self.book.slug])
+
+        self.client.force_login(self.users[1])
+        response = self.client.get(url)
+        self.assertEqual(response.context['reserva_usuario'], reserva)
+        self.assertFalse(response.context['voce_e_o_proximo'])
+        self.assertContains(response, 'Posição na fila: 2')
+
+        self.client.force_login(self.users[0])
+        self.assertTrue(self.client.get(url).context['voce_e_o_proximo'])
+
+        self.client.force_login(self.users[1])
+        cancel_url = reverse('acervo:cancel_reserva', args=[reserva.pk])
+        self.assertRedirects(self.client.post(cancel_url), url)
+        reserva.refresh_from_db()
+        self.assertFalse(reserva.ativa)
+        self.assertEqual(self._tamanho(self.book), 1)
+        self.assertIsNone(self.client.get(url).context['reserva_usuario'])
+
+
+class RetiradaTest(TestCase):
+    def setUp(self):
+        self.hoje = timezone.now().date()
+        self.users = baker.make(User, _quantity=4)
+        self.books = baker.make(Book, _quantity=3)
+        for book in self.books:
+            Stock.objects.filter(book=book).update(quantity=2, available=0)
+            Book.objects.filter(pk=book.pk).update(is_available=False)
+
+    def _reservar(self, book, user, retirar_ate=None):
+        reserva = reservar(book.pk, user)
+        if retirar_ate:
+            Reserva.objects.filter(pk=reserva.pk).update(retirar_ate=retirar_ate)
+        return reserva
+
+    def test_sweep_advances_queues(self):
+        ontem = self.hoje - timedelta(days=1)
+        # Livro 0: dois exemplares vencidos e um leitor esperando
+        vencidas = [
+            self._reservar(self.books[0], user, ontem) for user in self.users[:2]
+        ]
+        seguinte = self._reservar(self.books[0], self.users[2])
+        # Livro 1: retirada vencida e ninguém na fila
+        self._reservar(self.books[1], self.users[0], ontem)
+        # Livro 2: ainda no prazo
+        no_prazo = self._reservar(self.books[2], self.users[0], self.hoje)
+
+        self.assertEqual(expirar_retiradas(self.hoje, lote=1), (2, 1, 1))
+        self.assertEqual(expirar_retiradas(self.hoje, lote=1), (1, 0, 1))
+        self.assertEqual(expirar_retiradas(self.hoje), (0, 0, 0))
+
+        for reserva in vencidas:
+            reserva.refresh_from_db()
+            self.assertFalse(reserva.ativa)
+        seguinte.refresh_from_db()
+        self.assertEqual(
+            seguinte.retirar_ate, self.hoje + timedelta(days=DIAS_RETIRADA)
+        )
+        no_prazo.refresh_from_db()
+        self.assertTrue(no_prazo.separada)
+
+        books = Book.objects.in_bulk([book.pk for book in self.books])
+        stocks = {stock.book_id: stock for stock in Stock.objects.all()}
+        self.assertEqual(books[self.books[0].pk].reservas_ativas, 1)
+        self.assertEqual(books[self.books[1].pk].reservas_ativas, 0)
+        self.assertEqual(stocks[self.books[0].pk].available, 1)
+        self.assertEqual(stocks[self.books[1].pk].available, 1)
+        self.assertTrue(books[self.books[1].pk].is_available)
+        self.assertFalse(books[self.books[2].pk].is_available)
+
+    def test_expired_hold_cannot_be_picked_up(self):
+        self._reservar(self.books[0], self.users[0], self.hoje - timedelta(days=1))
+        with pytest.raises(ValidationError) as raised:
+            emprestar(self.books[0].pk, self.users[0])
+        self.assertEqual(raised.value.code, 'indisponivel')
+
+    def _separar(self, book, user):
+        # Um exemplar emprestado volta e fica separado para ``user``
+        Stock.objects.filter(book=book).update(quantity=1, available=1)
+        emprestimo = emprestar(book.pk, self.users[3])
+        reserva = reservar(book.pk, user)
+        with self.captureOnCommitCallbacks(execute=True):
+            devolver(emprestimo)
+        reserva.refresh_from_db()
+        self.assertTrue(reserva.separada)
+        return reserva
+
+    def _estante(self, book):
+        return Stock.objects.get(book=book).available
+
+    def test_deleted_reader_releases_held_copy(self):
+        self._separar(self.books[0], self.users[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].delete()
+        self.assertEqual(self._estante(self.books[0]), 1)
+        self.assertTrue(Book.objects.get(pk=self.books[0].pk).is_available)
+
+    def test_admin_changes_pass_held_copy_on(self):
+        reserva = self._separar(self.books[0], self.users[0])
+        seguinte = reservar(self.books[0].pk, self.users[1])
+
+        reserva = Reserva.objects.get(pk=reserva.pk)
+        reserva.ativa = False
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva.save()
+        seguinte.refresh_from_db()
+        self.assertTrue(seguinte.separada)
+        self.assertEqual(self._estante(self.books[0]), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Reserva.objects.get(pk=seguinte.pk).delete()
+        self.assertEqual(self._estante(self.books[0]), 1)
+        self.assertEqual(Book.objects.get(pk=self.books[0].pk).reservas_ativas, 0)
+
+    def test_command(self):
+        self._reservar(self.books[0], self.users[0], self.hoje)
+        out = StringIO()
+        tomorrow = (self.hoje + timedelta(days=1)).isoformat()
+        call_command('expire_holds', '--date', tomorrow, stdout=out)
+        self.assertIn('1 reserva(s) expirada(s)', out.getvalue())
+        self.assertEqual(Stock.objects.get(book=self.books[0]).available, 1)
+
+
+class EmprestimoConcorrenteTest(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            TYPEAHEAD_INDEX_PATH=str(Path(directory.name) / 'typeahead.idx')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.book = baker.make(Book, name='Dom Casmurro')
+        Stock.objects.filter(book=self.book).update(quantity=5, available=5)
+        self.users = baker.make(User, _quantity=8)
+
+    def test_parallel_checkouts(self):
+        done, denied, _ = run_checkouts(self.book.pk, self.users, attempts=3, workers=8)
+        self.assertEqual(done, 5)
+        self.assertEqual(denied, 19)
+        self.assertEqual(loan_violations(self.book.pk), (0, 0))
+        self.assertEqual(Stock.objects.get(book=self.book).available, 0)
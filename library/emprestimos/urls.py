@@ -10,4 +10,5 @@ urlpatterns = [
         'book/<slug:book_slug>/emprestar/', views.emprestar_book, name='emprestar_book'
     ),
     path('book/<int:emprestimo_id>/', views.renew_book, name='renew_book'),
+    path('reservas/posicoes/', views.reservas_posicoes, name='reservas_posicoes'),
 ]
@@ -1,37 +1,32 @@
 import logging
-from datetime import timedelta
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
 from library.acervo.models import Book
+from library.emprestimos.fila import posicoes
 from library.emprestimos.models.emprestimo import Emprestimo
-from library.emprestimos.models.reserva import Reserva
-from library.emprestimos.models.historico import Historico
+from library.emprestimos.services import emprestar, reservar
 
 logger = logging.getLogger('library')
 
 
 @login_required
 def emprestar_book(request, book_slug):
-    book = get_object_or_404(Book, slug=book_slug)
-    user = request.user
-    if not book.is_available:
-        logger.error('Livro não disponível para empréstimo: %s', book.name)
-        messages.error(request, 'Este livro não está disponível para empréstimo.')
+    book = get_object_or_404(Book.objects.only('id', 'name', 'slug'), slug=book_slug)
+    try:
+        emprestar(book.pk, request.user)
+    except ValidationError as exc:
+        if exc.code == 'ja_emprestado':
+            logger.error('Usuário já está com o livro: %s', book.name)
+        else:
+            logger.error('Livro não disponível para empréstimo: %s', book.name)
+        messages.error(request, exc.message)
         return redirect('acervo:book_detail', book_slug=book.slug)
 
-    if Emprestimo.objects.filter(book=book, date_returned__isnull=True).exists():
-        logger.error('Livro já emprestado: %s', book.name)
-        messages.error(request, 'Este livro já foi emprestado.')
-        return redirect('acervo:book_detail', book_slug=book.slug)
-
-    Emprestimo.objects.create(book=book, user=user)
-    Historico.objects.create(book=book, user=user)
-
-    book.is_available = False
-    book.save()
     logger.info('Livro emprestado: %s', book.name)
     messages.success(request, 'Livro emprestado com sucesso.')
     return redirect('acervo:book_detail', book_slug=book.slug)
@@ -52,21 +47,37 @@ def history_view(request):
 
 @login_required
 def reserve_book(request, slug):
-    book = get_object_or_404(Book, slug=slug)
-    user = request.user
-
-    existe = Reserva.objects.filter(book=book, user=user, ativa=True).exists()
-    if existe:
+    book = get_object_or_404(Book.objects.only('id', 'name', 'slug'), slug=slug)
+    try:
+        reservar(book.pk, request.user)
+    except ValidationError as exc:
         logger.error('Livro já reservado: %s', book.name)
-        messages.error(request, 'Você já reservou este livro.')
+        messages.error(request, exc.message)
         return redirect('acervo:book_detail', book_slug=book.slug)
 
-    Reserva.objects.create(book=book, user=user)
     logger.info(f'Livro reservado: {book.name}')
     messages.success(request, 'Livro reservado com sucesso.')
     return redirect('acervo:book_detail', book_slug=book.slug)
 
 
+@login_required
+def reservas_posicoes(request):
+    """Posição do usuário em cada fila de reserva em que está, numa consulta"""
+    reservas = [
+        {
+            'id': reserva.pk,
+            'book': reserva.book.slug,
+            'name': reserva.book.name,
+            'created_at': reserva.created_at,
+            'retirar_ate': reserva.retirar_ate,
+            'posicao': reserva.posicao,
+            'tamanho_fila': reserva.tamanho_fila,
+        }
+        for reserva in posicoes(request.user)
+    ]
+    return JsonResponse({'results': reservas})
+
+
 @login_required
 def renew_book(request, emprestimo_id):
     emprestimo = get_object_or_404(Emprestimo, id=emprestimo_id, user=request.user)
@@ -77,8 +88,7 @@ def renew_book(request, emprestimo_id):
             messages.error(request, 'Este empréstimo não pode ser renovado.')
             return redirect('acervo:book_detail', book_slug=emprestimo.book.slug)
 
-        emprestimo.end_date = emprestimo.end_date + timedelta(days=7)
-        emprestimo.save()
+        emprestimo.renovar()
 
         logger.info('Empréstimo renovado: %s', emprestimo.book.name)
         messages.success(request, 'Empréstimo renovado por mais 7 dias!')
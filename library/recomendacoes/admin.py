@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from library.recomendacoes.models import BookNeighbor, UserRecommendation
+
+
+@admin.register(BookNeighbor)
+class VizinhoAdmin(admin.ModelAdmin):
+    list_display = ('book', 'rank', 'neighbor', 'score')
+    list_select_related = ('book', 'neighbor')
+    raw_id_fields = ('book', 'neighbor')
+    search_fields = ('book__name',)
+
+
+@admin.register(UserRecommendation)
+class RecomendacaoAdmin(admin.ModelAdmin):
+    list_display = ('user', 'rank', 'book', 'score')
+    list_select_related = ('user', 'book')
+    raw_id_fields = ('user', 'book')
+    search_fields = ('user__username',)
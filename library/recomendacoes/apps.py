@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class RecomendacoesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'library.recomendacoes'
+    verbose_name = 'Recomendações'
@@ -0,0 +1,73 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from library.recomendacoes.neighbors import (
+    MAX_BOOKS_PER_READER,
+    MIN_COMMON_READERS,
+    TOP_K,
+    rebuild_neighbors,
+)
+from library.recomendacoes.ratings import (
+    RECOMMENDATIONS_PER_USER,
+    rebuild_recommendations,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os livros "quem pegou este também pegou" a partir dos '
+        'empréstimos e os "recomendados para você" a partir das avaliações. '
+        'Feito para rodar uma vez por noite (cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=TOP_K,
+            help='Quantidade de vizinhos guardados por livro',
+        )
+        parser.add_argument(
+            '--min-common',
+            type=int,
+            default=MIN_COMMON_READERS,
+            help='Leitores em comum necessários para dois livros serem vizinhos',
+        )
+        parser.add_argument(
+            '--max-books-per-reader',
+            type=int,
+            default=MAX_BOOKS_PER_READER,
+            help='Leitores com mais livros que isso são ignorados',
+        )
+        parser.add_argument(
+            '--per-user',
+            type=int,
+            default=RECOMMENDATIONS_PER_USER,
+            help='Quantidade de recomendações guardadas por leitor',
+        )
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        pairs, stored = rebuild_neighbors(
+            top_k=options['top_k'],
+            min_common=options['min_common'],
+            max_books_per_reader=options['max_books_per_reader'],
+        )
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{pairs} par(es) leitor/livro, {stored} vizinho(s) gravado(s) '
+                f'em {elapsed:.1f}s'
+            )
+        )
+
+        start = perf_counter()
+        ratings, stored = rebuild_recommendations(per_user=options['per_user'])
+        elapsed = perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{ratings} avaliação(ões), {stored} recomendação(ões) '
+                f'gravada(s) em {elapsed:.1f}s'
+            )
+        )
@@ -0,0 +1,37 @@
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+
+
+def top_k_rows(matrix, k):
+    """(linha, colunas, valores) com os ``k`` maiores valores de cada linha.
+
+    Linhas vazias são puladas; os valores vêm do maior para o menor e, no
+    empate, pela menor coluna.
+    """
+    matrix = matrix.tocsr()
+    matrix.sort_indices()
+    for row in range(matrix.shape[0]):
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        if start == end:
+            continue
+        columns = matrix.indices[start:end]
+        values = matrix.data[start:end]
+        order = np.lexsort((columns, -values))[:k]
+        yield row, columns[order], values[order]
+
+
+def replace_table(model, objects, batch_size=5000):
+    """Troca todo o conteúdo da tabela numa única transação.
+
+    Quem lê durante a troca continua vendo a versão anterior até o commit.
+    """
+    stored = 0
+    objects = iter(objects)
+    with transaction.atomic():
+        model.objects.all().delete()
+        while batch := list(islice(objects, batch_size)):
+            model.objects.bulk_create(batch)
+            stored += len(batch)
+    return stored
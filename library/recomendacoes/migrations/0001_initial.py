@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    initial = True
+
+    dependencies = [
+        ('acervo', '0021_book_isbn_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookNeighbor',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='posição')),
+                ('score', models.FloatField(verbose_name='similaridade')),
+                (
+                    'book',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='neighbors',
+                        to='acervo.book',
+                        verbose_name='livro',
+                    ),
+                ),
+                (
+                    'neighbor',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='neighbor_of',
+                        to='acervo.book',
+                        verbose_name='vizinho',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Vizinho de livro',
+                'verbose_name_plural': 'Vizinhos de livros',
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('book', 'rank'), name='bookneighbor_book_rank_unique'
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('acervo', '0021_book_isbn_unique'),
+        ('recomendacoes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecommendation',
+            fields=[
+                (
+                    'id',
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='posição')),
+                ('score', models.FloatField(verbose_name='nota prevista')),
+                (
+                    'book',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='recommended_to',
+                        to='acervo.book',
+                        verbose_name='livro',
+                    ),
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='recommendations',
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name='usuário',
+                    ),
+                ),
+            ],
+            options={
+                'verbose_name': 'Recomendação',
+                'verbose_name_plural': 'Recomendações',
+                'constraints': [
+                    models.UniqueConstraint(
+                        fields=('user', 'rank'),
+                        name='userrecommendation_user_rank_unique',
+                    )
+                ],
+            },
+        ),
+    ]
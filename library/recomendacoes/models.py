@@ -0,0 +1,72 @@
+from django.db import models
+
+from library.acervo.models import Book
+from library.usuarios.models import User
+
+
+class BookNeighbor(models.Model):
+    """Livro emprestado pelos mesmos leitores, gerado por library.recomendacoes.
+
+    Só guarda os ``rank`` primeiros vizinhos de cada livro; a tabela é
+    reconstruída inteira pelo comando build_recommendations.
+    """
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name='neighbors', verbose_name='livro'
+    )
+    neighbor = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='neighbor_of',
+        verbose_name='vizinho',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='posição')
+    score = models.FloatField(verbose_name='similaridade')
+
+    class Meta:
+        verbose_name = 'Vizinho de livro'
+        verbose_name_plural = 'Vizinhos de livros'
+        constraints = [
+            # Também é o índice da consulta da página do livro
+            models.UniqueConstraint(
+                fields=['book', 'rank'], name='bookneighbor_book_rank_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.book_id} -> {self.neighbor_id} ({self.score:.2f})'
+
+
+class UserRecommendation(models.Model):
+    """Livro recomendado a um leitor, previsto a partir das avaliações.
+
+    Gerado por library.recomendacoes.ratings; a tabela é reconstruída inteira
+    pelo comando build_recommendations.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='usuário',
+    )
+    book = models.ForeignKey(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='recommended_to',
+        verbose_name='livro',
+    )
+    rank = models.PositiveSmallIntegerField(verbose_name='posição')
+    score = models.FloatField(verbose_name='nota prevista')
+
+    class Meta:
+        verbose_name = 'Recomendação'
+        verbose_name_plural = 'Recomendações'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'rank'], name='userrecommendation_user_rank_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.book_id} ({self.score:.2f})'
@@ -0,0 +1,89 @@
+"""Vizinhos de cada livro a partir dos empréstimos ("quem pegou também pegou").
+
+A partir dos pares (leitor, livro) monta a matriz esparsa leitores x livros
+e multiplica pela transposta: cada célula da matriz livros x livros é
+quantos leitores pegaram os dois livros. A similaridade é o cosseno, que
+divide essa contagem pela raiz do total de leitores de cada livro, para que
+os títulos mais populares não apareçam como vizinhos de todo mundo.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.recomendacoes.matrix import replace_table, top_k_rows
+from library.recomendacoes.models import BookNeighbor
+
+TOP_K = 12
+# Com um único leitor em comum a vizinhança é só coincidência
+MIN_COMMON_READERS = 2
+# Contas com mais livros que isso (testes, a própria biblioteca) ligariam
+# todo o acervo entre si e deixariam a multiplicação quadrática
+MAX_BOOKS_PER_READER = 1000
+
+CHUNK_SIZE = 10000
+PAIR_DTYPE = np.dtype([('user', np.int64), ('book', np.int64)])
+
+
+def load_pairs():
+    """Pares distintos (leitor, livro) de todos os empréstimos, como arrays"""
+    pairs = (
+        Emprestimo.objects.order_by()
+        .values_list('user_id', 'book_id')
+        .distinct()
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    pairs = np.fromiter(pairs, dtype=PAIR_DTYPE)
+    return pairs['user'], pairs['book']
+
+
+def compute_neighbors(
+    users,
+    books,
+    top_k=TOP_K,
+    min_common=MIN_COMMON_READERS,
+    max_books_per_reader=MAX_BOOKS_PER_READER,
+):
+    """Gera (livro, vizinho, posição, similaridade) para cada livro"""
+    if not len(books):
+        return
+
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    book_ids, book_index = np.unique(books, return_inverse=True)
+    keep = np.bincount(user_index)[user_index] <= max_books_per_reader
+
+    readers = sparse.csr_matrix(
+        (
+            np.ones(int(keep.sum()), dtype=np.float32),
+            (user_index[keep], book_index[keep]),
+        ),
+        shape=(len(user_ids), len(book_ids)),
+    )
+    common = (readers.T @ readers).tocsr()
+    common -= sparse.diags(common.diagonal()).tocsr()
+    common.data[common.data < min_common] = 0
+    common.eliminate_zeros()
+
+    norms = np.sqrt(np.asarray(readers.sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    scale = sparse.diags(1 / norms)
+    similarity = (scale @ common @ scale).tocsr()
+
+    for row, columns, scores in top_k_rows(similarity, top_k):
+        for rank, (column, score) in enumerate(zip(columns, scores), start=1):
+            yield int(book_ids[row]), int(book_ids[column]), rank, float(score)
+
+
+def store_neighbors(neighbors):
+    return replace_table(
+        BookNeighbor,
+        (
+            BookNeighbor(book_id=book, neighbor_id=neighbor, rank=rank, score=score)
+            for book, neighbor, rank, score in neighbors
+        ),
+    )
+
+
+def rebuild_neighbors(**options):
+    users, books = load_pairs()
+    return len(books), store_neighbors(compute_neighbors(users, books, **options))
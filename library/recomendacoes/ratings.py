@@ -0,0 +1,153 @@
+"""Recomendações personalizadas a partir das avaliações.
+
+Filtragem colaborativa item a item: as notas de cada leitor são centradas
+na média dele, para que quem dá 5 a tudo e quem é exigente pesem igual. A
+similaridade entre dois livros é o cosseno entre as colunas dessa matriz
+leitores x livros, e a nota prevista de um livro é a média ponderada dos
+desvios que o leitor deu aos livros mais parecidos com ele. Tudo é feito
+com operações de matriz esparsa.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from library.acervo.models import BookReview
+from library.recomendacoes.matrix import replace_table, top_k_rows
+from library.recomendacoes.models import UserRecommendation
+from library.recomendacoes.neighbors import load_pairs
+
+RECOMMENDATIONS_PER_USER = 12
+# Vizinhos considerados por livro na previsão
+ITEM_NEIGHBORS = 50
+# Somado ao peso total da previsão: um único vizinho parecido não basta para
+# colocar um livro no topo
+SHRINKAGE = 1.0
+
+CHUNK_SIZE = 10000
+USER_BLOCK = 10000
+RATING_DTYPE = np.dtype(
+    [('user', np.int64), ('book', np.int64), ('rating', np.float32)]
+)
+
+
+def load_ratings():
+    """(leitores, livros, notas) de todas as avaliações, como arrays"""
+    ratings = (
+        BookReview.objects.order_by()
+        .values_list('user_id', 'book_id', 'rating')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    ratings = np.fromiter(ratings, dtype=RATING_DTYPE)
+    return ratings['user'], ratings['book'], ratings['rating']
+
+
+def _keep_top_k(matrix, k):
+    rows, columns, values = [], [], []
+    for row, row_columns, row_values in top_k_rows(matrix, k):
+        rows.append(np.full(len(row_columns), row))
+        columns.append(row_columns)
+        values.append(row_values)
+    if not rows:
+        return sparse.csr_matrix(matrix.shape, dtype=matrix.dtype)
+    return sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+        shape=matrix.shape,
+    )
+
+
+def compute_recommendations(
+    ratings,
+    borrowed=None,
+    per_user=RECOMMENDATIONS_PER_USER,
+    neighbors=ITEM_NEIGHBORS,
+    shrinkage=SHRINKAGE,
+):
+    """Gera (leitor, livro, posição, nota prevista) para cada leitor.
+
+    ``ratings`` são os arrays (leitores, livros, notas) de load_ratings;
+    ``borrowed`` é um par opcional de arrays (leitores, livros) com o que
+    cada um já pegou emprestado; esses livros, como os já avaliados, não
+    são recomendados.
+    """
+    users, books, ratings = ratings
+    if not len(books):
+        return
+
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    book_ids, book_index = np.unique(books, return_inverse=True)
+    shape = (len(user_ids), len(book_ids))
+
+    means = np.bincount(user_index, weights=ratings) / np.bincount(user_index)
+    centred = ratings - means[user_index]
+    deviations = sparse.csr_matrix((centred, (user_index, book_index)), shape=shape)
+    deviations.eliminate_zeros()
+    rated = sparse.csr_matrix(
+        (np.ones(len(books), dtype=np.float32), (user_index, book_index)), shape=shape
+    )
+
+    norms = np.sqrt(
+        np.bincount(book_index, weights=centred**2, minlength=len(book_ids))
+    )
+    norms[norms == 0] = 1
+    normalized = deviations @ sparse.diags(1 / norms)
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity -= sparse.diags(similarity.diagonal()).tocsr()
+    # Livros com gostos opostos não ajudam a prever uma nota alta
+    similarity.data[similarity.data < 0] = 0
+    similarity.eliminate_zeros()
+    # Candidatos de cada leitor: os vizinhos dos livros que ele avaliou, o
+    # que limita as previsões a (avaliações x vizinhos) por leitor
+    similarity = _keep_top_k(similarity, neighbors)
+
+    seen = rated
+    if borrowed is not None:
+        borrowed_users, borrowed_books = borrowed
+        known = np.isin(borrowed_users, user_ids) & np.isin(borrowed_books, book_ids)
+        seen = seen + sparse.csr_matrix(
+            (
+                np.ones(int(known.sum()), dtype=np.float32),
+                (
+                    np.searchsorted(user_ids, borrowed_users[known]),
+                    np.searchsorted(book_ids, borrowed_books[known]),
+                ),
+            ),
+            shape=shape,
+        )
+    seen = (seen > 0).tocsr()
+
+    # Em blocos de leitores, para a memória não crescer com o total deles
+    for first in range(0, len(user_ids), USER_BLOCK):
+        block = slice(first, first + USER_BLOCK)
+        weights = (rated[block] @ similarity).tocsr()
+        weights.data = 1 / (weights.data + shrinkage)
+        predicted = (deviations[block] @ similarity).multiply(weights).tocsr()
+        predicted = (predicted - predicted.multiply(seen[block])).tocsr()
+        # Só o que deve agradar mais que a média do próprio leitor
+        predicted.data[predicted.data <= 0] = 0
+        predicted.eliminate_zeros()
+
+        for row, columns, scores in top_k_rows(predicted, per_user):
+            user = first + row
+            for rank, (column, score) in enumerate(zip(columns, scores), start=1):
+                yield (
+                    int(user_ids[user]),
+                    int(book_ids[column]),
+                    rank,
+                    float(min(means[user] + score, 5)),
+                )
+
+
+def store_recommendations(recommendations):
+    return replace_table(
+        UserRecommendation,
+        (
+            UserRecommendation(user_id=user, book_id=book, rank=rank, score=score)
+            for user, book, rank, score in recommendations
+        ),
+    )
+
+
+def rebuild_recommendations(**options):
+    ratings = load_ratings()
+    recommendations = compute_recommendations(ratings, borrowed=load_pairs(), **options)
+    return len(ratings[0]), store_recommendations(recommendations)
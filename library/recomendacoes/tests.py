@@ -0,0 +1,111 @@
+from io import StringIO
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse_lazy
+from model_bakery import baker
+
+from library.acervo.models import Book, BookReview
+from library.emprestimos.models.emprestimo import Emprestimo
+
+from .models import BookNeighbor, UserRecommendation
+from .neighbors import compute_neighbors
+from .ratings import compute_recommendations
+
+
+class NeighborsTest(TestCase):
+    def test_compute_neighbors(self):
+        # Leitores 1 a 3 pegaram 10 e 20; o 4 pegou 10 e 30; o 5, só o 30
+        users = np.array([1, 1, 2, 2, 3, 3, 4, 4, 5])
+        books = np.array([10, 20, 10, 20, 10, 20, 10, 30, 30])
+
+        neighbors = list(compute_neighbors(users, books, min_common=2))
+        self.assertEqual([row[:3] for row in neighbors], [(10, 20, 1), (20, 10, 1)])
+        self.assertAlmostEqual(neighbors[0][3], 3 / np.sqrt(4 * 3), places=5)
+
+        neighbors = list(compute_neighbors(users, books, min_common=1, top_k=1))
+        self.assertEqual([row[:3] for row in neighbors][0], (10, 20, 1))
+        self.assertEqual(len(neighbors), 3)
+
+    def test_heavy_readers_are_ignored(self):
+        users = np.array([1, 1, 1, 2, 2])
+        books = np.array([10, 20, 30, 10, 20])
+        neighbors = compute_neighbors(
+            users, books, min_common=1, max_books_per_reader=2
+        )
+        self.assertEqual([row[:2] for row in neighbors], [(10, 20), (20, 10)])
+
+    def test_command_and_book_detail(self):
+        dom, iracema, lira, outro = baker.make(Book, _quantity=4)
+        leitores = baker.make(User, _quantity=3)
+        Emprestimo.objects.bulk_create(
+            Emprestimo(user=user, book=book)
+            for user in leitores
+            for book in (dom, iracema, lira)
+        )
+        baker.make(BookNeighbor, book=dom, neighbor=outro, rank=1)
+
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn('9 par(es) leitor/livro, 6 vizinho(s) gravado(s)', out.getvalue())
+        self.assertIn('0 avaliação(ões), 0 recomendação(ões)', out.getvalue())
+        self.assertEqual(
+            list(dom.neighbors.order_by('rank').values_list('neighbor_id', flat=True)),
+            sorted([iracema.pk, lira.pk]),
+        )
+
+        response = self.client.get(reverse_lazy('acervo:book_detail', args=[dom.slug]))
+        self.assertEqual(
+            [book.pk for book in response.context['related_books']],
+            sorted([iracema.pk, lira.pk]),
+        )
+        self.assertContains(response, 'Quem pegou este livro também pegou')
+
+
+class RecommendationsTest(TestCase):
+    # Leitores 1 e 2 gostam de 10 e 20 e não de 30; o 3 só avaliou 10 e 30
+    RATINGS = (
+        np.array([1, 1, 1, 2, 2, 2, 3, 3]),
+        np.array([10, 20, 30, 10, 20, 30, 10, 30]),
+        np.array([5, 5, 1, 5, 4, 1, 5, 1], dtype=np.float32),
+    )
+
+    def test_compute_recommendations(self):
+        recommendations = list(compute_recommendations(self.RATINGS))
+        self.assertEqual([row[:3] for row in recommendations], [(3, 20, 1)])
+        # Acima da média do leitor (3), limitada a 5
+        self.assertGreater(recommendations[0][3], 3)
+        self.assertLessEqual(recommendations[0][3], 5)
+
+    def test_borrowed_books_are_not_recommended(self):
+        borrowed = (np.array([3, 9]), np.array([20, 20]))
+        self.assertEqual(
+            list(compute_recommendations(self.RATINGS, borrowed=borrowed)), []
+        )
+
+    def test_dashboard(self):
+        leitores = baker.make(User, _quantity=3)
+        books = {pk: baker.make(Book) for pk in (10, 20, 30)}
+        BookReview.objects.bulk_create(
+            BookReview(user=leitores[user - 1], book=books[book], rating=int(rating))
+            for user, book, rating in zip(*self.RATINGS)
+        )
+        leitor = leitores[2]
+        emprestimo = Emprestimo.objects.create(user=leitor, book=books[10])
+        emprestimo.date_returned = emprestimo.start_date
+        emprestimo.save()
+
+        call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(
+            list(UserRecommendation.objects.values_list('user', 'book', 'rank')),
+            [(leitor.pk, books[20].pk, 1)],
+        )
+
+        self.client.force_login(leitor)
+        response = self.client.get(reverse_lazy('usuarios:dashboard'))
+        self.assertEqual(list(response.context['recommended_books']), [books[20]])
+        self.assertEqual(response.context['books_read_count'], 1)
+        self.assertEqual(response.context['reviews_count'], 2)
+        self.assertContains(response, 'Recomendados para você')
@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DateTimeField, Exists, F, OuterRef
+from django.utils import timezone
+
+from library.acervo.categories import BookCategory
+from library.acervo.models import Book, Category
+from library.emprestimos.models.emprestimo import Emprestimo
+from library.emprestimos.models.reserva import Reserva
+
+# Linhas lidas do cursor do servidor por vez
+CHUNK_SIZE = 2000
+# Tamanho aproximado de cada pedaço enviado ao cliente
+BUFFER_SIZE = 64 * 1024
+# Mesmo separador de categorias do import_books: a exportação de livros em CSV
+# pode ser importada de volta
+LIST_SEPARATOR = '|'
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+@dataclass(frozen=True)
+class Export:
+    """Uma exportação: consulta base, colunas e por onde filtrar"""
+
+    model: type
+    # (cabeçalho, campo ou anotação da consulta)
+    columns: tuple
+    # Campo filtrado pelo período
+    date_field: str
+    # Caminho até o id do livro, usado no filtro por categoria
+    book_field: str
+    # Função que devolve as anotações usadas nas colunas
+    annotations: object = dict
+
+    def queryset(self):
+        queryset = self.model._default_manager.annotate(**self.annotations())
+        return queryset.order_by('pk')
+
+
+def _book_annotations():
+    names = Category.objects.filter(books=OuterRef('pk')).order_by('name')
+    return {
+        'category_names': ArraySubquery(names.values('name')),
+        'stock_quantity': F('stock__quantity'),
+        'stock_available': F('stock__available'),
+    }
+
+
+EXPORTS = {
+    'livros': Export(
+        model=Book,
+        columns=(
+            ('id', 'id'),
+            ('slug', 'slug'),
+            ('name', 'name'),
+            ('author', 'author'),
+            ('publisher', 'publisher'),
+            ('year', 'year'),
+            ('isbn', 'isbn'),
+            ('pages', 'pages'),
+            ('language', 'language'),
+            ('categories', 'category_names'),
+            ('quantity', 'stock_quantity'),
+            ('available', 'stock_available'),
+            ('created_at', 'created_at'),
+        ),
+        date_field='created_at',
+        book_field='pk',
+        annotations=_book_annotations,
+    ),
+    'emprestimos': Export(
+        model=Emprestimo,
+        columns=(
+            ('id', 'id'),
+            ('book_id', 'book_id'),
+            ('book', 'book__name'),
+            ('user', 'user__username'),
+            ('start_date', 'start_date'),
+            ('end_date', 'end_date'),
+            ('date_returned', 'date_returned'),
+            ('multa', 'multa'),
+        ),
+        date_field='start_date',
+        book_field='book_id',
+    ),
+    'reservas': Export(
+        model=Reserva,
+        columns=(
+            ('id', 'id'),
+            ('book_id', 'book_id'),
+            ('book', 'book__name'),
+            ('user', 'user__username'),
+            ('created_at', 'created_at'),
+            ('ativa', 'ativa'),
+        ),
+        date_field='created_at',
+        book_field='book_id',
+    ),
+}
+
+
+def _date_bounds(field, date_from, date_to):
+    """Filtros do período; em campos de data e hora, sem cast para date"""
+    if not isinstance(field, DateTimeField):
+        bounds = {}
+        if date_from:
+            bounds[f'{field.name}__gte'] = date_from
+        if date_to:
+            bounds[f'{field.name}__lte'] = date_to
+        return bounds
+
+    def start_of(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    bounds = {}
+    if date_from:
+        bounds[f'{field.name}__gte'] = start_of(date_from)
+    if date_to:
+        bounds[f'{field.name}__lt'] = start_of(date_to + timedelta(days=1))
+    return bounds
+
+
+def export_queryset(export, date_from=None, date_to=None, categories=()):
+    """Consulta da exportação com os filtros de período e categorias"""
+    queryset = export.queryset()
+    field = export.model._meta.get_field(export.date_field)
+    queryset = queryset.filter(**_date_bounds(field, date_from, date_to))
+    if categories:
+        # EXISTS em vez de JOIN: um livro em várias categorias sai uma vez só
+        links = BookCategory.objects.filter(
+            book_id=OuterRef(export.book_field), category__in=categories
+        )
+        queryset = queryset.filter(Exists(links))
+    return queryset
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_lines(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(
+            LIST_SEPARATOR.join(value) if isinstance(value, list) else value
+            for value in row
+        )
+
+
+def _jsonl_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def _buffered(lines):
+    buffer = io.StringIO()
+    for line in lines:
+        buffer.write(line)
+        if buffer.tell() >= BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer = io.StringIO()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_export(export, queryset, file_format):
+    """Gera o arquivo em pedaços de ~64 KB, lendo o banco por um cursor.
+
+    ``iterator()`` usa um cursor do lado do servidor no PostgreSQL, então só
+    ``CHUNK_SIZE`` linhas ficam em memória, qualquer que seja o total.
+    """
+    headers = [header for header, _ in export.columns]
+    rows = queryset.values_list(*(field for _, field in export.columns)).iterator(
+        chunk_size=CHUNK_SIZE
+    )
+    lines = _csv_lines if file_format == 'csv' else _jsonl_lines
+    return _buffered(lines(headers, rows))
+
+
+def export_filename(kind, file_format):
+    return f'{kind}-{timezone.localdate():%Y%m%d}.{file_format}'
@@ -0,0 +1,28 @@
+from django import forms
+
+from library.acervo.models import Category
+
+
+class ExportForm(forms.Form):
+    format = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], required=False
+    )
+    date_from = forms.DateField(required=False, label='De')
+    date_to = forms.DateField(required=False, label='Até')
+    category = forms.ModelMultipleChoiceField(
+        queryset=Category.objects.all(),
+        to_field_name='slug',
+        required=False,
+        label='Categorias',
+    )
+
+    def clean_format(self):
+        return self.cleaned_data['format'] or 'csv'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError('A data inicial é posterior à data final.')
+        return cleaned_data
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from library.relatorios.exports import EXPORTS, export_queryset, stream_export
+from library.relatorios.forms import ExportForm
+
+
+class Command(BaseCommand):
+    help = 'Exporta livros, empréstimos ou reservas em CSV ou JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+        parser.add_argument(
+            '--from', dest='date_from', help='Data inicial (AAAA-MM-DD)'
+        )
+        parser.add_argument('--to', dest='date_to', help='Data final (AAAA-MM-DD)')
+        parser.add_argument(
+            '--category',
+            action='append',
+            default=[],
+            help='Slug de categoria; pode ser repetido',
+        )
+        parser.add_argument(
+            '--output', help='Arquivo de saída; por padrão, a saída padrão'
+        )
+
+    def handle(self, *args, **options):
+        form = ExportForm(
+            {
+                'format': options['format'],
+                'date_from': options['date_from'],
+                'date_to': options['date_to'],
+                'category': options['category'],
+            }
+        )
+        if not form.is_valid():
+            errors = '; '.join(
+                str(error) for field in form.errors.values() for error in field
+            )
+            raise CommandError(errors)
+
+        export = EXPORTS[options['kind']]
+        queryset = export_queryset(
+            export,
+            date_from=form.cleaned_data['date_from'],
+            date_to=form.cleaned_data['date_to'],
+            categories=form.cleaned_data['category'],
+        )
+        chunks = stream_export(export, queryset, form.cleaned_data['format'])
+
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exportado para {options["output"]}'))
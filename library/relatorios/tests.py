@@ -1 +1,100 @@
-# Create your tests here.
+import csv
+import io
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse_lazy
+from django.utils import timezone
+from model_bakery import baker
+
+from library.acervo.models import Book, Category
+from library.emprestimos.models.emprestimo import Emprestimo
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            username='bibliotecaria', password='senha12345', is_staff=True
+        )
+        self.leitor = User.objects.create_user(username='leitor', password='senha12345')
+        self.romance = baker.make(Category, name='Romance')
+        self.poesia = baker.make(Category, name='Poesia')
+
+        self.dom = baker.make(Book, name='Dom Casmurro', author='Machado de Assis')
+        self.dom.categories.set([self.romance, self.poesia])
+        self.lira = baker.make(Book, name='Lira dos Vinte Anos')
+        self.lira.categories.set([self.poesia])
+        self.outro = baker.make(Book, name='Sem Categoria')
+
+    def _get(self, kind, **params):
+        self.client.login(username='bibliotecaria', password='senha12345')
+        return self.client.get(reverse_lazy('relatorios:exportar', args=[kind]), params)
+
+    def _content(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_staff_only(self):
+        self.client.login(username='leitor', password='senha12345')
+        response = self.client.get(reverse_lazy('relatorios:exportar', args=['livros']))
+        self.assertEqual(response.status_code, 302)
+
+    def test_books_csv(self):
+        response = self._get('livros')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="livros-', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(self._content(response))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['name'], 'Dom Casmurro')
+        self.assertEqual(rows[0]['categories'], 'Poesia|Romance')
+        self.assertEqual((rows[0]['quantity'], rows[0]['available']), ('1', '1'))
+
+    def test_category_filter_does_not_repeat_rows(self):
+        response = self._get('livros', category=['romance', 'poesia'])
+        rows = list(csv.DictReader(io.StringIO(self._content(response))))
+        self.assertEqual(
+            [row['name'] for row in rows], ['Dom Casmurro', 'Lira dos Vinte Anos']
+        )
+
+    def test_loans_jsonl_with_date_range(self):
+        hoje = timezone.localdate()
+        antigo = Emprestimo.objects.create(book=self.dom, user=self.leitor)
+        Emprestimo.objects.filter(pk=antigo.pk).update(
+            start_date=hoje - timedelta(days=30)
+        )
+        recente = Emprestimo.objects.create(book=self.lira, user=self.leitor)
+
+        response = self._get(
+            'emprestimos', format='jsonl', date_from=hoje - timedelta(days=7)
+        )
+        self.assertEqual(
+            response['Content-Type'], 'application/x-ndjson; charset=utf-8'
+        )
+        lines = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([line['id'] for line in lines], [recente.pk])
+        self.assertEqual(lines[0]['user'], 'leitor')
+        self.assertEqual(lines[0]['start_date'], hoje.isoformat())
+
+    def test_invalid_filters(self):
+        response = self._get('reservas', date_from='2025-02-01', date_to='2025-01-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._get('usuarios').status_code, 404)
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'export_data',
+            'livros',
+            '--format',
+            'jsonl',
+            '--category',
+            'romance',
+            stdout=out,
+        )
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['Dom Casmurro'])
@@ -6,4 +6,5 @@ app_name = 'relatorios'
 
 urlpatterns = [
     path('', views.dashboard_relatorios, name='admin_reports'),
+    path('exportar/<str:kind>/', views.exportar, name='exportar'),
 ]
@@ -2,6 +2,7 @@ import logging
 
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Count
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
 
@@ -9,6 +10,15 @@ from library.acervo.models import Book, Category
 from library.emprestimos.models.emprestimo import Emprestimo
 from library.usuarios.models import User
 
+from .exports import (
+    CONTENT_TYPES,
+    EXPORTS,
+    export_filename,
+    export_queryset,
+    stream_export,
+)
+from .forms import ExportForm
+
 logger = logging.getLogger('library')
 
 
@@ -44,6 +54,36 @@ def dashboard_relatorios(request):
         'total_categorias': total_categorias,
         'livros_disponiveis': livros_disponiveis,
         'livros_emprestados': livros_emprestados,
+        'export_form': ExportForm(),
+        'exports': EXPORTS,
     }
 
     return render(request, 'painel_admin.html', context)
+
+
+@staff_member_required
+def exportar(request, kind):
+    export = EXPORTS.get(kind)
+    if export is None:
+        raise Http404('Exportação não encontrada')
+
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        logger.error('Filtros de exportação inválidos')
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    logger.info('Exportando %s', kind)
+    file_format = form.cleaned_data['format']
+    queryset = export_queryset(
+        export,
+        date_from=form.cleaned_data['date_from'],
+        date_to=form.cleaned_data['date_to'],
+        categories=form.cleaned_data['category'],
+    )
+    response = StreamingHttpResponse(
+        stream_export(export, queryset, file_format),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    filename = export_filename(kind, file_format)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # Apps
     'django_filters',
     'library.core',
@@ -51,6 +52,8 @@ INSTALLED_APPS = [
     'library.usuarios',
     'library.emprestimos',
     'library.relatorios',
+    'library.recomendacoes',
+    'library.api',
     'test_without_migrations',
 ]
 
@@ -103,6 +106,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Em produção, com vários processos, use um cache compartilhado (ex.: Redis)
+
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': config('CACHE_LOCATION', default='library'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -174,6 +192,22 @@ sentry_sdk.init(
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads são gravados uma única vez por conteúdo (ver library.core.storage)
+STORAGES = {
+    'default': {
+        'BACKEND': 'library.core.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Índice de sugestões da busca (ver library.acervo.typeahead); precisa estar
+# num caminho compartilhado por todos os workers da aplicação
+TYPEAHEAD_INDEX_PATH = config(
+    'TYPEAHEAD_INDEX_PATH', default=os.path.join(BASE_DIR, 'var', 'typeahead.idx')
+)
+
 LOGIN_URL = 'usuarios:login'
 LOGIN_REDIRECT_URL = 'index'
 LOGOUT_REDIRECT_URL = 'index'
@@ -33,6 +33,7 @@ urlpatterns = [
     path('emprestimos/', include('library.emprestimos.urls')),
     path('sentry-debug/', trigger_error),
     path('relatorios/', include('library.relatorios.urls')),
+    path('api/', include('library.api.urls')),
     path('', include('library.usuarios.urls')),
     path('', HomeView.as_view(), name='home'),
 ]
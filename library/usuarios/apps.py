@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library.usuarios'
+
+    def ready(self):
+        from library.usuarios import signals  # noqa: F401, PLC0415
@@ -0,0 +1,4 @@
+from library.core.storage import track_files
+from library.usuarios.models import Profile
+
+track_files(Profile, 'avatar')
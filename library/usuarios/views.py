@@ -10,10 +10,13 @@ from django.contrib.auth import login as auth_login
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Count, Q
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
 from django.views import generic
 
+from library.acervo.book_detail import RELATED_BOOK_FIELDS
+from library.acervo.models import Book, BookReview
 from library.emprestimos.models.emprestimo import Emprestimo
 
 from .forms import (
@@ -27,6 +30,8 @@ from .models import Profile
 logger = logging.getLogger('library')
 User = get_user_model()
 
+RECOMMENDED_BOOKS = 4
+
 
 class RegisterView(generic.CreateView):
     form_class = SignUpForm
@@ -153,11 +158,22 @@ def dashboard(request):
         .order_by('-start_date')
     )
 
+    books_read_count = Emprestimo.objects.filter(user=user).aggregate(
+        total=Count('book', distinct=True, filter=Q(date_returned__isnull=False))
+    )['total']
+    # Pré-calculadas pelo comando build_recommendations (library.recomendacoes)
+    recommended_books = (
+        Book.objects.only(*RELATED_BOOK_FIELDS)
+        .filter(recommended_to__user=user)
+        .order_by('recommended_to__rank')[:RECOMMENDED_BOOKS]
+    )
+
     context = {
         'active_reservations': active_reservations_data,
         'active_reservations_count': len(active_reservations_data),
-        'books_read_count': 0,
-        'reviews_count': 0,
+        'books_read_count': books_read_count,
+        'reviews_count': BookReview.objects.filter(user=user).count(),
+        'recommended_books': recommended_books,
         'history': history_data,
         'has_history': history_data.exists(),
     }
@@ -227,8 +243,7 @@ def remove_avatar(request):
     if request.method == 'POST':
         profile = request.user.profile
         if profile.avatar:
-            # Deletar o arquivo físico
-            profile.avatar.delete(save=False)
+            # O arquivo é liberado no storage depois do commit (track_files)
             profile.avatar = None
             profile.save()
             logger.info('Foto de perfil removida com sucesso')